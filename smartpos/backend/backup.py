@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Online backups of the SQLite database.
+
+Uses SQLite's backup API, copying BACKUP_PAGES_PER_STEP pages at a time and
+pausing between steps, so checkouts keep committing while a backup runs. A
+step stalls when the database is busy with a write or when a write from
+another connection makes SQLite restart the copy. After BACKUP_MAX_STALLS
+stalls the copy is finished in one step, which holds the read lock only for
+that final copy.
+
+Every copy is written under a temporary name and checked with PRAGMA
+integrity_check. Only then is it renamed to
+<name>-<YYYYmmdd-HHMMSS-micros>.db in BACKUP_DIR. After that, all but the newest
+BACKUP_KEEP copies of that database are deleted.
+
+    python backup.py [--user-id N]
+
+With BACKUP_DAILY=true the task worker also backs up every database once a
+day. PostgreSQL deployments should use pg_dump or base backups instead.
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.orm import Session
+
+import task_queue
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "./backups")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+BACKUP_STEP_PAUSE_SECONDS = float(os.getenv("BACKUP_STEP_PAUSE_SECONDS", "0.01"))
+BACKUP_MAX_STALLS = int(os.getenv("BACKUP_MAX_STALLS", "50"))
+BACKUP_DAILY = os.getenv("BACKUP_DAILY", "false").lower() == "true"
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyStalls(Exception):
+    pass
+
+
+def backup_database(
+    source_path: str,
+    directory: str = BACKUP_DIR,
+    keep: int = BACKUP_KEEP,
+    pages_per_step: int = BACKUP_PAGES_PER_STEP,
+    pause: float = BACKUP_STEP_PAUSE_SECONDS
+) -> dict:
+    """Copy a live SQLite file into `directory`; returns what was done"""
+    if not os.path.exists(source_path):
+        raise BackupError(f"{source_path} does not exist")
+    os.makedirs(directory, exist_ok=True)
+
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    final_path = os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+    partial_path = final_path + ".partial"
+    progress = {"steps": 0, "stalls": 0, "remaining": None}
+
+    def on_progress(status, remaining, total):
+        # Busy, or the source changed under us and SQLite started over
+        if status != sqlite3.SQLITE_OK or (progress["remaining"] is not None and remaining >= progress["remaining"]):
+            progress["stalls"] += 1
+            if progress["stalls"] > BACKUP_MAX_STALLS:
+                raise _TooManyStalls()
+        progress.update(steps=progress["steps"] + 1, remaining=remaining)
+        time.sleep(pause)  # Let writers in between steps
+
+    started = time.perf_counter()
+    source = sqlite3.connect(source_path, timeout=0)  # A busy step returns at once; the loop retries after the pause
+    target = sqlite3.connect(partial_path)
+    try:
+        try:
+            source.backup(target, pages=pages_per_step, progress=on_progress, sleep=pause)
+            stepped = True
+        except _TooManyStalls:
+            source.backup(target, sleep=pause)
+            stepped = False
+
+        integrity = target.execute("PRAGMA integrity_check").fetchone()[0]
+        pages = target.execute("PRAGMA page_count").fetchone()[0]
+    except Exception:
+        target.close()
+        os.remove(partial_path)
+        raise
+    finally:
+        target.close()
+        source.close()
+
+    if integrity != "ok":
+        os.remove(partial_path)
+        raise BackupError(f"Backup of {source_path} failed integrity check: {integrity}")
+    os.replace(partial_path, final_path)
+
+    return {
+        "source": source_path,
+        "path": final_path,
+        "pages": pages,
+        "steps": progress["steps"],
+        "stalls": progress["stalls"],
+        "stepped": stepped,
+        "duration_seconds": round(time.perf_counter() - started, 3),
+        "integrity": integrity,
+        "removed": rotate(directory, name, keep)
+    }
+
+
+def rotate(directory: str, name: str, keep: int) -> list:
+    """Delete all but the newest `keep` backups of one database"""
+    backups = sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(name)}-*.db")))
+    stale = backups[:-keep] if keep > 0 else []
+    for path in stale:
+        os.remove(path)
+    return stale
+
+
+def database_path(db: Session) -> Optional[str]:
+    """The SQLite file behind a session, or None for other databases"""
+    url = db.get_bind().url
+    return url.database if url.get_backend_name() == "sqlite" else None
+
+
+def report(result: dict) -> str:
+    mode = f"{result['steps']} steps" if result["stepped"] else f"finished in one step after {result['stalls']} stalls"
+    return (
+        f"✅ Backed up {result['source']} → {result['path']}: "
+        f"{result['pages']} pages in {result['duration_seconds']}s ({mode}, integrity {result['integrity']})"
+    )
+
+
+@task_queue.daily
+def _backup_daily(db: Session):
+    path = database_path(db)
+    if BACKUP_DAILY and path:
+        print(report(backup_database(path)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Back up the SmartPOS SQLite database(s) online")
+    parser.add_argument("--user-id", type=int, help="Only this shop's database (per-shop routing)")
+    parser.add_argument("--directory", default=BACKUP_DIR)
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            path = database_path(db)
+        if path is None:
+            sys.exit("❌ Online backup only supports SQLite; use pg_dump for PostgreSQL")
+        print(report(backup_database(path, directory=args.directory, keep=args.keep)))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Frequently-bought-together suggestions from past sales.
+
+A batch job reads the (sale, product) pairs of the last BASKET_WINDOW_DAYS
+and builds a sparse sale x product matrix B with SciPy. B.T @ B is the
+product co-occurrence matrix: entry (i, j) counts sales holding both i and
+j, and the diagonal counts sales holding each product. For every pair seen
+together in at least BASKET_MIN_SUPPORT sales:
+
+    confidence(i -> j) = sales with both / sales with i
+    lift(i -> j)       = confidence / (sales with j / all sales)
+
+The BASKET_TOP_K pairs with the highest lift are kept per product in
+product_associations. They replace the previous run in one transaction.
+Everything after reading the rows is array arithmetic, with no Python loop
+per sale, so a year of a busy store's sales takes well under a minute,
+mostly spent reading rows. NumPy and SciPy are imported by the batch
+functions themselves, so importing this module (the API does, for
+suggestions) doesn't pay for them.
+
+Suggestions for a cart are one query on the (user_id, product_id) index:
+the stored pairs of the cart's products, best lift first, skipping products
+already in the cart.
+
+    python basket_analysis.py [--user-id N] [--window-days 365]
+
+With BASKET_DAILY=true (the default) the task worker rebuilds every shop
+once a day.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from datetime import timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+import models
+import task_queue
+
+if TYPE_CHECKING:
+    import numpy as np
+
+BASKET_WINDOW_DAYS = int(os.getenv("BASKET_WINDOW_DAYS", "365"))
+BASKET_TOP_K = int(os.getenv("BASKET_TOP_K", "10"))
+BASKET_MIN_SUPPORT = int(os.getenv("BASKET_MIN_SUPPORT", "3"))
+BASKET_FETCH_SIZE = int(os.getenv("BASKET_FETCH_SIZE", "50000"))  # Sale lines read per round trip
+BASKET_DAILY = os.getenv("BASKET_DAILY", "true").lower() == "true"
+
+Association = models.ProductAssociation
+Product = models.Product
+
+
+def load_baskets(db: Session, user_id: int, since) -> Tuple["np.ndarray", "np.ndarray"]:
+    """(sale ids, product ids) of every sale line since `since`"""
+    import numpy as np
+
+    query = (
+        select(models.SaleItem.sale_id, models.SaleItem.product_id)
+        .join(models.Sale, models.Sale.id == models.SaleItem.sale_id)
+        .where(models.Sale.user_id == user_id, models.Sale.sale_date >= since)
+        .execution_options(yield_per=BASKET_FETCH_SIZE)
+    )
+    chunks = [
+        np.fromiter(itertools.chain.from_iterable(part), dtype=np.int64)
+        for part in db.execute(query).partitions()
+    ]
+    pairs = np.concatenate(chunks).reshape(-1, 2) if chunks else np.empty((0, 2), dtype=np.int64)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def associations(
+    sale_ids: "np.ndarray",
+    product_ids: "np.ndarray",
+    top_k: int = BASKET_TOP_K,
+    min_support: int = BASKET_MIN_SUPPORT
+) -> Dict[str, "np.ndarray"]:
+    """Top `top_k` associated products per product, as parallel arrays ordered by product then rank"""
+    import numpy as np
+    from scipy import sparse
+
+    sales, sale_index = np.unique(sale_ids, return_inverse=True)
+    products, product_index = np.unique(product_ids, return_inverse=True)
+    baskets = sparse.csr_matrix(
+        (np.ones(len(sale_index), dtype=np.int32), (sale_index, product_index)),
+        shape=(len(sales), len(products))
+    )
+    baskets.data[:] = 1  # A product on two lines of one sale is still one sale
+
+    together = (baskets.T @ baskets).tocoo()
+    sales_with = together.diagonal()
+    keep = (together.row != together.col) & (together.data >= min_support)
+    row, col, support = together.row[keep], together.col[keep], together.data[keep]
+
+    confidence = support / sales_with[row]
+    lift = confidence * len(sales) / sales_with[col]
+
+    order = np.lexsort((-support, -lift, row))  # By product, then best lift, then most support
+    row, col, support, confidence, lift = row[order], col[order], support[order], confidence[order], lift[order]
+    starts = np.flatnonzero(np.r_[True, row[1:] != row[:-1]])
+    rank = np.arange(len(row)) - np.repeat(starts, np.diff(np.r_[starts, len(row)]))
+    top = rank < top_k
+
+    return {
+        "product_id": products[row[top]],
+        "associated_product_id": products[col[top]],
+        "rank": rank[top] + 1,
+        "support": support[top],
+        "confidence": confidence[top],
+        "lift": lift[top]
+    }
+
+
+def rebuild(
+    db: Session,
+    user_id: int,
+    window_days: int = BASKET_WINDOW_DAYS,
+    top_k: int = BASKET_TOP_K,
+    min_support: int = BASKET_MIN_SUPPORT
+) -> int:
+    """Replace a shop's stored associations (caller commits); returns how many were stored"""
+    now = task_queue.utcnow()
+    sale_ids, product_ids = load_baskets(db, user_id, now - timedelta(days=window_days))
+    found = associations(sale_ids, product_ids, top_k=top_k, min_support=min_support)
+    columns = {name: values.tolist() for name, values in found.items()}  # Plain ints and floats for the driver
+    rows = [
+        {"user_id": user_id, "computed_at": now, **dict(zip(columns, values))}
+        for values in zip(*columns.values())
+    ]
+
+    db.execute(delete(Association).where(Association.user_id == user_id))
+    if rows:
+        db.execute(insert(Association), rows)
+    return len(rows)
+
+
+def rebuild_all(db: Session, user_id: Optional[int] = None, window_days: int = BASKET_WINDOW_DAYS) -> Dict[int, int]:
+    """Rebuild one shop, or every shop in this database, committing each"""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = db.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+    stored = {}
+    for shop_id in user_ids:
+        stored[shop_id] = rebuild(db, shop_id, window_days=window_days)
+        db.commit()
+    return stored
+
+
+@task_queue.daily
+def _rebuild_daily(db: Session):
+    if BASKET_DAILY:
+        rebuild_all(db)
+
+
+def suggestions(db: Session, user_id: int, cart_product_ids: List[int], limit: int = 5) -> List[dict]:
+    """Active products most often bought with the cart's, strongest first"""
+    if not cart_product_ids:
+        return []
+    rows = db.execute(
+        select(
+            Association.associated_product_id.label("product_id"),
+            Product.name,
+            Product.selling_price,
+            Association.product_id.label("because_of"),
+            Association.support,
+            Association.confidence,
+            Association.lift
+        )
+        .join(Product, Product.id == Association.associated_product_id)
+        .where(
+            Association.user_id == user_id,
+            Association.product_id.in_(cart_product_ids),
+            Association.associated_product_id.not_in(cart_product_ids),
+            Product.is_active == True
+        )
+        .order_by(Association.lift.desc(), Association.support.desc())
+    ).mappings()
+
+    best = {}  # Several cart products can suggest the same one; keep its strongest reason
+    for row in rows:
+        best.setdefault(row["product_id"], dict(row))
+        if len(best) == limit:
+            break
+    return list(best.values())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild frequently-bought-together associations")
+    parser.add_argument("--user-id", type=int, help="Only this shop")
+    parser.add_argument("--window-days", type=int, default=BASKET_WINDOW_DAYS, help="Sales from this many days back")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    started = time.perf_counter()
+    stored = {}
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            stored.update(rebuild_all(db, user_id, window_days=args.window_days))
+    print(f"✅ Stored {sum(stored.values())} associations for {len(stored)} shops in {time.perf_counter() - started:.1f}s")
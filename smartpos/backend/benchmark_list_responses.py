@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark the list endpoints' serialisation paths.
+
+Compares the old path (ORM objects -> pydantic response_model -> json) with
+the Core projection + orjson path used by /products, /inventory and /sales.
+Runs against a scratch SQLite database:
+
+    python benchmark_list_responses.py [rows]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from typing import List
+
+_DB_DIR = tempfile.mkdtemp(prefix="smartpos-bench-")
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_DB_DIR, "bench.db")
+os.environ["SQL_ECHO"] = "false"
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, selectinload
+
+from database import Base, SessionLocal, engine
+from fast_json import dumps
+import models, schemas, projections
+
+ROUNDS = 5
+
+
+def seed(rows: int):
+    """Bulk-insert one shop with `rows` products and `rows` two-line sales"""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{
+            "id": 1, "email": "bench@shop.com", "owner_name": "Bench", "shop_name": "Bench Shop"
+        }])
+        conn.execute(insert(models.Product), [{
+            "id": i, "user_id": 1, "name": f"Product {i}", "description": "Benchmark product",
+            "barcode": f"BC-{i:07d}", "sku": f"SKU-{i:07d}", "price": Decimal("10.00"),
+            "cost_price": Decimal("8.00"), "selling_price": Decimal("12.50"),
+            "tax_percentage": Decimal("5.00"), "is_active": True, "is_featured": False
+        } for i in range(1, rows + 1)])
+        conn.execute(insert(models.Inventory), [{
+            "product_id": i, "current_stock": 100, "minimum_stock": 5
+        } for i in range(1, rows + 1)])
+        conn.execute(insert(models.Sale), [{
+            "id": i, "user_id": 1, "invoice_number": f"BENCH-{i:07d}", "subtotal": Decimal("25.00"),
+            "total_amount": Decimal("25.00"), "payment_method": "cash", "payment_status": "completed",
+            "paid_amount": Decimal("25.00")
+        } for i in range(1, rows + 1)])
+        conn.execute(insert(models.SaleItem), [{
+            "sale_id": i, "product_id": (i + offset) % rows + 1, "quantity": 1,
+            "unit_price": Decimal("12.50"), "total_price": Decimal("12.50")
+        } for i in range(1, rows + 1) for offset in (0, 1)])
+
+
+def pydantic_path(schema, objects) -> bytes:
+    """What FastAPI does with a response_model: validate, dump, json-encode"""
+    adapter = TypeAdapter(List[schema])
+    validated = adapter.validate_python(objects, from_attributes=True)
+    return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+
+
+def old_products(db) -> bytes:
+    products = db.query(models.Product).options(joinedload(models.Product.inventory)).filter(
+        models.Product.user_id == 1, models.Product.is_active == True
+    ).all()
+    for product in products:
+        product.current_stock = product.inventory.current_stock
+        product.minimum_stock = product.inventory.minimum_stock
+    return pydantic_path(schemas.Product, products)
+
+
+def old_inventory(db) -> bytes:
+    inventory = db.query(models.Inventory).join(models.Product).filter(
+        models.Product.user_id == 1, models.Product.is_active == True
+    ).all()
+    return pydantic_path(schemas.Inventory, inventory)
+
+
+def old_sales(db) -> bytes:
+    sales = db.query(models.Sale).options(selectinload(models.Sale.items)).filter(
+        models.Sale.user_id == 1
+    ).order_by(models.Sale.created_at.desc()).all()
+    return pydantic_path(schemas.Sale, sales)
+
+
+CASES = [
+    ("products", old_products, lambda db: dumps(projections.product_rows(db, 1))),
+    ("inventory", old_inventory, lambda db: dumps(projections.inventory_rows(db, 1))),
+    ("sales", old_sales, lambda db: dumps(projections.sale_rows(db, 1))),
+]
+
+
+def best_time(fn) -> float:
+    """Fastest of ROUNDS runs, each with a fresh session"""
+    timings = []
+    for _ in range(ROUNDS):
+        db = SessionLocal()
+        try:
+            start = time.perf_counter()
+            fn(db)
+            timings.append(time.perf_counter() - start)
+        finally:
+            db.close()
+    return min(timings)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print(f"Seeding {rows} products and {rows} sales...")
+    seed(rows)
+
+    print(f"\n{'endpoint':<12}{'before us/row':>15}{'after us/row':>15}{'speedup':>10}")
+    for name, before, after in CASES:
+        before_time = best_time(before)
+        after_time = best_time(after)
+        print(
+            f"{name:<12}{before_time / rows * 1e6:>15.1f}{after_time / rows * 1e6:>15.1f}"
+            f"{before_time / after_time:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark worker import and startup time.
+
+Every round starts a fresh interpreter, as a new uvicorn worker would, and
+times importing the app module and then running its startup hooks. Also
+compares the per-start schema check with the create_all() call it replaced.
+Runs against a scratch SQLite database that is migrated once up front:
+
+    python benchmark_startup.py [rounds]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_DB_DIR = tempfile.mkdtemp(prefix="smartpos-bench-")
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_DB_DIR, "bench.db")
+os.environ["SQL_ECHO"] = "false"
+os.environ["TASK_WORKER_ENABLED"] = "false"
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+WORKER = """
+import json, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient({module}.app):
+    ready = time.perf_counter()
+print(json.dumps({{"import": imported - started, "startup": ready - imported}}))
+"""
+
+
+def time_worker(module: str, rounds: int) -> dict:
+    samples = []
+    for _ in range(rounds):
+        output = subprocess.run(
+            [sys.executable, "-c", WORKER.format(module=module)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {phase: statistics.median(s[phase] for s in samples) * 1000 for phase in ("import", "startup")}
+
+
+def time_in_process(func, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    from database import Base, engine
+    import schema_version
+
+    schema_version.upgrade()
+    print(f"Median of {rounds} fresh interpreters")
+    for module in ("main", "simple_api"):
+        result = time_worker(module, rounds)
+        print(f"  {module:<11} import {result['import']:7.1f} ms   startup hooks {result['startup']:7.1f} ms")
+
+    create_all = time_in_process(lambda: Base.metadata.create_all(bind=engine), rounds)
+    check = time_in_process(lambda: schema_version.ensure_schema(engine, auto_migrate=False), rounds)
+    print(f"  create_all() {create_all:7.2f} ms   vs schema version check {check:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Pre-built, compressed catalog snapshots for terminals on slow links.
+
+A snapshot holds a shop's active products in columnar JSON: one array per
+field instead of one object per product, so field names appear once. Prices
+and percentages are integers in hundredths (scale 100). The whole thing is
+gzipped, typically a small fraction of the /api/products payload.
+
+Every catalog version bump queues a rebuild in the same transaction. Bumps
+within CATALOG_SNAPSHOT_DELAY_SECONDS of a queued rebuild share it, so a
+busy till rebuilds a few times a minute, not once per sale. The task worker
+writes SNAPSHOT_DIR/shop_<user_id>.json.gz atomically. Serving reads the file,
+via an in-memory copy keyed on its mtime. Clients that accept gzip get the
+stored bytes as they are. Nothing touches the database unless the snapshot
+does not exist yet.
+
+The ETag is "snapshot-<user_id>-<catalog version>". A terminal that
+revalidates with If-None-Match gets a 304 until the catalog changes.
+"""
+import gzip
+import os
+import threading
+from decimal import Decimal
+from typing import Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import catalog_version
+import models
+import projections
+import task_queue
+import tenancy
+
+SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", "./snapshots")
+SNAPSHOT_DELAY_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_DELAY_SECONDS", "5"))
+SNAPSHOT_TASK = "catalog_snapshot"
+
+FIELDS = ["id", "category_id", "name", "barcode", "sku", "unit", "selling_price",
+          "discount_percentage", "tax_percentage", "current_stock"]
+SCALED_FIELDS = {"selling_price", "discount_percentage", "tax_percentage"}
+SCALE = 100
+
+_cache = {}  # user_id -> (mtime_ns, etag, gzipped bytes)
+_cache_lock = threading.Lock()
+
+
+def snapshot_path(user_id: int, directory: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(directory, f"shop_{user_id}.json.gz")
+
+
+def snapshot_etag(user_id: int, version: int) -> str:
+    return f'"snapshot-{user_id}-{version}"'
+
+
+def _scaled(value) -> Optional[int]:
+    return None if value is None else int((Decimal(value) * SCALE).to_integral_value())
+
+
+def encode(version: int, products: list) -> bytes:
+    """Columnar JSON of the products, gzipped with a fixed mtime so equal input gives equal bytes"""
+    columns = {
+        field: [_scaled(p[field]) if field in SCALED_FIELDS else p[field] for p in products]
+        for field in FIELDS
+    }
+    document = {
+        "version": version,
+        "count": len(products),
+        "scale": {field: SCALE for field in sorted(SCALED_FIELDS)},
+        "columns": columns
+    }
+    return gzip.compress(orjson.dumps(document), compresslevel=9, mtime=0)
+
+
+def decode(blob: bytes) -> dict:
+    return orjson.loads(gzip.decompress(blob))
+
+
+def _stored_version(path: str) -> Optional[int]:
+    try:
+        with open(path, "rb") as f:
+            return decode(f.read())["version"]
+    except FileNotFoundError:
+        return None
+
+
+def build_snapshot(db: Session, user_id: int, directory: str = SNAPSHOT_DIR) -> bool:
+    """Write the shop's snapshot unless the stored one is already current"""
+    version = db.execute(
+        select(models.CatalogVersion.version).where(models.CatalogVersion.user_id == user_id)
+    ).scalar_one_or_none() or 0
+    path = snapshot_path(user_id, directory)
+    stored = _stored_version(path)
+    if stored == version:
+        return False  # A burst of edits queues several rebuilds; the first does the work
+
+    columns = [projections.PRODUCT_FIELDS[field] for field in FIELDS]
+    products = projections.product_rows(db, user_id, columns=columns)
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+    with open(partial, "wb") as f:
+        f.write(encode(version, products))
+    os.replace(partial, path)
+    return True
+
+
+@task_queue.handler(SNAPSHOT_TASK)
+def _rebuild(db: Session, user_id: int, payload: dict):
+    build_snapshot(db, user_id)
+
+
+def schedule_rebuild(db: Session, user_id: int):
+    """Queue a rebuild in the caller's (catalog-changing) transaction, once per burst"""
+    task_queue.enqueue_coalesced(db, SNAPSHOT_TASK, user_id, delay_seconds=SNAPSHOT_DELAY_SECONDS)
+
+
+def load(user_id: int, directory: str = SNAPSHOT_DIR) -> Optional[Tuple[str, bytes]]:
+    """(etag, gzipped bytes) of the stored snapshot, or None if there is none"""
+    path = snapshot_path(user_id, directory)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    cached = _cache.get(user_id)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+    with open(path, "rb") as f:
+        blob = f.read()
+    etag = snapshot_etag(user_id, decode(blob)["version"])
+    with _cache_lock:
+        _cache[user_id] = (mtime, etag, blob)
+    return etag, blob
+
+
+def response_for(request: Request, user_id: int, directory: str = SNAPSHOT_DIR) -> Response:
+    """The snapshot as an HTTP response, building it first if it doesn't exist yet"""
+    stored = load(user_id, directory)
+    if stored is None:
+        with tenancy.open_session(user_id) as db:
+            build_snapshot(db, user_id, directory)
+        stored = load(user_id, directory)
+    etag, blob = stored
+
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if catalog_version.etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(blob, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(gzip.decompress(blob), media_type="application/json", headers=headers)
@@ -0,0 +1,45 @@
+"""
+Delta sync of the catalog for terminals holding a stale copy.
+
+A terminal sends back the watermark from its previous sync and receives only
+the products and inventory rows changed since then, plus the ids of products
+deleted (deactivated) since then. Watermarks are database timestamps; the
+comparison is inclusive and the returned watermark lags the database clock
+by SYNC_OVERLAP_SECONDS, so rows written by transactions still in flight are
+sent again on the next sync rather than missed. Clients apply rows as
+upserts by id, which makes those repeats harmless.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+import models, projections
+
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "5"))
+
+
+def catalog_changes(db: Session, user_id: int, since: Optional[datetime] = None) -> dict:
+    """Products, inventory and tombstones changed at or after `since` (everything if None)"""
+    # Read the clock first: anything committed after this point is in the next sync
+    now = db.execute(select(func.now())).scalar_one()
+
+    deleted = []
+    if since is not None:
+        deleted = db.execute(
+            select(models.Product.id).where(
+                models.Product.user_id == user_id,
+                models.Product.is_active == False,
+                models.Product.updated_at >= since
+            )
+        ).scalars().all()
+
+    return {
+        "watermark": now - timedelta(seconds=SYNC_OVERLAP_SECONDS),
+        "full": since is None,
+        "products": projections.product_rows(db, user_id, updated_since=since),
+        "inventory": projections.inventory_rows(db, user_id, updated_since=since),
+        "deleted_product_ids": deleted
+    }
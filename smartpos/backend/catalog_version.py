@@ -0,0 +1,81 @@
+"""
+Per-shop catalog version for HTTP caching of the catalog and inventory lists.
+
+Every product, category or stock mutation calls bump_catalog_version() in
+its own transaction, so the version changes exactly when the lists can.
+List endpoints send the version as a strong ETag and answer a matching
+If-None-Match with 304 after a single primary-key lookup on
+catalog_versions, without touching the products table. Each bump also
+queues a rebuild of the shop's compressed snapshot (catalog_snapshot).
+"""
+from fastapi import Request, Response
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import catalog_snapshot
+import models
+
+CACHE_HEADERS = {"Cache-Control": "no-cache"}  # Clients may store lists but must revalidate
+
+
+def bump_catalog_version(db: Session, user_id: int) -> int:
+    """Advance the shop's catalog version in the caller's transaction"""
+    version = _advance(db, user_id)
+    catalog_snapshot.schedule_rebuild(db, user_id)
+    return version
+
+
+def _advance(db: Session, user_id: int) -> int:
+    counter = models.CatalogVersion
+    version = db.execute(
+        update(counter)
+        .where(counter.user_id == user_id)
+        .values(version=counter.version + 1)
+        .returning(counter.version)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+    if version is None:
+        try:
+            with db.begin_nested():
+                db.add(counter(user_id=user_id, version=1))
+            return 1
+        except IntegrityError:
+            # Created concurrently; bump the existing row
+            return _advance(db, user_id)
+    return version
+
+
+def get_catalog_version(db: Session, user_id: int) -> int:
+    version = db.execute(
+        select(models.CatalogVersion.version).where(models.CatalogVersion.user_id == user_id)
+    ).scalar_one_or_none()
+    return version or 0
+
+
+def catalog_etag(user_id: int, version: int) -> str:
+    return f'"catalog-{user_id}-{version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def check_not_modified(request: Request, db: Session, user_id: int):
+    """Returns (etag, 304 response or None) for a catalog list request"""
+    etag = catalog_etag(user_id, get_catalog_version(db, user_id))
+    if etag_matches(request, etag):
+        return etag, Response(status_code=304, headers={"ETag": etag, **CACHE_HEADERS})
+    return etag, None
+
+
+def cache_headers(etag: str) -> dict:
+    return {"ETag": etag, **CACHE_HEADERS}
@@ -0,0 +1,235 @@
+"""
+Shared pytest fixtures for the SmartPOS backend.
+
+The apps run in-process through FastAPI's TestClient against a throwaway
+SQLite file, so neither a running server nor the real smartpos.db is needed.
+"""
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+# Point database.py at a scratch database before anything imports it
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="smartpos-test-")
+os.environ["DATABASE_TYPE"] = "sqlite"
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_TEST_DB_DIR, "smartpos_test.db")
+os.environ["SQL_ECHO"] = "false"
+os.environ["TASK_WORKER_ENABLED"] = "false"  # Tests drain the task queue explicitly
+os.environ["SALES_ARCHIVE_DIR"] = os.path.join(_TEST_DB_DIR, "archive")
+os.environ["PRICE_CACHE_TTL_SECONDS"] = "0"  # Quotes always revalidate the catalog version
+os.environ["CATALOG_SNAPSHOT_DIR"] = os.path.join(_TEST_DB_DIR, "snapshots")
+os.environ["CATALOG_SNAPSHOT_DELAY_SECONDS"] = "0"  # Rebuilds are due as soon as they're queued
+
+import pytest
+from sqlalchemy import event, update
+from sqlalchemy.engine import Engine
+from fastapi.testclient import TestClient
+
+from database import Base, SessionLocal, engine
+import models, auth, pricing, login_guard, schema_version, inventory_valuation
+
+# Live-server smoke scripts; run them with `python test_auth.py` against a running API
+collect_ignore = ["test_auth.py", "test_basic.py", "test_products.py"]
+
+SEED_PASSWORD = "1234"
+_password_hash = None
+
+
+class QueryCounter:
+    """Context manager counting SQL statements issued through an engine
+
+    By default every engine counts: shop databases under per-shop routing
+    and read replicas issue statements on engines of their own.
+    """
+
+    def __init__(self, bind=Engine):
+        self.bind = bind
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.bind, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.bind, "before_cursor_execute", self._record)
+        return False
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def report(self) -> str:
+        """All recorded statements, numbered, for assertion messages"""
+        return "\n".join(f"{i + 1}: {sql}" for i, sql in enumerate(self.statements))
+
+
+def seed_password_hash() -> str:
+    """bcrypt is slow, so hash the seed password once per run"""
+    global _password_hash
+    if _password_hash is None:
+        _password_hash = auth.get_password_hash(SEED_PASSWORD)
+    return _password_hash
+
+
+def add_owner(db, username: str) -> int:
+    """Create a bare shop owner; returns its user id"""
+    user = models.User(
+        supabase_user_id=f"{username}-id", username=username, email=username,
+        owner_name="Owner", phone="1234567890", shop_name="Shop",
+        password_hash=seed_password_hash()
+    )
+    db.add(user)
+    db.commit()
+    return user.id
+
+
+def seed_shop(db, products: int = 3, sales: int = 3, stock: Optional[int] = None) -> dict:
+    """Create a shop owner (id 1) with products, a customer and sales
+
+    Products have 2 and 1000 in stock by turns, unless `stock` is given.
+    """
+    user = models.User(
+        supabase_user_id="seed-user",
+        username="owner@shop.com",
+        email="owner@shop.com",
+        owner_name="Seed Owner",
+        phone="1234567890",
+        shop_name="Seed Shop",
+        password_hash=seed_password_hash(),
+        is_active=True
+    )
+    db.add(user)
+    db.flush()
+
+    category = models.Category(user_id=user.id, name="General")
+    customer = models.Customer(user_id=user.id, name="Walk-in Regular", phone="9999999999")
+    db.add_all([category, customer, models.CatalogVersion(user_id=user.id, version=1)])
+    db.flush()
+
+    product_rows = []
+    for i in range(products):
+        product = models.Product(
+            user_id=user.id,
+            category_id=category.id,
+            name=f"Product {i}",
+            barcode=f"BC-{i:05d}",
+            sku=f"SKU-{i:05d}",
+            price=Decimal("10.00") + i,
+            selling_price=Decimal("12.00") + i,
+            cost_price=Decimal("8.00") + i,
+            tax_percentage=Decimal("5.00")
+        )
+        product.inventory = models.Inventory(
+            current_stock=stock if stock is not None else (1000 if i % 2 else 2),
+            minimum_stock=5
+        )
+        product_rows.append(product)
+    db.add_all(product_rows)
+    db.flush()
+
+    sale_rows = []
+    for i in range(sales):
+        lines = [product_rows[i % products], product_rows[(i + 1) % products]]
+        total = sum((p.selling_price for p in lines), Decimal("0.00"))
+        sale = models.Sale(
+            user_id=user.id,
+            customer_id=customer.id,
+            invoice_number=f"SEED-{i:05d}",
+            subtotal=total,
+            total_amount=total,
+            payment_method="cash",
+            paid_amount=total
+        )
+        sale.items = [
+            models.SaleItem(
+                product_id=p.id,
+                quantity=1,
+                unit_price=p.selling_price,
+                total_price=p.selling_price
+            )
+            for p in lines
+        ]
+        sale_rows.append(sale)
+    db.add_all(sale_rows)
+    inventory_valuation.reconcile(db, user.id)  # As if the stock had come in through the API
+    db.commit()
+
+    return {
+        "user_id": user.id,
+        "supabase_user_id": user.supabase_user_id,
+        "email": user.email,
+        "category_id": category.id,
+        "customer_id": customer.id,
+        "product_ids": [p.id for p in product_rows],
+        "sale_ids": [s.id for s in sale_rows],
+    }
+
+
+def sell(client, shop, *lines, unit_price: str = "12.00", sold_at: Optional[datetime] = None) -> dict:
+    """Ring up (product index, quantity) lines of a seeded shop through POST /sales
+
+    `sold_at` backdates the sale afterwards, for history the API can't create.
+    """
+    items = [
+        {"product_id": shop["product_ids"][product], "quantity": quantity, "unit_price": unit_price}
+        for product, quantity in lines
+    ]
+    response = client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "100000.00", "items": items
+    })
+    assert response.status_code == 200, response.text
+    sale = response.json()
+    if sold_at is not None:
+        with SessionLocal() as db:
+            db.execute(update(models.Sale).where(models.Sale.id == sale["id"]).values(sale_date=sold_at))
+            db.commit()
+    return sale
+
+
+@pytest.fixture(scope="session")
+def migrated_schema():
+    """Stamp the scratch database at the head revision once; drop_all() leaves alembic_version alone"""
+    schema_version.upgrade(engine)
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(migrated_schema):
+    """Every test starts from an empty schema"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    pricing.price_cache.clear()  # Shop ids and catalog versions repeat between tests
+    login_guard.reset()  # Every test logs in from the same TestClient address
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def count_queries():
+    """Usage: `with count_queries() as counter: ...; assert counter.count <= 3`"""
+    return QueryCounter
+
+
+@pytest.fixture
+def client():
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def simple_client():
+    import simple_api
+    with TestClient(simple_api.app) as test_client:
+        yield test_client
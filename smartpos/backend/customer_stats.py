@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Customer purchase aggregates and purchase history.
+
+create_sale calls record_purchase() inside its transaction. One UPDATE adds
+the sale to the customer's total_purchases, moves last_purchase_at and adds
+any unpaid remainder (credit or partial payment) to current_balance, so the
+aggregates are never out of step with the sales table.
+
+Purchase history lists the sales still in the sales table. Sales moved out
+by sales_archive.py leave history (their archive rows carry no customer)
+but stay counted in total_purchases; GET /sales/{id} and /sales/export
+still return them.
+
+Customers whose sales predate this bookkeeping can be backfilled with
+`python customer_stats.py backfill`, before any of their sales are archived.
+"""
+import argparse
+import math
+import os
+import sys
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import models
+import projections
+
+Customer = models.Customer
+Sale = models.Sale
+
+
+def record_purchase(db: Session, user_id: int, customer_id: int, total_amount: Decimal, paid_amount: Decimal) -> bool:
+    """Add a sale to the customer's aggregates; False if the shop has no such customer"""
+    unpaid = max(total_amount - paid_amount, Decimal("0.00"))
+    updated = db.execute(
+        update(Customer)
+        .where(Customer.id == customer_id, Customer.user_id == user_id)
+        .values(
+            total_purchases=func.coalesce(Customer.total_purchases, 0) + total_amount,
+            current_balance=func.coalesce(Customer.current_balance, 0) + unpaid,
+            last_purchase_at=func.now()
+        )
+        .returning(Customer.id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    return updated is not None
+
+
+def purchase_page(db: Session, customer_id: int, page: int = 1, per_page: int = 50) -> dict:
+    """Newest-first live (not archived) sales of one customer, one page at a time"""
+    total = db.execute(
+        select(func.count(Sale.id)).where(Sale.customer_id == customer_id)
+    ).scalar_one()
+
+    rows = db.execute(
+        select(*projections.SALE_COLUMNS)
+        .where(Sale.customer_id == customer_id)
+        .order_by(Sale.sale_date.desc(), Sale.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    ).mappings()
+
+    return {
+        "items": [dict(row) for row in rows],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": math.ceil(total / per_page) if total else 0
+    }
+
+
+def backfill(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute total_purchases and last_purchase_at from the sales table
+
+    current_balance is left alone: settled credit isn't recorded anywhere, so
+    it can't be rebuilt from sales.
+    """
+    of_customer = Sale.customer_id == Customer.id
+    query = update(Customer).values(
+        total_purchases=select(func.coalesce(func.sum(Sale.total_amount), 0)).where(of_customer).scalar_subquery(),
+        last_purchase_at=select(func.max(Sale.sale_date)).where(of_customer).scalar_subquery()
+    )
+    if user_id is not None:
+        query = query.where(Customer.user_id == user_id)
+    return db.execute(query.execution_options(synchronize_session=False)).rowcount
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartPOS customer aggregate tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Recompute lifetime totals from existing sales")
+    backfill_parser.add_argument("--user-id", type=int, help="Only this shop")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    count = 0
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            count += backfill(db, user_id=user_id)
+            db.commit()
+    print(f"✅ Recomputed purchase totals for {count} customers")
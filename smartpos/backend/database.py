@@ -1,29 +1,71 @@
 from sqlalchemy import create_engine, MetaData
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool, StaticPool
 from typing import Generator
 import os
 from dotenv import load_dotenv
 
+import query_stats
+from db_pool import MeteredQueuePool
+
 # Load environment variables
 load_dotenv()
 
 # Database configuration
 DATABASE_TYPE = os.getenv("DATABASE_TYPE", "sqlite")  # sqlite, postgresql
 DATABASE_URL = os.getenv("DATABASE_URL")
+SQL_ECHO = os.getenv("SQL_ECHO", "true").lower() == "true"
+
+# Connection pool (statistics on /health and /metrics, see db_pool.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Reconnect PostgreSQL connections older than this
+SQLITE_POOL = os.getenv("SQLITE_POOL", "queue")  # queue (servers), null (scripts, many processes)
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+def engine_options(url: str) -> dict:
+    """create_engine() pool arguments for a database URL"""
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}}
+        if ":memory:" in url or url in ("sqlite://", "sqlite:///"):
+            # One shared connection, or every checkout would see a different empty database
+            return {**options, "poolclass": StaticPool}
+        if SQLITE_POOL == "null":
+            return {**options, "poolclass": NullPool}
+        # File connections are cheap and never go stale, so no recycle or pre-ping
+        return {
+            **options,
+            "poolclass": MeteredQueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT
+        }
+    return {
+        "poolclass": MeteredQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True
+    }
 
 if DATABASE_TYPE == "postgresql" and DATABASE_URL:
     # Production PostgreSQL
     SQLALCHEMY_DATABASE_URL = DATABASE_URL
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 else:
-    # Development SQLite
-    SQLALCHEMY_DATABASE_URL = "sqlite:///./smartpos.db"
+    # Development SQLite (DATABASE_URL may point at another SQLite file)
+    SQLALCHEMY_DATABASE_URL = DATABASE_URL or "sqlite:///./smartpos.db"
     engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, 
-        connect_args={"check_same_thread": False},
-        echo=True  # Enable SQL logging for development
+        SQLALCHEMY_DATABASE_URL,
+        echo=SQL_ECHO,  # SQL logging for development, disable with SQL_ECHO=false
+        **engine_options(SQLALCHEMY_DATABASE_URL)
     )
 
+if query_stats.QUERY_STATS:
+    query_stats.install()  # Every engine, including replicas and shop databases
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Base with naming convention for better constraint names
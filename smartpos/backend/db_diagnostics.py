@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Database health report: what is big, what is slow and which indexes the
+hot queries actually use.
+
+    python db_diagnostics.py                          # shared database, or DATABASE_URL
+    python db_diagnostics.py --user-id 3              # one shop's database under per-shop routing
+    python db_diagnostics.py --server http://127.0.0.1:8000 --json > diagnostics.json
+
+The report covers:
+
+- tables: row count and bytes on disk, each index with its bytes. Sizes come
+  from SQLite's dbstat table where the build has it (PostgreSQL:
+  pg_table_size and pg_relation_size), else they are left out.
+- hot queries: the plan of each statement from hot_queries(), which
+  indexes it used and any table it has to scan in full. Indexes no hot
+  query uses are marked; they may still serve rarer queries.
+- storage: page and freelist counts and the WAL file size for SQLite. A
+  large freelist means deleted rows left free pages behind, and VACUUM
+  would reclaim them. For PostgreSQL: database size and dead tuples.
+- slow statements: with --server, the slowest statements the running API
+  has timed (GET /diagnostics/queries, see query_stats.py).
+
+--json prints the whole report as one object with a timestamp. Saving one a
+day gives a record of how tables and indexes grow.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import Select, func, inspect, or_, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+import inventory_lots
+import models
+
+FREELIST_WARN_RATIO = 0.2  # Suggest VACUUM above this share of free pages
+WAL_WARN_BYTES = 64 * 1024 * 1024
+
+
+def hot_queries(user_id: int) -> Dict[str, Select]:
+    """Statements shaped like the API's busiest reads and writes, with sample values"""
+    now = datetime(2026, 1, 1)
+    Product, Inventory, Sale = models.Product, models.Inventory, models.Sale
+    Task = models.BackgroundTask
+    return {
+        "product_list": select(Product.id, Product.name, Product.selling_price)
+            .where(Product.user_id == user_id, Product.is_active == True).order_by(Product.name),
+        "product_by_barcode": select(Product.id).where(Product.barcode == "8901234567890"),
+        "catalog_changes": select(Product.id)
+            .where(Product.user_id == user_id, Product.updated_at > now).order_by(Product.updated_at),
+        "low_stock": select(Product.id).join(Inventory)
+            .where(Product.user_id == user_id, Inventory.current_stock <= Inventory.minimum_stock),
+        "sales_by_date": select(Sale.id)
+            .where(Sale.user_id == user_id, Sale.sale_date >= now - timedelta(days=30))
+            .order_by(Sale.sale_date.desc()),
+        "customer_purchases": select(Sale.id).where(Sale.customer_id == 1).order_by(Sale.sale_date.desc()).limit(50),
+        "sale_items": select(models.SaleItem.id).where(models.SaleItem.sale_id.in_([1, 2, 3])),
+        "stock_adjustments": select(models.InventoryAdjustment.id)
+            .where(models.InventoryAdjustment.inventory_id == 1)
+            .order_by(models.InventoryAdjustment.created_at.desc()),
+        "expiring_lots": select(inventory_lots.Lot.id)
+            .where(inventory_lots.Lot.user_id == user_id, inventory_lots.HAS_STOCK,
+                   inventory_lots.Lot.expiry_date <= now.date())
+            .order_by(inventory_lots.Lot.expiry_date),
+        "daily_sales": select(models.DailySalesRollup.id)
+            .where(models.DailySalesRollup.user_id == user_id, models.DailySalesRollup.sale_date >= now.date()),
+        "margin_report": select(models.DailyProductMargin.product_id, func.sum(models.DailyProductMargin.revenue))
+            .where(models.DailyProductMargin.user_id == user_id, models.DailyProductMargin.sale_date >= now.date())
+            .group_by(models.DailyProductMargin.product_id),
+        "product_suggestions": select(models.ProductAssociation.associated_product_id)
+            .where(models.ProductAssociation.user_id == user_id, models.ProductAssociation.product_id.in_([1, 2])),
+        "task_claim": select(Task.id)
+            .where(or_((Task.status == "pending") & (Task.run_after <= now), Task.status == "running"))
+            .order_by(Task.id).limit(10),
+    }
+
+
+def _sizes(conn: Connection) -> Dict[str, Optional[int]]:
+    """Bytes per table and index, {} when the database can't say"""
+    try:
+        if conn.dialect.name == "sqlite":
+            return dict(conn.exec_driver_sql("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").all())
+        if conn.dialect.name == "postgresql":
+            return dict(conn.exec_driver_sql(
+                "SELECT relname, CASE relkind WHEN 'r' THEN pg_table_size(oid) ELSE pg_relation_size(oid) END "
+                "FROM pg_class "
+                "WHERE relnamespace = 'public'::regnamespace AND relkind IN ('r', 'i')"
+            ).all())
+    except DBAPIError:  # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        conn.rollback()
+    return {}
+
+
+def table_report(conn: Connection) -> List[dict]:
+    inspector = inspect(conn)
+    sizes = _sizes(conn)
+    tables = []
+    for name in sorted(inspector.get_table_names()):
+        quoted = conn.dialect.identifier_preparer.quote(name)
+        indexes = [
+            {"name": index["name"], "columns": index["column_names"], "unique": bool(index["unique"]),
+             "bytes": sizes.get(index["name"])}
+            for index in inspector.get_indexes(name)
+        ]
+        tables.append({
+            "name": name,
+            "rows": conn.exec_driver_sql(f"SELECT COUNT(*) FROM {quoted}").scalar_one(),
+            "bytes": sizes.get(name),
+            "indexes": indexes
+        })
+    return tables
+
+
+SQLITE_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+SQLITE_FULL_SCAN = re.compile(r"^SCAN (\w+)(?!\w)(?! USING)")
+POSTGRES_INDEX = re.compile(r"(?:Index Scan|Index Only Scan|Bitmap Index Scan) (?:using|on) (\w+)")
+POSTGRES_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def explain(conn: Connection, statement) -> dict:
+    """The plan of one statement: its lines, indexes used, tables scanned in full"""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "sqlite":
+        plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+    else:
+        plan = [row[0].strip() for row in conn.exec_driver_sql(f"EXPLAIN {sql}")]
+    return summarize_plan(plan, conn.dialect.name)
+
+
+def summarize_plan(plan: List[str], dialect_name: str) -> dict:
+    if dialect_name == "sqlite":
+        index_pattern, scan_pattern = SQLITE_INDEX, SQLITE_FULL_SCAN
+    else:
+        index_pattern, scan_pattern = POSTGRES_INDEX, POSTGRES_FULL_SCAN
+    return {
+        "plan": plan,
+        "indexes": sorted({match for line in plan for match in index_pattern.findall(line)}),
+        "full_scans": sorted({match.group(1) for line in plan if (match := scan_pattern.search(line))}),
+        "temp_sort": any("TEMP B-TREE" in line or line.startswith("Sort") for line in plan)
+    }
+
+
+def hot_query_report(conn: Connection, user_id: int) -> List[dict]:
+    report = []
+    for name, statement in hot_queries(user_id).items():
+        try:
+            report.append({"name": name, **explain(conn, statement)})
+        except DBAPIError as exc:  # Usually a schema behind the code: run schema_version.py upgrade
+            conn.rollback()
+            report.append({"name": name, "error": str(exc.orig), "plan": [], "indexes": [], "full_scans": [], "temp_sort": False})
+    return report
+
+
+def storage_report(conn: Connection) -> dict:
+    if conn.dialect.name == "sqlite":
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+        page_size, pages, free = pragma("page_size"), pragma("page_count"), pragma("freelist_count")
+        path = conn.engine.url.database
+        on_disk = path and path != ":memory:" and os.path.exists(path)
+        wal = f"{path}-wal" if on_disk else None
+        return {
+            "journal_mode": pragma("journal_mode"),
+            "page_size": page_size,
+            "page_count": pages,
+            "freelist_pages": free,
+            "freelist_ratio": round(free / pages, 4) if pages else 0.0,
+            "file_bytes": os.path.getsize(path) if on_disk else page_size * pages,
+            "wal_bytes": os.path.getsize(wal) if wal and os.path.exists(wal) else 0
+        }
+    if conn.dialect.name == "postgresql":
+        dead = conn.exec_driver_sql(
+            "SELECT relname, n_live_tup, n_dead_tup FROM pg_stat_user_tables ORDER BY n_dead_tup DESC"
+        ).all()
+        return {
+            "database_bytes": conn.exec_driver_sql("SELECT pg_database_size(current_database())").scalar_one(),
+            "dead_tuples": {name: {"live": live, "dead": dead} for name, live, dead in dead}
+        }
+    return {}
+
+
+def fetch_slow_statements(server: str, limit: int) -> Optional[dict]:
+    """The running API's slowest statements, None if it can't be reached"""
+    url = f"{server.rstrip('/')}/diagnostics/queries?limit={limit}"
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.load(response)
+    except (OSError, ValueError) as exc:
+        print(f"⚠️ Could not read statement timings from {url}: {exc}", file=sys.stderr)
+        return None
+
+
+def diagnose(engine: Engine, user_id: int = 1, server: Optional[str] = None, slow_limit: int = 20) -> dict:
+    """The full report as a JSON-serialisable dict"""
+    with engine.connect() as conn:
+        tables = table_report(conn)
+        hot_queries = hot_query_report(conn, user_id)
+        storage = storage_report(conn)
+
+    used_by: Dict[str, List[str]] = {}
+    for query in hot_queries:
+        for index in query["indexes"]:
+            used_by.setdefault(index, []).append(query["name"])
+    for table in tables:
+        for index in table["indexes"]:
+            index["used_by"] = used_by.get(index["name"], [])
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "database": engine.url.render_as_string(hide_password=True),
+        "dialect": engine.dialect.name,
+        "tables": tables,
+        "hot_queries": hot_queries,
+        "storage": storage,
+        "slow_statements": fetch_slow_statements(server, slow_limit) if server else None
+    }
+
+
+def _size(value: Optional[int]) -> str:
+    if value is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if value < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def print_report(report: dict):
+    print(f"Database: {report['database']} ({report['dialect']})\n")
+
+    print("Tables")
+    for table in sorted(report["tables"], key=lambda t: t["rows"], reverse=True):
+        index_bytes = sum(index["bytes"] or 0 for index in table["indexes"])
+        print(f"  {table['name']:<28} {table['rows']:>10} rows  {_size(table['bytes']):>9}"
+              f"  + {_size(index_bytes if table['bytes'] is not None else None):>9} in {len(table['indexes'])} indexes")
+
+    print("\nIndexes")
+    for table in report["tables"]:
+        for index in table["indexes"]:
+            used = ", ".join(index["used_by"]) or "no hot query"
+            unique = " unique" if index["unique"] else ""
+            print(f"  {index['name']:<44} {_size(index['bytes']):>9}{unique}  ({', '.join(index['columns'])}) <- {used}")
+
+    print("\nHot queries")
+    for query in report["hot_queries"]:
+        if "error" in query:
+            print(f"  ❌ {query['name']:<22} {query['error']}")
+            continue
+        mark = "⚠️" if query["full_scans"] else "✅"
+        detail = f"scans {', '.join(query['full_scans'])}" if query["full_scans"] else ", ".join(query["indexes"])
+        sort = " + sort" if query["temp_sort"] else ""
+        print(f"  {mark} {query['name']:<22} {detail or 'primary key'}{sort}")
+
+    storage = report["storage"]
+    print("\nStorage")
+    for key, value in storage.items():
+        if key != "dead_tuples":
+            print(f"  {key:<16} {_size(value) if key.endswith('bytes') else value}")
+    if storage.get("freelist_ratio", 0) > FREELIST_WARN_RATIO:
+        print(f"  ⚠️ {storage['freelist_ratio']:.0%} of pages are free; VACUUM would reclaim {_size(storage['freelist_pages'] * storage['page_size'])}")
+    if storage.get("wal_bytes", 0) > WAL_WARN_BYTES:
+        print("  ⚠️ The WAL is large; a long-running reader may be blocking checkpoints")
+
+    slow = report["slow_statements"]
+    if slow is not None:
+        print(f"\nSlowest statements since {slow['since']}")
+        for row in slow["statements"]:
+            print(f"  {row['total_seconds']:>9.3f}s total {row['count']:>8}x  max {row['max_seconds']:.3f}s  {row['statement'][:100]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report table sizes, index usage, fragmentation and slow statements")
+    parser.add_argument("--user-id", type=int, help="Shop whose database to inspect (per-shop routing) and to plan queries for")
+    parser.add_argument("--server", help="Base URL of the running API, to include its slowest statements")
+    parser.add_argument("--slow-limit", type=int, default=20, help="Slow statements to include")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    import tenancy
+
+    with tenancy.open_session(args.user_id) as db:
+        engine = db.get_bind()
+        engine.echo = False  # SQL logging would mix into the report
+        report = diagnose(engine, user_id=args.user_id or 1, server=args.server, slow_limit=args.slow_limit)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report)
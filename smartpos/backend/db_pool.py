@@ -0,0 +1,112 @@
+"""
+Connection pool metering for /health and /metrics.
+
+MeteredQueuePool is SQLAlchemy's QueuePool plus counters for checkouts,
+the time spent waiting for a connection, and checkouts that timed out.
+Only a checkout that found the pool full (nothing idle, no overflow left)
+counts as a wait; opening a new connection, which can take a while on
+PostgreSQL, does not.
+pool_stats() combines those with the pool's own gauges: checked out, idle
+and overflow connections.
+
+The counters start again from zero when an engine is disposed.
+"""
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+WAIT_THRESHOLD_SECONDS = 0.001  # Checkouts slower than this count as having waited
+
+
+class MeteredQueuePool(QueuePool):
+    def __init__(self, creator, pool_size: int = 5, max_overflow: int = 10, **kw):
+        super().__init__(creator, pool_size=pool_size, max_overflow=max_overflow, **kw)
+        self.max_overflow = max_overflow
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self._metrics_lock = threading.Lock()
+
+    def _do_get(self):
+        full = self._pool.empty() and -1 < self._max_overflow <= self.overflow()
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeout:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                if full and waited > WAIT_THRESHOLD_SECONDS:
+                    self.waits += 1
+                    self.wait_seconds_total += waited
+                    self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(0, pool.overflow()),
+            timeout_seconds=pool.timeout()
+        )
+    if isinstance(pool, MeteredQueuePool):
+        stats.update(
+            max_overflow=pool.max_overflow,
+            checkouts=pool.checkouts,
+            waits=pool.waits,
+            wait_seconds_total=round(pool.wait_seconds_total, 6),
+            wait_seconds_max=round(pool.wait_seconds_max, 6),
+            timeouts=pool.timeouts
+        )
+    return stats
+
+
+def all_pools() -> List[Tuple[str, object]]:
+    """(name, engine) for the primary, each read replica and each open shop database"""
+    import database, read_replicas, tenancy
+
+    pools = [("primary", database.engine)]
+    if read_replicas.replica_set is not None:
+        pools += [(f"replica_{i}", engine) for i, engine in enumerate(read_replicas.replica_set.engines)]
+    if tenancy.router is not None:
+        pools += [(f"shop_{user_id}", engine) for user_id, engine in tenancy.router.open_engines()]
+    return pools
+
+
+METRICS = [
+    # (stat, metric suffix, type, help)
+    ("checked_out", "checked_out", "gauge", "Connections currently checked out"),
+    ("idle", "idle", "gauge", "Connections idle in the pool"),
+    ("overflow", "overflow", "gauge", "Connections open beyond pool_size"),
+    ("size", "size", "gauge", "Configured pool_size"),
+    ("checkouts", "checkouts_total", "counter", "Connection checkouts"),
+    ("waits", "waits_total", "counter", "Checkouts that had to wait for a connection"),
+    ("wait_seconds_total", "wait_seconds_total", "counter", "Time spent waiting for connections"),
+    ("wait_seconds_max", "wait_seconds_max", "gauge", "Longest wait for a connection"),
+    ("timeouts", "timeouts_total", "counter", "Checkouts that timed out waiting"),
+]
+
+
+def prometheus_text(pools: List[Tuple[str, object]]) -> str:
+    """Pool statistics in the Prometheus text exposition format"""
+    stats: Dict[str, dict] = {name: pool_stats(engine) for name, engine in pools}
+    lines = []
+    for stat, suffix, kind, help_text in METRICS:
+        name = f"smartpos_db_pool_{suffix}"
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{pool="{pool}"}} {values[stat]}' for pool, values in stats.items() if stat in values]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,167 @@
+"""
+In-process pub/sub for catalog and stock change events.
+
+Handlers publish compact events after they commit; every connected client of
+a shop gets them through GET /events (server-sent events). Each subscriber
+has a bounded queue. A client that falls behind is not allowed to slow the
+publisher down: its backlog is discarded and replaced by a single "resync"
+event, telling it to refetch the lists it shows.
+
+Events are not persisted or replayed, so a client that reconnects should
+refetch once and then follow the stream again.
+"""
+import asyncio
+import itertools
+import os
+import threading
+from typing import Dict, Optional, Set
+
+from fastapi.responses import StreamingResponse
+
+from fast_json import dumps
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "256"))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", "15"))
+
+
+class Subscription:
+    """One client's view of a shop's event stream"""
+
+    def __init__(self, broker: "EventBroker", user_id: int, loop: asyncio.AbstractEventLoop, size: int):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=size)
+        self.dropped = 0  # Events discarded because the client fell behind
+
+    def _deliver(self, event: dict):
+        """Runs on the subscriber's event loop"""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Everything queued is stale now; the client has to refetch anyway
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.dropped += 1
+            self.queue.put_nowait({"id": event["id"], "type": "resync"})
+
+    async def get(self) -> dict:
+        return await self.queue.get()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fans events out to the subscribers of each shop; safe to publish from any thread"""
+
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        subscription = Subscription(self, user_id, loop or asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+    def publish(self, user_id: int, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        event = {"id": next(self._ids), **event}
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # The client's event loop is gone
+                self.unsubscribe(subscription)
+
+
+broker = EventBroker()
+
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {dumps(event).decode()}\n\n"
+
+
+async def event_stream(request, subscription: Subscription):
+    """Body of a text/event-stream response; ends when the client disconnects"""
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        subscription.close()
+
+
+def stream_response(request, user_id: int):
+    """StreamingResponse following one shop's events"""
+    subscription = broker.subscribe(user_id)
+    return StreamingResponse(
+        event_stream(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ===== EVENT HELPERS =====
+def publish_stock_change(
+    user_id: int,
+    product_id: int,
+    previous_stock: Optional[int],
+    current_stock: int,
+    minimum_stock: Optional[int]
+):
+    """Stock level event, plus a low_stock event when the threshold is crossed"""
+    if previous_stock == current_stock:
+        return
+    broker.publish(user_id, {
+        "type": "stock",
+        "product_id": product_id,
+        "current_stock": current_stock,
+        "minimum_stock": minimum_stock
+    })
+
+    minimum_stock = minimum_stock or 0
+    was_low = previous_stock is not None and previous_stock <= minimum_stock
+    is_low = current_stock <= minimum_stock
+    if was_low != is_low:
+        broker.publish(user_id, {
+            "type": "low_stock",
+            "product_id": product_id,
+            "current_stock": current_stock,
+            "minimum_stock": minimum_stock,
+            "is_low": is_low
+        })
+
+
+def publish_product_change(user_id: int, product_id: int, action: str, changes: Optional[dict] = None):
+    """Product created/updated/deleted; `changes` holds only the fields that changed"""
+    broker.publish(user_id, {
+        "type": "product",
+        "product_id": product_id,
+        "action": action,
+        "changes": changes or {}
+    })
@@ -0,0 +1,31 @@
+"""
+orjson-encoded responses for large list endpoints.
+
+Handlers that return one of these skip FastAPI's response_model pass
+(per-row pydantic validation followed by jsonable_encoder), which dominates
+the request time once a shop has thousands of products or sales. Decimals
+are written as strings, matching how pydantic serialises the schemas.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,162 @@
+"""
+Idempotency-Key support for retry-prone POST endpoints.
+
+A client that may retry (flaky shop Wi-Fi) sends the same Idempotency-Key
+header with every attempt. The first attempt claims the key by inserting an
+in_progress row. The handler stores its response with Claim.complete() in
+the same transaction as its own writes, so a sale and its stored result
+commit together or not at all. Later attempts get the stored response back
+(with an Idempotent-Replayed header) without the handler running again.
+An attempt arriving while the first is still running waits for it, for up
+to IDEMPOTENCY_WAIT_SECONDS, and then gets a 409.
+
+If the handler fails, the claim is released so a retry runs again. A claim
+held longer than IDEMPOTENCY_LOCK_SECONDS is taken to be from a dead worker
+and can be taken over. Stored responses expire after IDEMPOTENCY_TTL_HOURS
+and are purged by the daily task-queue housekeeping.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from fast_json import FastJSONResponse
+import models
+import task_queue
+import tenancy
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+
+Key = models.IdempotencyKey
+
+
+class Claim:
+    """What the handler gets: a stored response to replay, or a key it now owns"""
+
+    def __init__(self, record_id: Optional[int] = None, replay: Optional[FastJSONResponse] = None):
+        self.record_id = record_id
+        self.replay = replay
+
+    def complete(self, db: Session, body, status_code: int = 200):
+        """Store the response in the handler's transaction (before its commit)"""
+        if self.record_id is None:
+            return
+        db.execute(
+            update(Key)
+            .where(Key.id == self.record_id)
+            .values(status="completed", response_status=status_code, response_body=json.dumps(body))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _fingerprint(endpoint: str, body: bytes) -> str:
+    return hashlib.sha256(endpoint.encode() + b"\n" + body).hexdigest()
+
+
+def _replay(record: models.IdempotencyKey) -> FastJSONResponse:
+    return FastJSONResponse(
+        json.loads(record.response_body),
+        status_code=record.response_status,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def claim_key(db: Session, user_id: int, key: str, endpoint: str, fingerprint: str) -> Claim:
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        now = task_queue.utcnow()
+        record = Key(
+            user_id=user_id, key=key, endpoint=endpoint, fingerprint=fingerprint, status="in_progress",
+            locked_at=now, expires_at=now + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+        )
+        db.add(record)
+        try:
+            db.commit()
+            return Claim(record_id=record.id)
+        except IntegrityError:
+            db.rollback()
+
+        existing = db.execute(select(Key).where(Key.user_id == user_id, Key.key == key)).scalar_one_or_none()
+        if existing is None:
+            continue  # Released or purged in the meantime; claim it
+        if existing.endpoint != endpoint or existing.fingerprint != fingerprint:
+            raise HTTPException(
+                status_code=422,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        if existing.expires_at < now:
+            db.execute(delete(Key).where(Key.id == existing.id, Key.expires_at < now))
+            db.commit()
+            continue
+        if existing.status == "completed":
+            return Claim(replay=_replay(existing))
+
+        stale_before = now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        if existing.locked_at < stale_before:
+            # The first attempt's worker died; take its claim over
+            taken = db.execute(
+                update(Key)
+                .where(Key.id == existing.id, Key.status == "in_progress", Key.locked_at < stale_before)
+                .values(locked_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if taken:
+                return Claim(record_id=existing.id)
+
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still being processed"
+            )
+        db.rollback()  # Next poll reads fresh
+        await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+
+
+def idempotent(endpoint: str):
+    """Dependency factory: `claim: Claim = Depends(idempotent("POST /sales"))`
+
+    Declare it before the handler's db dependency: dependencies are torn down
+    in reverse, so the handler's session is closed before the key is released.
+    """
+    async def dependency(
+        request: Request,
+        idempotency_key: Optional[str] = Header(None, max_length=255)
+    ):
+        if not idempotency_key:
+            yield Claim()
+            return
+
+        user_id = await tenancy.request_user_id(request) or 0
+        fingerprint = _fingerprint(endpoint, await request.body())
+        db = tenancy.open_session(user_id or None)
+        claim = Claim()
+        try:
+            claim = await claim_key(db, user_id, idempotency_key, endpoint, fingerprint)
+            yield claim
+        finally:
+            if claim.record_id is not None:
+                # Release the key if the handler failed; a no-op once it committed its response
+                db.rollback()
+                db.execute(delete(Key).where(Key.id == claim.record_id, Key.status == "in_progress"))
+                db.commit()
+            db.close()
+    return dependency
+
+
+@task_queue.daily
+def purge_expired(db: Session) -> int:
+    result = db.execute(delete(Key).where(Key.expires_at < task_queue.utcnow()))
+    db.commit()
+    return result.rowcount
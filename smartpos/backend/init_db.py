@@ -8,16 +8,19 @@ import os
 # Add the backend directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from database import create_tables, drop_tables, get_database_info
+from sqlalchemy import text
+
+from database import drop_tables, engine, get_database_info
 from models import *  # Import all models
+import schema_version
 
 def init_database():
     """Initialize the database with all tables"""
     print("🚀 Initializing SmartPOS Database...")
     
     try:
-        # Create all tables
-        create_tables()
+        # Create or migrate all tables
+        schema_version.upgrade()
         
         # Show database info
         db_info = get_database_info()
@@ -43,7 +46,9 @@ def reset_database():
     
     try:
         drop_tables()
-        create_tables()
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        schema_version.upgrade()
         print("✅ Database reset successfully!")
         
     except Exception as e:
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Inventory ledger: stock history built from InventoryAdjustment rows.
+
+Closing stock is snapshotted once a day by the task worker (take_snapshots,
+or by hand with `python inventory_ledger.py snapshot`). Every snapshot
+remembers the newest adjustment it already includes, so the stock at any
+moment is the nearest snapshot plus or minus only the adjustments in
+between, never a replay of the product's whole history.
+
+Timestamps are the database's own (func.now()), like every created_at column.
+"""
+import argparse
+import math
+import os
+import sys
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import models
+import task_queue
+
+Adjustment = models.InventoryAdjustment
+Snapshot = models.InventorySnapshot
+
+
+def record_adjustment(
+    db: Session,
+    user_id: int,
+    inventory_id: int,
+    quantity_change: int,
+    adjustment_type: str,
+    reason: Optional[str] = None,
+    reference_id: Optional[str] = None
+) -> Optional[models.InventoryAdjustment]:
+    """Add a ledger row for a stock change (no-op for a zero change)"""
+    if not quantity_change:
+        return None
+    adjustment = Adjustment(
+        user_id=user_id,
+        inventory_id=inventory_id,
+        adjustment_type=adjustment_type,
+        quantity_change=quantity_change,
+        reason=reason,
+        reference_id=reference_id
+    )
+    db.add(adjustment)
+    return adjustment
+
+
+def take_snapshots(db: Session, user_id: Optional[int] = None) -> int:
+    """Snapshot the current stock of every inventory row (or one shop's) in one statement"""
+    last_adjustment = select(func.max(Adjustment.id)).where(
+        Adjustment.inventory_id == models.Inventory.id
+    ).scalar_subquery()
+
+    source = select(
+        models.Inventory.id,
+        func.now(),
+        func.coalesce(models.Inventory.current_stock, 0),
+        last_adjustment
+    )
+    if user_id is not None:
+        source = source.join_from(models.Inventory, models.Product).where(
+            models.Product.user_id == user_id
+        )
+
+    result = db.execute(
+        insert(Snapshot).from_select(
+            ["inventory_id", "snapshot_at", "closing_stock", "last_adjustment_id"], source
+        )
+    )
+    return result.rowcount
+
+
+@task_queue.daily
+def _snapshot_daily(db: Session):
+    latest = db.execute(select(func.max(Snapshot.snapshot_at))).scalar()
+    if latest is None or latest.date() < task_queue.utcnow().date():  # Restarts don't add more
+        take_snapshots(db)
+        db.commit()
+
+
+def _adjustment_total(db: Session, *conditions):
+    return db.execute(
+        select(func.coalesce(func.sum(Adjustment.quantity_change), 0), func.count(Adjustment.id))
+        .where(*conditions)
+    ).one()
+
+
+def stock_as_of(db: Session, inventory: models.Inventory, at: datetime) -> dict:
+    """Stock of one inventory row at `at`, from the nearest snapshot"""
+    before = db.execute(
+        select(Snapshot)
+        .where(Snapshot.inventory_id == inventory.id, Snapshot.snapshot_at <= at)
+        .order_by(Snapshot.snapshot_at.desc(), Snapshot.id.desc())
+        .limit(1)
+    ).scalar_one_or_none()
+
+    if before is not None:
+        # Replay forward: adjustments made after the snapshot, up to `at`
+        conditions = [Adjustment.inventory_id == inventory.id, Adjustment.created_at <= at]
+        if before.last_adjustment_id is not None:
+            conditions.append(Adjustment.id > before.last_adjustment_id)
+        delta, replayed = _adjustment_total(db, *conditions)
+        stock = before.closing_stock + delta
+        snapshot = before
+    else:
+        # Nothing that old: back out the adjustments after `at` from the
+        # next snapshot, or from the live stock if there is none yet
+        snapshot = db.execute(
+            select(Snapshot)
+            .where(Snapshot.inventory_id == inventory.id, Snapshot.snapshot_at > at)
+            .order_by(Snapshot.snapshot_at, Snapshot.id)
+            .limit(1)
+        ).scalar_one_or_none()
+
+        conditions = [Adjustment.inventory_id == inventory.id, Adjustment.created_at > at]
+        if snapshot is None:
+            reference = inventory.current_stock or 0
+        else:
+            reference = snapshot.closing_stock
+            conditions.append(Adjustment.id <= (snapshot.last_adjustment_id or 0))
+        delta, replayed = _adjustment_total(db, *conditions)
+        stock = reference - delta
+
+    return {
+        "product_id": inventory.product_id,
+        "inventory_id": inventory.id,
+        "as_of": at,
+        "stock": stock,
+        "snapshot_at": snapshot.snapshot_at if snapshot is not None else None,
+        "replayed_adjustments": replayed
+    }
+
+
+def adjustment_page(db: Session, inventory_id: int, page: int = 1, per_page: int = 50) -> dict:
+    """Newest-first adjustment history of one inventory row, one page at a time"""
+    total = db.execute(
+        select(func.count(Adjustment.id)).where(Adjustment.inventory_id == inventory_id)
+    ).scalar_one()
+
+    rows = db.execute(
+        select(
+            Adjustment.id,
+            Adjustment.user_id,
+            Adjustment.inventory_id,
+            Adjustment.adjustment_type,
+            Adjustment.quantity_change,
+            Adjustment.reason,
+            Adjustment.reference_id,
+            Adjustment.created_at
+        )
+        .where(Adjustment.inventory_id == inventory_id)
+        .order_by(Adjustment.created_at.desc(), Adjustment.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    ).mappings()
+
+    return {
+        "items": [dict(row) for row in rows],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": math.ceil(total / per_page) if total else 0
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartPOS inventory ledger tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = subcommands.add_parser("snapshot", help="Record closing stock for every product")
+    snapshot_parser.add_argument("--user-id", type=int, help="Only snapshot this shop")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()  # One database per shop
+    else:
+        shops = [args.user_id]
+
+    count = 0
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            count += take_snapshots(db, user_id=user_id)
+            db.commit()
+    print(f"✅ Recorded {count} inventory snapshots at {datetime.now():%Y-%m-%d %H:%M:%S}")
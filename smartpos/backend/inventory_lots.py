@@ -0,0 +1,122 @@
+"""
+Stock lots (batches) with their own expiry dates.
+
+Receiving a lot adds its quantity to inventory.current_stock, which stays
+the stock figure everything else reads. Stock received without a lot, or
+from before lots existed, is simply untracked. A product's open lots never
+hold more than its current stock: a stock count that comes in below their
+total trims the earliest-expiring lots, as a sale would.
+
+Sales deplete lots first-expiry-first-out: earliest expiry first, lots
+without an expiry last, ties in the order received. For a whole cart this
+is one UPDATE. A running total (window SUM) over each product's open lots
+gives how much the earlier lots already cover, and each lot gives up
+min(its quantity, what is still needed after them). There is no loop over
+lots in Python, however many a product has.
+
+Expiry lookups use the partial index on (user_id, expiry_date) over lots
+with stock left, so depleted lots cost nothing as history grows.
+"""
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, literal_column, select, update
+from sqlalchemy.orm import Session
+
+import inventory_ledger
+import inventory_valuation
+import models
+
+Lot = models.InventoryLot
+HAS_STOCK = Lot.quantity > literal_column("0")  # Inline, so SQLite matches the partial index's WHERE
+
+
+def receive_lot(
+    db: Session,
+    user_id: int,
+    inventory: models.Inventory,
+    quantity: int,
+    expiry_date: Optional[date] = None,
+    batch_number: Optional[str] = None
+) -> models.InventoryLot:
+    """Add a lot and its stock (caller commits)"""
+    lot = Lot(
+        user_id=user_id,
+        inventory_id=inventory.id,
+        batch_number=batch_number,
+        quantity=quantity,
+        received_quantity=quantity,
+        expiry_date=expiry_date
+    )
+    db.add(lot)
+    inventory.current_stock = (inventory.current_stock or 0) + quantity
+    inventory.last_restocked_at = func.now()
+    inventory_ledger.record_adjustment(
+        db, user_id, inventory.id, quantity, "purchase",
+        reason=f"Lot {batch_number}" if batch_number else "Lot received"
+    )
+    inventory_valuation.adjust(db, user_id, quantity, inventory_valuation.stock_value(quantity, inventory.product.cost_price))
+    return lot
+
+
+def deplete(db: Session, quantities: Dict[int, int]) -> int:
+    """Take {inventory_id: quantity} out of open lots, earliest expiry first; returns lots touched"""
+    if not quantities:
+        return 0
+    need = case(quantities, value=Lot.inventory_id)
+    covered_before = func.sum(Lot.quantity).over(
+        partition_by=Lot.inventory_id,
+        order_by=(Lot.expiry_date.is_(None), Lot.expiry_date, Lot.id)
+    ) - Lot.quantity
+    ordered = (
+        select(Lot.id, Lot.quantity, need.label("need"), covered_before.label("covered_before"))
+        .where(Lot.inventory_id.in_(quantities), HAS_STOCK)
+        .subquery()
+    )
+    still_needed = ordered.c.need - ordered.c.covered_before
+    taken = case((still_needed >= ordered.c.quantity, ordered.c.quantity), else_=still_needed)
+    return db.execute(
+        update(Lot)
+        .where(Lot.id == ordered.c.id, ordered.c.covered_before < ordered.c.need)
+        .values(quantity=Lot.quantity - taken)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def trim_to_stock(db: Session, inventory_id: int, current_stock: int) -> int:
+    """After a stock count, take any excess out of the lots; returns lots touched"""
+    in_lots = db.execute(
+        select(func.coalesce(func.sum(Lot.quantity), 0)).where(Lot.inventory_id == inventory_id, HAS_STOCK)
+    ).scalar_one()
+    excess = in_lots - max(current_stock, 0)
+    return deplete(db, {inventory_id: excess}) if excess > 0 else 0
+
+
+def open_lots(db: Session, inventory_id: int) -> List[models.InventoryLot]:
+    """Lots with stock left, in the order sales will use them"""
+    return db.execute(
+        select(Lot)
+        .where(Lot.inventory_id == inventory_id, HAS_STOCK)
+        .order_by(Lot.expiry_date.is_(None), Lot.expiry_date, Lot.id)
+    ).scalars().all()
+
+
+def expiring(db: Session, user_id: int, within_days: int, limit: int = 500, today: Optional[date] = None) -> List[dict]:
+    """Lots with stock left that expire within `within_days` (or already have), soonest first"""
+    today = today or date.today()
+    rows = db.execute(
+        select(
+            Lot.id.label("lot_id"),
+            models.Inventory.product_id,
+            models.Product.name,
+            Lot.batch_number,
+            Lot.quantity,
+            Lot.expiry_date
+        )
+        .join(models.Inventory, models.Inventory.id == Lot.inventory_id)
+        .join(models.Product, models.Product.id == models.Inventory.product_id)
+        .where(Lot.user_id == user_id, HAS_STOCK, Lot.expiry_date <= today + timedelta(days=within_days))
+        .order_by(Lot.expiry_date, Lot.id)
+        .limit(limit)
+    ).mappings()
+    return [{**row, "days_left": (row["expiry_date"] - today).days} for row in rows]
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Live stock valuation: units on hand and their value at cost, per shop.
+
+inventory_valuations holds one row per shop. Every change to stock or to a
+product's cost_price calls adjust() in the same transaction, and adjust()
+adds the difference with one UPDATE. Reading the valuation is then a
+primary-key lookup, however many products the shop has.
+
+A shop without a row yet gets one the first time its stock changes.
+adjust() computes the value from inventory as it was before the change,
+inserts it unless another transaction got there first (ON CONFLICT DO
+NOTHING), and then applies the change with the same UPDATE. Every
+night the task worker recomputes each shop and warns if the running figure
+had drifted, for example after a script edited stock directly.
+
+    python inventory_valuation.py [--user-id N]    # recompute by hand
+"""
+import argparse
+import os
+import sys
+from decimal import Decimal
+from typing import Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+import task_queue
+
+Valuation = models.InventoryValuation
+
+
+def compute(db: Session, user_id: int) -> Tuple[int, Decimal]:
+    """(units, value at cost) summed over the shop's inventory"""
+    units, value = db.execute(
+        select(
+            func.coalesce(func.sum(models.Inventory.current_stock), 0),
+            func.coalesce(func.sum(models.Inventory.current_stock * func.coalesce(models.Product.cost_price, 0)), 0)
+        )
+        .join(models.Product, models.Product.id == models.Inventory.product_id)
+        .where(models.Product.user_id == user_id)
+    ).one()
+    return int(units), Decimal(value).quantize(Decimal("0.01"))
+
+
+def _add(db: Session, user_id: int, units: int, value: Decimal) -> int:
+    return db.execute(
+        update(Valuation)
+        .where(Valuation.user_id == user_id)
+        .values(
+            stock_units=Valuation.stock_units + units,
+            stock_value=Valuation.stock_value + value,
+            updated_at=func.now()
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _insert_if_missing(db: Session, user_id: int, stock_units: int, stock_value: Decimal):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    db.execute(
+        dialect.insert(Valuation)
+        .values(user_id=user_id, stock_units=stock_units, stock_value=stock_value)
+        .on_conflict_do_nothing(index_elements=[Valuation.user_id])
+    )
+
+
+def adjust(db: Session, user_id: int, units: int, value: Decimal):
+    """Add a stock or cost change to the shop's valuation (call after making the change)"""
+    if not units and not value:
+        return
+    if _add(db, user_id, units, value):
+        return
+    db.flush()  # The change itself is in inventory now, so take it back out of the computation
+    stock_units, stock_value = compute(db, user_id)
+    _insert_if_missing(db, user_id, stock_units - units, stock_value - value)
+    _add(db, user_id, units, value)
+
+
+def stock_value(quantity: int, cost_price: Optional[Decimal]) -> Decimal:
+    return Decimal(quantity or 0) * (cost_price or Decimal("0"))
+
+
+def reconcile(db: Session, user_id: int) -> Decimal:
+    """Recompute and store a shop's valuation (caller commits); returns how far off it was"""
+    stock_units, value = compute(db, user_id)
+    stored = db.get(Valuation, user_id)
+    if stored is None:
+        db.add(Valuation(user_id=user_id, stock_units=stock_units, stock_value=value))
+        return Decimal("0.00")
+    drift = value - Decimal(stored.stock_value)
+    stored.stock_units, stored.stock_value = stock_units, value
+    return drift
+
+
+def valuation(db: Session, user_id: int) -> dict:
+    stored = db.get(Valuation, user_id)
+    if stored is None:  # Nothing has changed since the upgrade; nothing to keep current yet
+        stock_units, value = compute(db, user_id)
+        return {"stock_units": stock_units, "stock_value": value, "updated_at": None}
+    return {"stock_units": stored.stock_units, "stock_value": stored.stock_value, "updated_at": stored.updated_at}
+
+
+def reconcile_all(db: Session, user_id: Optional[int] = None) -> int:
+    """Reconcile one shop, or every shop in this database, committing each"""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = db.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+    for shop_id in user_ids:
+        drift = reconcile(db, shop_id)
+        db.commit()
+        if drift:
+            print(f"⚠️ Stock valuation of shop {shop_id} was off by {drift}; corrected")
+    return len(user_ids)
+
+
+@task_queue.daily
+def _reconcile_daily(db: Session):
+    reconcile_all(db)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute stock valuations from inventory")
+    parser.add_argument("--user-id", type=int, help="Only this shop")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    count = 0
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            count += reconcile_all(db, user_id)
+    print(f"✅ Recomputed the stock valuation of {count} shops")
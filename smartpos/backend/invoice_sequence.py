@@ -0,0 +1,123 @@
+"""
+Invoice numbering for SmartPOS.
+
+Each shop gets its own sequence per financial year, kept in the
+invoice_sequences table. By default a number is drawn inside the checkout
+transaction, so a sale that rolls back gives its number back and the series
+stays gapless, which is what GST filing expects.
+
+Setting INVOICE_BLOCK_SIZE above 1 makes every worker process reserve a block
+of numbers in its own short transaction and hand them out from memory.
+Terminals then stop queueing on the counter row, but numbers left in a block
+when a worker stops are never used, so the series can have gaps.
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from tenancy import DATABASE_ROUTING, open_session
+import models
+
+# Placeholders: {shop} (user id), {fy} (financial year label), {seq} (number)
+INVOICE_NUMBER_FORMAT = os.getenv("INVOICE_NUMBER_FORMAT", "INV/{shop}/{fy}/{seq:06d}")
+INVOICE_BLOCK_SIZE = int(os.getenv("INVOICE_BLOCK_SIZE", "1"))
+FINANCIAL_YEAR_START_MONTH = int(os.getenv("FINANCIAL_YEAR_START_MONTH", "4"))  # April (India)
+
+
+
+def check_format(fmt: str, routing: str = DATABASE_ROUTING):
+    """Reject formats that could give two sales the same invoice number.
+
+    sales.invoice_number is unique across the database, so shops sharing one
+    must each put {shop} in their numbers.
+    """
+    if "{seq" not in fmt:
+        raise ValueError("INVOICE_NUMBER_FORMAT must contain a {seq} placeholder")
+    if "{shop" not in fmt and routing != "per_shop":
+        raise ValueError("INVOICE_NUMBER_FORMAT must contain a {shop} placeholder unless DATABASE_ROUTING=per_shop")
+
+
+check_format(INVOICE_NUMBER_FORMAT)
+
+
+def financial_year(when: Optional[datetime] = None, start_month: int = FINANCIAL_YEAR_START_MONTH) -> str:
+    """Label of the financial year containing `when`, e.g. "2024-25" """
+    when = when or datetime.now()
+    start_year = when.year if when.month >= start_month else when.year - 1
+    if start_month == 1:
+        return str(start_year)
+    return f"{start_year}-{(start_year + 1) % 100:02d}"
+
+
+def format_invoice_number(seq: int, fy: str, shop: int, fmt: str = INVOICE_NUMBER_FORMAT) -> str:
+    return fmt.format(seq=seq, fy=fy, shop=shop)
+
+
+def reserve_numbers(db: Session, user_id: int, fy: str, count: int = 1) -> int:
+    """Advance the shop's counter by `count` and return the first reserved number.
+
+    Runs in the caller's transaction: the UPDATE takes the row (or, on SQLite,
+    database) write lock until that transaction commits or rolls back.
+    """
+    counter = models.InvoiceSequence
+    next_number = db.execute(
+        update(counter)
+        .where(counter.user_id == user_id, counter.financial_year == fy)
+        .values(next_number=counter.next_number + count)
+        .returning(counter.next_number)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+
+    if next_number is None:
+        # First invoice of the year for this shop
+        try:
+            with db.begin_nested():
+                db.add(counter(user_id=user_id, financial_year=fy, next_number=1 + count))
+            return 1
+        except IntegrityError:
+            # Another checkout created the row first; take the normal path
+            return reserve_numbers(db, user_id, fy, count)
+
+    return next_number - count
+
+
+class BlockAllocator:
+    """Hands out numbers from blocks reserved ahead of time by this process"""
+
+    def __init__(self, block_size: int, session_factory=open_session):
+        """session_factory(user_id) opens a session on that shop's database"""
+        self.block_size = block_size
+        self.session_factory = session_factory
+        self._blocks = {}  # (user_id, fy) -> [next number, end of block)
+        self._lock = threading.Lock()
+
+    def take(self, user_id: int, fy: str) -> int:
+        key = (user_id, fy)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None or block[0] >= block[1]:
+                with self.session_factory(user_id) as session:
+                    first = reserve_numbers(session, user_id, fy, self.block_size)
+                    session.commit()
+                block = self._blocks[key] = [first, first + self.block_size]
+            number = block[0]
+            block[0] += 1
+            return number
+
+
+_block_allocator = BlockAllocator(INVOICE_BLOCK_SIZE) if INVOICE_BLOCK_SIZE > 1 else None
+
+
+def next_invoice_number(db: Session, user_id: int, when: Optional[datetime] = None) -> str:
+    """Allocate the next invoice number for a shop's sale"""
+    fy = financial_year(when)
+    if _block_allocator is not None:
+        seq = _block_allocator.take(user_id, fy)
+    else:
+        seq = reserve_numbers(db, user_id, fy)
+    return format_invoice_number(seq, fy, user_id)
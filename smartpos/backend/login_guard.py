@@ -0,0 +1,113 @@
+"""
+Admission control for the password endpoints.
+
+Every login and registration costs a bcrypt hash or verify, which is tens
+of milliseconds of pure CPU. A client stuck in a retry loop, or a
+credential-stuffing run, could otherwise occupy every worker. Two limits
+apply, both per process:
+
+- Per client IP and per account (email/username), token buckets allow a
+  burst and then a steady rate. Over the limit the request gets a 429 with
+  Retry-After, before the database or bcrypt is touched.
+- At most PASSWORD_HASH_CONCURRENCY hashes run at once. They run in the
+  threadpool, so the event loop keeps serving checkouts. A request that
+  finds every slot busy gets a 429 at once instead of queueing behind the
+  flood.
+
+Bucket tables are bounded LRUs. A flood of distinct IPs evicts the oldest
+entries instead of growing memory.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from math import ceil
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+import auth
+
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "20"))
+LOGIN_IP_PER_MINUTE = float(os.getenv("LOGIN_IP_PER_MINUTE", "20"))
+LOGIN_ACCOUNT_BURST = int(os.getenv("LOGIN_ACCOUNT_BURST", "5"))
+LOGIN_ACCOUNT_PER_MINUTE = float(os.getenv("LOGIN_ACCOUNT_PER_MINUTE", "5"))
+LOGIN_TRACKED_KEYS = int(os.getenv("LOGIN_TRACKED_KEYS", "10000"))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(os.cpu_count() or 2)))
+
+
+class RateLimiter:
+    """Token bucket per key: `burst` tokens, refilled at `per_minute`"""
+
+    def __init__(self, burst: int, per_minute: float, max_keys: int = LOGIN_TRACKED_KEYS, clock=time.monotonic):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated), least recently seen first
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """Take a token; returns 0, or the seconds until one is available"""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+ip_limiter = RateLimiter(LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE)
+account_limiter = RateLimiter(LOGIN_ACCOUNT_BURST, LOGIN_ACCOUNT_PER_MINUTE)
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+
+def _too_many(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, ceil(retry_after)))})
+
+
+def admit(request: Request, account: Optional[str]):
+    """Charge the client IP and the account; 429 if either is over its limit"""
+    ip = request.client.host if request.client else "unknown"
+    wait = ip_limiter.acquire(ip)
+    if wait:
+        raise _too_many("Too many login attempts from this address; retry later", wait)
+    if account:
+        wait = account_limiter.acquire(account.strip().lower())
+        if wait:
+            raise _too_many("Too many login attempts for this account; retry later", wait)
+
+
+async def _hash_work(func, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise _too_many("Server busy; retry shortly", 1)
+    try:
+        return await run_in_threadpool(func, *args)
+    finally:
+        _hash_slots.release()
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await _hash_work(auth.verify_password, plain_password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    return await _hash_work(auth.get_password_hash, password)
+
+
+def reset():
+    """Forget all buckets (tests, or after an incident)"""
+    ip_limiter.clear()
+    account_limiter.clear()
@@ -1,18 +1,20 @@
-from datetime import timedelta, datetime
+from datetime import date, timedelta, datetime
 from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload, contains_eager
 from sqlalchemy import func, desc
 from decimal import Decimal
-import uuid
 
-from database import create_tables, get_db, get_database_info
-import models, schemas, auth
-
-# Create database tables
-create_tables()
+from database import get_db, get_database_info
+from fast_json import FastJSONResponse
+from tenancy import get_shop_db
+from read_replicas import get_read_db, read_your_writes_middleware
+from invoice_sequence import next_invoice_number
+import models, schemas, auth, projections, inventory_ledger, events, catalog_version, catalog_sync, catalog_snapshot, read_replicas, schema_version
+import task_queue, sales_rollup, customer_stats, pricing, idempotency, sales_archive, backup, login_guard, db_pool, query_stats, basket_analysis, sales_velocity, inventory_lots, inventory_valuation
 
 app = FastAPI(
     title="SmartPOS API - Single Shop",
@@ -28,6 +30,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.middleware("http")(read_your_writes_middleware)
+
+@app.on_event("startup")
+def check_schema():
+    schema_version.ensure_schema()
+
+@app.on_event("startup")
+async def start_background_worker():
+    task_queue.start_worker()
+    read_replicas.start_monitor()
+
+@app.on_event("shutdown")
+async def stop_background_worker():
+    task_queue.stop_worker()
+    read_replicas.stop_monitor()
 
 @app.get("/")
 async def root():
@@ -41,8 +58,9 @@ async def root():
 # ===== AUTHENTICATION ENDPOINTS =====
 
 @app.post("/auth/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login endpoint for token-based authentication"""
+    login_guard.admit(request, form_data.username)
     # For development, create a test user if it doesn't exist
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
     if not user:
@@ -54,7 +72,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
                 owner_name="Test User",
                 phone="1234567890",
                 shop_name="Test Shop",
-                password_hash=auth.get_password_hash("1234"),
+                password_hash=await login_guard.hash_password("1234"),
                 is_active=True
             )
             db.add(user)
@@ -64,7 +82,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
             raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not auth.verify_password(form_data.password, user.password_hash):
+    if not await login_guard.verify_password(form_data.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create access token
@@ -85,13 +103,14 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
     }
 
 @app.post("/auth/json-login")
-async def json_login(credentials: dict, db: Session = Depends(get_db)):
+async def json_login(credentials: dict, request: Request, db: Session = Depends(get_db)):
     """JSON login endpoint for frontend compatibility"""
     email = credentials.get("email")
     password = credentials.get("password")
     
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password required")
+    login_guard.admit(request, email)
     
     # For development, create a test user if it doesn't exist
     user = db.query(models.User).filter(models.User.email == email).first()
@@ -104,7 +123,7 @@ async def json_login(credentials: dict, db: Session = Depends(get_db)):
                 owner_name="Test User",
                 phone="1234567890",
                 shop_name="Test Shop",
-                password_hash=auth.get_password_hash(password),
+                password_hash=await login_guard.hash_password(password),
                 is_active=True
             )
             db.add(user)
@@ -114,7 +133,7 @@ async def json_login(credentials: dict, db: Session = Depends(get_db)):
             raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Verify password
-    if not auth.verify_password(password, user.password_hash):
+    if not await login_guard.verify_password(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create access token
@@ -189,18 +208,29 @@ async def update_user_profile(
 @app.post("/categories", response_model=schemas.Category)
 async def create_category(
     category: schemas.CategoryCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shop_db)
 ):
     """Create a new product category"""
     db_category = models.Category(**category.model_dump())
     db.add(db_category)
+    catalog_version.bump_catalog_version(db, category.user_id)
     db.commit()
     db.refresh(db_category)
     return db_category
 
 @app.get("/categories", response_model=List[schemas.Category])
-async def list_categories(user_id: int, db: Session = Depends(get_db)):
+async def list_categories(
+    user_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
+):
     """List all categories for a user"""
+    etag, not_modified = catalog_version.check_not_modified(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers.update(catalog_version.cache_headers(etag))
+    
     categories = db.query(models.Category).filter(
         models.Category.user_id == user_id,
         models.Category.is_active == True
@@ -212,7 +242,7 @@ async def update_category(
     category_id: int,
     category_update: schemas.CategoryUpdate,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shop_db)
 ):
     """Update a category"""
     category = db.query(models.Category).filter(
@@ -227,20 +257,27 @@ async def update_category(
     for field, value in update_data.items():
         setattr(category, field, value)
     
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
     db.refresh(category)
     return category
 
 # ===== PRODUCTS =====
 @app.post("/products", response_model=schemas.Product)
-async def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)):
-    """Create a new product with initial inventory"""
+async def create_product(
+    product: schemas.ProductCreate,
+    claim: idempotency.Claim = Depends(idempotency.idempotent("POST /products")),
+    db: Session = Depends(get_shop_db)
+):
+    """Create a new product with initial inventory (Idempotency-Key supported)"""
+    if claim.replay:
+        return claim.replay
+    
     # Create product
     product_data = product.model_dump(exclude={'initial_stock', 'minimum_stock', 'maximum_stock'})
     db_product = models.Product(**product_data)
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    db.flush()
     
     # Create initial inventory
     db_inventory = models.Inventory(
@@ -250,46 +287,77 @@ async def create_product(product: schemas.ProductCreate, db: Session = Depends(g
         maximum_stock=product.maximum_stock
     )
     db.add(db_inventory)
+    db.flush()
+    inventory_ledger.record_adjustment(
+        db, product.user_id, db_inventory.id, product.initial_stock, "purchase", reason="Opening stock"
+    )
+    inventory_valuation.adjust(
+        db, product.user_id, product.initial_stock,
+        inventory_valuation.stock_value(product.initial_stock, db_product.cost_price)
+    )
+    catalog_version.bump_catalog_version(db, product.user_id)
+    db.flush()
+    db.refresh(db_product)
+    response = schemas.Product.model_validate(db_product).model_dump(mode="json")
+    claim.complete(db, response)
     db.commit()
     
-    return db_product
+    events.publish_product_change(product.user_id, db_product.id, "created")
+    return FastJSONResponse(response)
+
+def _sparse_columns(available: dict, fields: Optional[str]) -> Optional[list]:
+    """`fields=` parameter to projection columns, 400 on unknown names"""
+    try:
+        return projections.pick_columns(available, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/products", response_model=List[schemas.Product])
 async def list_products(
     user_id: int,
+    request: Request,
     category_id: Optional[int] = None,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return, e.g. name,barcode,selling_price,current_stock"),
+    db: Session = Depends(get_read_db)
 ):
     """List all products for a user"""
-    query = db.query(models.Product).filter(
-        models.Product.user_id == user_id,
-        models.Product.is_active == True
-    )
-    
-    if category_id:
-        query = query.filter(models.Product.category_id == category_id)
-    
-    if search:
-        query = query.filter(
-            models.Product.name.ilike(f"%{search}%") |
-            models.Product.barcode.ilike(f"%{search}%")
-        )
-    
-    products = query.all()
-    
-    # Add inventory info to each product
-    for product in products:
-        if product.inventory:
-            product.current_stock = product.inventory.current_stock
-            product.minimum_stock = product.inventory.minimum_stock
-    
-    return products
+    columns = _sparse_columns(projections.PRODUCT_FIELDS, fields)
+    etag, not_modified = catalog_version.check_not_modified(request, db, user_id)
+    if not_modified:
+        return not_modified
+    
+    products = projections.product_rows(db, user_id, category_id=category_id, search=search, columns=columns)
+    return FastJSONResponse(products, headers=catalog_version.cache_headers(etag))
+
+# Served by the primary: a lagging replica could hand out a watermark past rows it hasn't replayed
+@app.get("/products/changes", response_model=schemas.CatalogChanges)
+async def get_catalog_changes(user_id: int, since: Optional[datetime] = None, db: Session = Depends(get_shop_db)):
+    """Products and inventory changed since a previous sync's watermark"""
+    changes = catalog_sync.catalog_changes(db, user_id, since=since)
+    return FastJSONResponse(changes)
+
+@app.get("/products/snapshot")
+async def get_catalog_snapshot(user_id: int, request: Request):
+    """Compressed columnar catalog for slow links, served without database work"""
+    return catalog_snapshot.response_for(request, user_id)
+
+@app.get("/products/suggestions", response_model=List[schemas.ProductSuggestion])
+async def get_product_suggestions(
+    user_id: int,
+    product_ids: List[int] = Query(..., description="Products in the cart"),
+    limit: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_read_db)
+):
+    """Products frequently bought together with the cart's (see basket_analysis.py)"""
+    return FastJSONResponse(basket_analysis.suggestions(db, user_id, product_ids, limit=limit))
 
 @app.get("/products/{product_id}", response_model=schemas.Product)
-async def get_product(product_id: int, user_id: int, db: Session = Depends(get_db)):
+async def get_product(product_id: int, user_id: int, db: Session = Depends(get_read_db)):
     """Get a single product"""
-    product = db.query(models.Product).filter(
+    product = db.query(models.Product).options(
+        joinedload(models.Product.inventory)
+    ).filter(
         models.Product.id == product_id,
         models.Product.user_id == user_id
     ).first()
@@ -309,7 +377,7 @@ async def update_product(
     product_id: int,
     product_update: schemas.ProductUpdate,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shop_db)
 ):
     """Update a product"""
     product = db.query(models.Product).filter(
@@ -321,15 +389,25 @@ async def update_product(
         raise HTTPException(status_code=404, detail="Product not found")
     
     update_data = product_update.model_dump(exclude_unset=True)
+    previous_cost = product.cost_price
     for field, value in update_data.items():
         setattr(product, field, value)
+    if "cost_price" in update_data and product.cost_price != previous_cost and product.inventory:
+        # Revalue the stock on hand at the new cost
+        stock = product.inventory.current_stock or 0
+        inventory_valuation.adjust(
+            db, user_id, 0,
+            inventory_valuation.stock_value(stock, product.cost_price) - inventory_valuation.stock_value(stock, previous_cost)
+        )
     
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
     db.refresh(product)
+    events.publish_product_change(user_id, product.id, "updated", update_data)
     return product
 
 @app.delete("/products/{product_id}")
-async def delete_product(product_id: int, user_id: int, db: Session = Depends(get_db)):
+async def delete_product(product_id: int, user_id: int, db: Session = Depends(get_shop_db)):
     """Delete a product (soft delete)"""
     product = db.query(models.Product).filter(
         models.Product.id == product_id,
@@ -340,23 +418,38 @@ async def delete_product(product_id: int, user_id: int, db: Session = Depends(ge
         raise HTTPException(status_code=404, detail="Product not found")
     
     product.is_active = False
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
+    events.publish_product_change(user_id, product_id, "deleted")
     return {"message": "Product deleted successfully"}
 
 # ===== INVENTORY =====
 @app.get("/inventory", response_model=List[schemas.Inventory])
-async def list_inventory(user_id: int, db: Session = Depends(get_db)):
+async def list_inventory(user_id: int, request: Request, db: Session = Depends(get_read_db)):
     """List all inventory items for a user"""
-    inventory = db.query(models.Inventory).join(models.Product).filter(
-        models.Product.user_id == user_id,
-        models.Product.is_active == True
-    ).all()
-    return inventory
+    etag, not_modified = catalog_version.check_not_modified(request, db, user_id)
+    if not_modified:
+        return not_modified
+    
+    inventory = projections.inventory_rows(db, user_id)
+    return FastJSONResponse(inventory, headers=catalog_version.cache_headers(etag))
 
 @app.get("/inventory/low-stock", response_model=List[schemas.Product])
-async def get_low_stock_products(user_id: int, db: Session = Depends(get_db)):
+async def get_low_stock_products(
+    user_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db)
+):
     """Get products with low stock"""
-    products = db.query(models.Product).join(models.Inventory).filter(
+    etag, not_modified = catalog_version.check_not_modified(request, db, user_id)
+    if not_modified:
+        return not_modified
+    response.headers.update(catalog_version.cache_headers(etag))
+    
+    products = db.query(models.Product).join(models.Inventory).options(
+        contains_eager(models.Product.inventory)
+    ).filter(
         models.Product.user_id == user_id,
         models.Product.is_active == True,
         models.Inventory.current_stock <= models.Inventory.minimum_stock
@@ -370,12 +463,36 @@ async def get_low_stock_products(user_id: int, db: Session = Depends(get_db)):
     
     return products
 
+@app.get("/inventory/expiring", response_model=List[schemas.ExpiringLot])
+async def get_expiring_lots(
+    user_id: int,
+    within_days: int = Query(30, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_read_db)
+):
+    """Lots with stock left expiring within `within_days` (expired ones included), soonest first"""
+    return FastJSONResponse(inventory_lots.expiring(db, user_id, within_days, limit=limit))
+
+@app.get("/inventory/reorder-suggestions", response_model=List[schemas.ReorderSuggestion])
+async def get_reorder_suggestions(
+    user_id: int,
+    lead_time_days: float = Query(sales_velocity.REORDER_LEAD_TIME_DAYS, ge=0),
+    cover_days: float = Query(sales_velocity.REORDER_COVER_DAYS, ge=0),
+    include_all: bool = False,
+    db: Session = Depends(get_read_db)
+):
+    """Days of cover and order quantities from each product's sales velocity"""
+    suggestions = sales_velocity.reorder_suggestions(
+        db, user_id, lead_time_days=lead_time_days, cover_days=cover_days, include_all=include_all
+    )
+    return FastJSONResponse(suggestions)
+
 @app.put("/inventory/{product_id}", response_model=schemas.Inventory)
 async def update_inventory(
     product_id: int,
     inventory_update: schemas.InventoryUpdate,
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_shop_db)
 ):
     """Update inventory for a product"""
     # Verify product belongs to user
@@ -395,16 +512,92 @@ async def update_inventory(
         raise HTTPException(status_code=404, detail="Inventory not found")
     
     update_data = inventory_update.model_dump(exclude_unset=True)
+    previous_stock = inventory.current_stock
+    if update_data.get("current_stock") is not None:
+        inventory_ledger.record_adjustment(
+            db, user_id, inventory.id,
+            update_data["current_stock"] - (inventory.current_stock or 0),
+            "adjustment", reason="Stock count update"
+        )
     for field, value in update_data.items():
         setattr(inventory, field, value)
+    if update_data.get("current_stock") is not None and update_data["current_stock"] < (previous_stock or 0):
+        inventory_lots.trim_to_stock(db, inventory.id, update_data["current_stock"])
+    stock_change = (inventory.current_stock or 0) - (previous_stock or 0)
+    inventory_valuation.adjust(db, user_id, stock_change, inventory_valuation.stock_value(stock_change, product.cost_price))
     
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
     db.refresh(inventory)
+    events.publish_stock_change(
+        user_id, product_id, previous_stock, inventory.current_stock, inventory.minimum_stock
+    )
+    return inventory
+
+@app.post("/inventory/snapshots")
+async def create_inventory_snapshots(user_id: int, db: Session = Depends(get_shop_db)):
+    """Record the closing stock of every product (normally run nightly)"""
+    count = inventory_ledger.take_snapshots(db, user_id=user_id)
+    db.commit()
+    return {"message": f"Recorded {count} inventory snapshots", "snapshots": count}
+
+def _get_product_inventory(db: Session, product_id: int, user_id: int) -> models.Inventory:
+    inventory = db.query(models.Inventory).join(models.Product).filter(
+        models.Inventory.product_id == product_id,
+        models.Product.user_id == user_id
+    ).first()
+    
+    if not inventory:
+        raise HTTPException(status_code=404, detail="Inventory not found")
     return inventory
 
+@app.get("/inventory/{product_id}/stock-as-of", response_model=schemas.StockAsOf)
+async def get_stock_as_of(product_id: int, user_id: int, at: datetime, db: Session = Depends(get_read_db)):
+    """Stock level of a product at a past moment"""
+    inventory = _get_product_inventory(db, product_id, user_id)
+    return inventory_ledger.stock_as_of(db, inventory, at)
+
+@app.get("/inventory/{product_id}/adjustments", response_model=schemas.PaginatedResponse)
+async def list_inventory_adjustments(
+    product_id: int,
+    user_id: int,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """Stock movement history for a product, newest first"""
+    inventory = _get_product_inventory(db, product_id, user_id)
+    return inventory_ledger.adjustment_page(db, inventory.id, page=page, per_page=per_page)
+
+@app.post("/inventory/{product_id}/lots", response_model=schemas.InventoryLot)
+async def receive_inventory_lot(
+    product_id: int,
+    user_id: int,
+    lot: schemas.InventoryLotCreate,
+    db: Session = Depends(get_shop_db)
+):
+    """Receive a batch with its own expiry date; its quantity is added to stock"""
+    inventory = _get_product_inventory(db, product_id, user_id)
+    previous_stock = inventory.current_stock
+    db_lot = inventory_lots.receive_lot(
+        db, user_id, inventory, lot.quantity, expiry_date=lot.expiry_date, batch_number=lot.batch_number
+    )
+    catalog_version.bump_catalog_version(db, user_id)
+    db.commit()
+    events.publish_stock_change(
+        user_id, product_id, previous_stock, inventory.current_stock, inventory.minimum_stock
+    )
+    return db_lot
+
+@app.get("/inventory/{product_id}/lots", response_model=List[schemas.InventoryLot])
+async def list_inventory_lots(product_id: int, user_id: int, db: Session = Depends(get_read_db)):
+    """Lots with stock left, in the order sales use them (earliest expiry first)"""
+    inventory = _get_product_inventory(db, product_id, user_id)
+    return inventory_lots.open_lots(db, inventory.id)
+
 # ===== CUSTOMERS =====
 @app.post("/customers", response_model=schemas.Customer)
-async def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_db)):
+async def create_customer(customer: schemas.CustomerCreate, db: Session = Depends(get_shop_db)):
     """Create a new customer"""
     db_customer = models.Customer(**customer.model_dump())
     db.add(db_customer)
@@ -416,7 +609,7 @@ async def create_customer(customer: schemas.CustomerCreate, db: Session = Depend
 async def list_customers(
     user_id: int,
     search: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """List all customers for a user"""
     query = db.query(models.Customer).filter(
@@ -434,7 +627,7 @@ async def list_customers(
     return customers
 
 @app.get("/customers/{customer_id}", response_model=schemas.Customer)
-async def get_customer(customer_id: int, user_id: int, db: Session = Depends(get_db)):
+async def get_customer(customer_id: int, user_id: int, db: Session = Depends(get_read_db)):
     """Get a single customer"""
     customer = db.query(models.Customer).filter(
         models.Customer.id == customer_id,
@@ -446,80 +639,109 @@ async def get_customer(customer_id: int, user_id: int, db: Session = Depends(get
     
     return customer
 
-# ===== SALES =====
-def generate_invoice_number() -> str:
-    """Generate a unique invoice number"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    return f"INV-{timestamp}-{str(uuid.uuid4())[:6].upper()}"
+@app.get("/customers/{customer_id}/purchases", response_model=schemas.PaginatedResponse)
+async def list_customer_purchases(
+    customer_id: int,
+    user_id: int,
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """A customer's sales not yet archived, newest first"""
+    exists = db.query(models.Customer.id).filter(
+        models.Customer.id == customer_id,
+        models.Customer.user_id == user_id
+    ).first()
+    
+    if not exists:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    return customer_stats.purchase_page(db, customer_id, page=page, per_page=per_page)
 
+# ===== SALES =====
 @app.post("/sales", response_model=schemas.Sale)
-async def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
-    """Create a new sale"""
-    # Calculate totals
-    subtotal = Decimal("0.00")
-    total_discount = Decimal("0.00")
-    total_tax = Decimal("0.00")
-    
-    # Validate products and calculate totals
-    sale_items_data = []
-    for item in sale.items:
-        product = db.query(models.Product).filter(
-            models.Product.id == item.product_id,
-            models.Product.user_id == sale.user_id
-        ).first()
+async def create_sale(
+    sale: schemas.SaleCreate,
+    claim: idempotency.Claim = Depends(idempotency.idempotent("POST /sales")),
+    db: Session = Depends(get_shop_db)
+):
+    """Create a new sale (send an Idempotency-Key header to make retries safe)"""
+    if claim.replay:
+        return claim.replay
+    
+    # Load every product in the cart (with its inventory) in one query
+    product_ids = {item.product_id for item in sale.items}
+    products = {
+        product.id: product
+        for product in db.query(models.Product).options(
+            joinedload(models.Product.inventory)
+        ).filter(
+            models.Product.id.in_(product_ids),
+            models.Product.user_id == sale.user_id,
+            models.Product.is_active == True
+        )
+    }
+    
+    # Validate products and stock (summed over repeated lines of one product)
+    for product_id, quantity in pricing.requested_quantities(sale.items).items():
+        product = products.get(product_id)
         
         if not product:
-            raise HTTPException(status_code=404, detail=f"Product {item.product_id} not found")
+            raise HTTPException(status_code=404, detail=f"Product {product_id} not found")
         
-        # Check inventory
-        if product.inventory and product.inventory.current_stock < item.quantity:
+        if product.inventory and product.inventory.current_stock < quantity:
             raise HTTPException(
                 status_code=400, 
                 detail=f"Insufficient stock for {product.name}. Available: {product.inventory.current_stock}"
             )
-        
-        # Calculate item totals
-        item_subtotal = item.unit_price * item.quantity
-        item_discount = item.discount_amount or (item_subtotal * item.discount_percentage / 100)
-        item_tax = (item_subtotal - item_discount) * item.tax_percentage / 100
-        item_total = item_subtotal - item_discount + item_tax
-        
-        subtotal += item_subtotal
-        total_discount += item_discount
-        total_tax += item_tax
-        
-        sale_items_data.append({
-            **item.model_dump(),
-            "discount_amount": item_discount,
-            "tax_amount": item_tax,
-            "total_price": item_total
-        })
     
-    total_amount = subtotal - total_discount + total_tax
-    change_amount = sale.paid_amount - total_amount if sale.paid_amount >= total_amount else Decimal("0.00")
-    payment_status = "completed" if sale.paid_amount >= total_amount else "partial"
+    # Calculate totals (shared with POST /sales/quote)
+    lines = [
+        pricing.price_item(item, products[item.product_id].selling_price)
+        for item in sale.items
+    ]
+    totals = pricing.cart_totals(lines, sale.paid_amount)
+    total_amount = totals["total_amount"]
+    
+    sale_items_data = [
+        {
+            **item.model_dump(),
+            "discount_amount": line["discount_amount"],
+            "tax_amount": line["tax_amount"],
+            "total_price": line["total_price"],
+            "unit_cost": products[item.product_id].cost_price  # Margin reports use the cost at the time of sale
+        }
+        for item, line in zip(sale.items, lines)
+    ]
     
     # Create sale
     db_sale = models.Sale(
         user_id=sale.user_id,
         customer_id=sale.customer_id,
-        invoice_number=generate_invoice_number(),
-        subtotal=subtotal,
-        discount_amount=total_discount,
-        tax_amount=total_tax,
+        invoice_number=next_invoice_number(db, sale.user_id),
+        subtotal=totals["subtotal"],
+        discount_amount=totals["discount_amount"],
+        tax_amount=totals["tax_amount"],
         total_amount=total_amount,
         payment_method=sale.payment_method,
-        payment_status=payment_status,
+        payment_status=totals["payment_status"],
         paid_amount=sale.paid_amount,
-        change_amount=change_amount,
+        change_amount=totals["change_amount"],
         notes=sale.notes
     )
     
     db.add(db_sale)
-    db.commit()
-    db.refresh(db_sale)
+    db.flush()  # Assign the sale id; everything below commits together
+    
+    if sale.customer_id is not None and not customer_stats.record_purchase(
+        db, sale.user_id, sale.customer_id, total_amount, sale.paid_amount
+    ):
+        raise HTTPException(status_code=404, detail="Customer not found")
     
     # Create sale items and update inventory
+    stock_changes = []
+    sold_from = {}  # inventory_id -> quantity, for lot depletion
+    sold_value = Decimal("0")
     for item_data in sale_items_data:
         db_sale_item = models.SaleItem(
             sale_id=db_sale.id,
@@ -528,12 +750,16 @@ async def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
         db.add(db_sale_item)
         
         # Update inventory
-        product = db.query(models.Product).filter(
-            models.Product.id == item_data["product_id"]
-        ).first()
+        product = products[item_data["product_id"]]
         
         if product.inventory:
+            previous_stock = product.inventory.current_stock
             product.inventory.current_stock -= item_data["quantity"]
+            sold_from[product.inventory.id] = sold_from.get(product.inventory.id, 0) + item_data["quantity"]
+            sold_value += inventory_valuation.stock_value(item_data["quantity"], product.cost_price)
+            stock_changes.append((
+                product.id, previous_stock, product.inventory.current_stock, product.inventory.minimum_stock
+            ))
             
             # Create inventory adjustment record
             adjustment = models.InventoryAdjustment(
@@ -546,9 +772,24 @@ async def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
             )
             db.add(adjustment)
     
+    inventory_lots.deplete(db, sold_from)  # One UPDATE for the whole cart
+    inventory_valuation.adjust(db, sale.user_id, -sum(sold_from.values()), -sold_value)
+    catalog_version.bump_catalog_version(db, sale.user_id)
+    sales_rollup.enqueue_sale_rollup(db, db_sale)  # Reporting catches up after the response
+    db.flush()
+    db.refresh(db_sale)  # Database defaults (sale_date) and items, for the response
+    response = schemas.Sale.model_validate(db_sale).model_dump(mode="json")
+    claim.complete(db, response)  # Commits with the sale, or not at all
     db.commit()
-    db.refresh(db_sale)
-    return db_sale
+    task_queue.notify()
+    for product_id, previous_stock, current_stock, minimum_stock in stock_changes:
+        events.publish_stock_change(sale.user_id, product_id, previous_stock, current_stock, minimum_stock)
+    return FastJSONResponse(response)
+
+@app.post("/sales/quote", response_model=schemas.SaleQuote)
+async def quote_sale(quote: schemas.SaleQuoteRequest, db: Session = Depends(get_read_db)):
+    """Price a cart exactly as POST /sales would, without saving anything"""
+    return pricing.quote(db, quote.user_id, quote.items, paid_amount=quote.paid_amount)
 
 @app.get("/sales", response_model=List[schemas.Sale])
 async def list_sales(
@@ -556,39 +797,60 @@ async def list_sales(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     payment_status: Optional[str] = None,
-    db: Session = Depends(get_db)
+    fields: Optional[str] = Query(None, description="Comma-separated sale columns to return; items are then left out"),
+    include: Optional[str] = Query(None, description="`items` to embed line items alongside `fields`"),
+    db: Session = Depends(get_read_db)
 ):
     """List all sales for a user"""
-    query = db.query(models.Sale).filter(models.Sale.user_id == user_id)
-    
-    if start_date:
-        query = query.filter(models.Sale.sale_date >= start_date)
-    
-    if end_date:
-        query = query.filter(models.Sale.sale_date <= end_date)
-    
-    if payment_status:
-        query = query.filter(models.Sale.payment_status == payment_status)
-    
-    sales = query.order_by(desc(models.Sale.created_at)).all()
-    return sales
+    columns = _sparse_columns(projections.SALE_FIELDS, fields)
+    if include not in (None, "items"):
+        raise HTTPException(status_code=400, detail="include supports only: items")
+    sales = projections.sale_rows(
+        db, user_id,
+        start_date=start_date,
+        end_date=end_date,
+        payment_status=payment_status,
+        columns=columns,
+        include_items=columns is None or include == "items"
+    )
+    return FastJSONResponse(sales)
+
+@app.get("/sales/export")
+async def export_sales(
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """All sales as NDJSON, oldest first, including archived ones"""
+    lines = sales_archive.export_sales(db, user_id, start_date=start_date, end_date=end_date)
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 @app.get("/sales/{sale_id}", response_model=schemas.Sale)
-async def get_sale(sale_id: int, user_id: int, db: Session = Depends(get_db)):
-    """Get a single sale with items"""
+async def get_sale(sale_id: int, user_id: int, db: Session = Depends(get_read_db)):
+    """Get a single sale with items (archived sales are read back from their file)"""
     sale = db.query(models.Sale).filter(
         models.Sale.id == sale_id,
         models.Sale.user_id == user_id
     ).first()
     
     if not sale:
-        raise HTTPException(status_code=404, detail="Sale not found")
+        archived = sales_archive.find_archived_sale(db, user_id, sale_id)
+        if archived is None:
+            raise HTTPException(status_code=404, detail="Sale not found")
+        return FastJSONResponse(archived)
     
     return sale
 
+# ===== LIVE UPDATES =====
+@app.get("/events")
+async def stream_events(user_id: int, request: Request):
+    """Server-sent events: stock, low-stock and product changes for a shop"""
+    return events.stream_response(request, user_id)
+
 # ===== DASHBOARD & ANALYTICS =====
 @app.get("/dashboard", response_model=schemas.DashboardStats)
-async def get_dashboard_stats(user_id: int, db: Session = Depends(get_db)):
+async def get_dashboard_stats(user_id: int, db: Session = Depends(get_read_db)):
     """Get dashboard statistics"""
     today = datetime.now().date()
     month_start = today.replace(day=1)
@@ -624,7 +886,9 @@ async def get_dashboard_stats(user_id: int, db: Session = Depends(get_db)):
     ).count()
     
     # Recent sales
-    recent_sales = db.query(models.Sale).filter(
+    recent_sales = db.query(models.Sale).options(
+        selectinload(models.Sale.items)
+    ).filter(
         models.Sale.user_id == user_id
     ).order_by(desc(models.Sale.created_at)).limit(5).all()
     
@@ -638,6 +902,32 @@ async def get_dashboard_stats(user_id: int, db: Session = Depends(get_db)):
         top_selling_products=[]  # TODO: Implement top selling products
     )
 
+@app.get("/reports/daily-sales", response_model=List[schemas.DailySales])
+async def get_daily_sales(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Per-day sales totals, updated in the background shortly after each sale"""
+    return sales_rollup.daily_sales(db, user_id, start=start_date, end=end_date)
+
+@app.get("/reports/margin", response_model=List[schemas.MarginRow])
+async def get_margin_report(
+    user_id: int,
+    group_by: str = Query("day", pattern="^(day|product|category)$"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Revenue, cost and gross margin per day, product or category, from the daily rollups"""
+    return sales_rollup.margin_report(db, user_id, group_by=group_by, start=start_date, end=end_date)
+
+@app.get("/reports/inventory-valuation", response_model=schemas.InventoryValuation)
+async def get_inventory_valuation(user_id: int, db: Session = Depends(get_read_db)):
+    """Units in stock and their value at cost, kept current as stock changes"""
+    return inventory_valuation.valuation(db, user_id)
+
 # ===== HEALTH CHECK =====
 @app.get("/health")
 async def health_check():
@@ -645,9 +935,24 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now(),
-        "database": get_database_info()
+        "database": get_database_info(),
+        "read_replicas": read_replicas.replica_set.status() if read_replicas.replica_set else [],
+        "database_pool": {name: db_pool.pool_stats(engine) for name, engine in db_pool.all_pools()}
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Connection pool statistics in the Prometheus text format"""
+    return Response(db_pool.prometheus_text(db_pool.all_pools()), media_type="text/plain; version=0.0.4")
+
+@app.get("/diagnostics/queries")
+async def query_diagnostics(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: str = Query("total", pattern="^(total|mean|max)$")
+):
+    """Slowest SQL statements since startup, by total, mean or max time (see query_stats.py)"""
+    return query_stats.summary(limit, order_by)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,43 @@
+"""
+Alembic environment for the SmartPOS schema.
+
+schema_version.upgrade() passes its own connection in config.attributes, so
+shop files under per-shop routing are migrated the same way as the shared
+database. From the command line the engine from database.py is used.
+"""
+import os
+import sys
+from logging.config import fileConfig
+
+from alembic import context
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Base, engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+config = context.config
+if config.attributes.get("connection") is None and config.config_file_name:
+    fileConfig(config.config_file_name)  # Command-line runs only; leave the app's logging alone
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=Base.metadata,
+        render_as_batch=connection.dialect.name == "sqlite",  # SQLite can't ALTER most things in place
+        compare_type=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    context.configure(url=engine.url, target_metadata=Base.metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+elif config.attributes.get("connection") is not None:
+    run_migrations(config.attributes["connection"])
+else:
+    with engine.begin() as connection:
+        run_migrations(connection)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, func, Text, Numeric
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Date, DateTime, func, Text, Numeric, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from decimal import Decimal
@@ -48,6 +48,9 @@ class Category(Base):
 # Products
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_user_updated", "user_id", "updated_at"),  # Delta sync
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -74,6 +77,14 @@ class Product(Base):
     inventory = relationship("Inventory", back_populates="product", uselist=False, cascade="all, delete-orphan")
     sale_items = relationship("SaleItem", back_populates="product")
 
+# Catalog version per shop (bumped on every product, category or stock change)
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 # Inventory Management
 class Inventory(Base):
     __tablename__ = "inventory"
@@ -88,15 +99,42 @@ class Inventory(Base):
     expiry_date = Column(DateTime, nullable=True)
     batch_number = Column(String)
     supplier_info = Column(Text)
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)  # Set explicitly in bulk UPDATEs
 
     # Relationships
     product = relationship("Product", back_populates="inventory")
     adjustments = relationship("InventoryAdjustment", back_populates="inventory")
+    snapshots = relationship("InventorySnapshot", back_populates="inventory")
+    lots = relationship("InventoryLot", back_populates="inventory")
+
+# Stock lots (batches) of an inventory row, depleted first-expiry-first-out by sales (see inventory_lots.py)
+class InventoryLot(Base):
+    __tablename__ = "inventory_lots"
+    __table_args__ = (
+        Index("ix_inventory_lots_inventory_expiry", "inventory_id", "expiry_date", "id"),  # Depletion order
+        # Expiring-soon lookups; only lots with stock left are indexed
+        Index("ix_inventory_lots_open_expiry", "user_id", "expiry_date",
+              sqlite_where=text("quantity > 0"), postgresql_where=text("quantity > 0")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    inventory_id = Column(Integer, ForeignKey("inventory.id"), nullable=False)
+    batch_number = Column(String)
+    quantity = Column(Integer, nullable=False)  # Still in stock
+    received_quantity = Column(Integer, nullable=False)
+    expiry_date = Column(Date, nullable=True)  # Lots without one are sold last
+    received_at = Column(DateTime, default=func.now())
+
+    # Relationships
+    inventory = relationship("Inventory", back_populates="lots")
 
 # Inventory Adjustments (for tracking stock changes)
 class InventoryAdjustment(Base):
     __tablename__ = "inventory_adjustments"
+    __table_args__ = (
+        Index("ix_inventory_adjustments_inventory_created", "inventory_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -111,6 +149,23 @@ class InventoryAdjustment(Base):
     owner = relationship("User", back_populates="inventory_adjustments")
     inventory = relationship("Inventory", back_populates="adjustments")
 
+# Inventory Snapshots (periodic closing stock, so history queries replay only a tail)
+class InventorySnapshot(Base):
+    __tablename__ = "inventory_snapshots"
+    __table_args__ = (
+        Index("ix_inventory_snapshots_inventory_taken", "inventory_id", "snapshot_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    inventory_id = Column(Integer, ForeignKey("inventory.id"), nullable=False)
+    snapshot_at = Column(DateTime, nullable=False)
+    closing_stock = Column(Integer, nullable=False)
+    last_adjustment_id = Column(Integer, nullable=True)  # Newest adjustment included in closing_stock
+    created_at = Column(DateTime, default=func.now())
+
+    # Relationships
+    inventory = relationship("Inventory", back_populates="snapshots")
+
 # Customers
 class Customer(Base):
     __tablename__ = "customers"
@@ -137,6 +192,10 @@ class Customer(Base):
 # Sales/Transactions
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        Index("ix_sales_user_sale_date", "user_id", "sale_date"),
+        Index("ix_sales_customer_sale_date", "customer_id", "sale_date"),  # Purchase history
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -160,6 +219,59 @@ class Sale(Base):
     customer = relationship("Customer", back_populates="sales")
     items = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
 
+# Invoice number counters (one row per shop per financial year)
+class InvoiceSequence(Base):
+    __tablename__ = "invoice_sequences"
+    __table_args__ = (UniqueConstraint("user_id", "financial_year"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    financial_year = Column(String, nullable=False)  # e.g. "2024-25"
+    next_number = Column(Integer, nullable=False, default=1)  # Next number to hand out
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Daily sales totals per shop (maintained by the background task queue)
+class DailySalesRollup(Base):
+    __tablename__ = "daily_sales_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "sale_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sale_date = Column(Date, nullable=False)
+    sale_count = Column(Integer, nullable=False, default=0)
+    items_sold = Column(Integer, nullable=False, default=0)
+    subtotal = Column(Numeric(12, 2), nullable=False, default=0)
+    discount_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    tax_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    total_amount = Column(Numeric(12, 2), nullable=False, default=0)
+    cost_amount = Column(Numeric(12, 2), nullable=False, default=0, server_default="0")  # Cost of the goods sold
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+# Revenue and cost per product per day (maintained alongside daily_sales_rollups)
+class DailyProductMargin(Base):
+    __tablename__ = "daily_product_margins"
+    __table_args__ = (
+        UniqueConstraint("user_id", "sale_date", "product_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sale_date = Column(Date, nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)  # The product's category when rolled up
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)  # After discounts, before tax
+    cost = Column(Numeric(12, 2), nullable=False, default=0)
+
+# Units in stock and their value at cost, per shop (kept current by inventory_valuation.py)
+class InventoryValuation(Base):
+    __tablename__ = "inventory_valuations"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    stock_units = Column(Integer, nullable=False, default=0)
+    stock_value = Column(Numeric(14, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 # Sale Items (Individual products in a sale)
 class SaleItem(Base):
     __tablename__ = "sale_items"
@@ -174,8 +286,89 @@ class SaleItem(Base):
     tax_percentage = Column(Numeric(5, 2), default=0.0)
     tax_amount = Column(Numeric(10, 2), default=0.0)
     total_price = Column(Numeric(10, 2), nullable=False)  # (quantity * unit_price) - discount + tax
+    unit_cost = Column(Numeric(10, 2), nullable=True)  # Product cost_price at the time of sale
     created_at = Column(DateTime, default=func.now())
 
     # Relationships
     sale = relationship("Sale", back_populates="items")
     product = relationship("Product", back_populates="sale_items")
+
+# Durable queue for work that runs after a request commits (see task_queue.py)
+class BackgroundTask(Base):
+    __tablename__ = "background_tasks"
+    __table_args__ = (
+        Index("ix_background_tasks_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    kind = Column(String, nullable=False)  # Name of a registered handler
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String, nullable=False, default="pending")  # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False)
+    locked_at = Column(DateTime, nullable=True)  # When a worker claimed it
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=func.now())
+    completed_at = Column(DateTime, nullable=True)
+
+# Stored results of requests sent with an Idempotency-Key header (see idempotency.py)
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, default=0)  # Shop the key belongs to (0 if unknown)
+    key = Column(String(255), nullable=False)
+    endpoint = Column(String, nullable=False)  # e.g. "POST /sales"
+    fingerprint = Column(String(64), nullable=False)  # SHA-256 of the request body
+    status = Column(String, nullable=False, default="in_progress")  # in_progress, completed
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON
+    locked_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=func.now())
+
+# Sales moved out to archive files (see sales_archive.py); enough to find them again
+class ArchivedSale(Base):
+    __tablename__ = "archived_sales"
+    __table_args__ = (
+        Index("ix_archived_sales_user_sale_date", "user_id", "sale_date"),
+        Index("ix_archived_sales_user_sale_id", "user_id", "sale_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sale_id = Column(Integer, nullable=False)  # The sale's original id, which SQLite may hand out again
+    invoice_number = Column(String, unique=True, index=True)
+    sale_date = Column(DateTime, nullable=False)
+    archive_file = Column(String, nullable=False)  # Relative to SALES_ARCHIVE_DIR
+    archived_at = Column(DateTime, default=func.now())
+
+# Frequently-bought-together pairs, rebuilt in batch by basket_analysis.py
+class ProductAssociation(Base):
+    __tablename__ = "product_associations"
+    __table_args__ = (
+        Index("ix_product_associations_user_product", "user_id", "product_id"),  # Cart lookups
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    associated_product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    rank = Column(Integer, nullable=False)  # 1 = strongest association of product_id
+    support = Column(Integer, nullable=False)  # Sales containing both products
+    confidence = Column(Float, nullable=False)  # Share of product_id's sales that also had the other
+    lift = Column(Float, nullable=False)  # Confidence relative to how often the other sells at all
+    computed_at = Column(DateTime, nullable=False)
+
+# Exponentially weighted units sold per day, per product (maintained by sales_velocity.py).
+# Kept out of inventory so the nightly update doesn't touch inventory.updated_at (delta sync).
+class ProductVelocity(Base):
+    __tablename__ = "product_velocities"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    units_per_day = Column(Float, nullable=False, default=0.0)
+    through_date = Column(Date, nullable=False)  # Last whole day folded into units_per_day
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
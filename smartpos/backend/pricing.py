@@ -0,0 +1,192 @@
+"""
+Cart pricing shared by checkout (create_sale) and the billing screen's quote.
+
+price_item(), price_line() and cart_totals() are the only place sale
+arithmetic happens, so a quote and the sale it turns into always agree to
+the paisa. A line's tax is taken as sent, 0% if left out, as checkout
+always has; only a quote fills a missing unit price from the catalog. Amounts
+are rounded to two places per line, half up, before they are summed, so
+the sale's totals are exactly the sum of its stored line items.
+
+PriceCache keeps each shop's active catalog (price, tax, stock) in memory
+for quotes. It is keyed by the shop's catalog version. A changed version
+fetches only the rows changed since the last load, and the version itself
+is checked at most once per PRICE_CACHE_TTL_SECONDS, so a cashier scanning
+item after item doesn't query the database for every scan.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+import catalog_sync
+import catalog_version
+
+PRICE_CACHE_TTL_SECONDS = float(os.getenv("PRICE_CACHE_TTL_SECONDS", "1"))
+PRICE_CACHE_SHOPS = int(os.getenv("PRICE_CACHE_SHOPS", "256"))
+
+CENT = Decimal("0.01")
+ZERO = Decimal("0.00")
+
+
+def to_cents(amount: Decimal) -> Decimal:
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def price_line(
+    unit_price: Decimal,
+    quantity: int,
+    discount_percentage: Decimal = ZERO,
+    discount_amount: Decimal = ZERO,
+    tax_percentage: Decimal = ZERO
+) -> dict:
+    """Discount, tax and total of one cart line"""
+    subtotal = to_cents(unit_price * quantity)
+    discount = to_cents(discount_amount or (subtotal * discount_percentage / 100))
+    tax = to_cents((subtotal - discount) * tax_percentage / 100)
+    return {
+        "subtotal": subtotal,
+        "discount_amount": discount,
+        "tax_amount": tax,
+        "total_price": subtotal - discount + tax
+    }
+
+
+def price_item(item, catalog_price: Optional[Decimal]) -> dict:
+    """Price one requested line; a quote line without a unit price gets the catalog's"""
+    unit_price = item.unit_price if item.unit_price is not None else (catalog_price or ZERO)
+    tax_percentage = item.tax_percentage or ZERO
+    return {
+        "unit_price": unit_price,
+        "tax_percentage": tax_percentage,
+        **price_line(unit_price, item.quantity, item.discount_percentage, item.discount_amount, tax_percentage)
+    }
+
+
+def cart_totals(lines: Iterable[dict], paid_amount: Decimal) -> dict:
+    """Sale totals from priced lines, plus change and payment status"""
+    subtotal = discount = tax = ZERO
+    for line in lines:
+        subtotal += line["subtotal"]
+        discount += line["discount_amount"]
+        tax += line["tax_amount"]
+
+    total_amount = subtotal - discount + tax
+    return {
+        "subtotal": subtotal,
+        "discount_amount": discount,
+        "tax_amount": tax,
+        "total_amount": total_amount,
+        "change_amount": paid_amount - total_amount if paid_amount >= total_amount else ZERO,
+        "payment_status": "completed" if paid_amount >= total_amount else "partial"
+    }
+
+
+def requested_quantities(items) -> Dict[int, int]:
+    """Units asked for per product, across every line of the cart"""
+    requested = {}
+    for item in items:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+    return requested
+
+
+class ShopPrices:
+    def __init__(self, version: int, watermark, products: Dict[int, dict]):
+        self.version = version
+        self.watermark = watermark  # Database time to fetch changes from next
+        self.products = products  # product_id -> projections.product_rows row
+        self.checked_at = time.monotonic()
+
+
+class PriceCache:
+    """Per-shop catalog (price, tax, stock) for quoting, bounded LRU"""
+
+    def __init__(self, ttl: float = PRICE_CACHE_TTL_SECONDS, max_shops: int = PRICE_CACHE_SHOPS):
+        self.ttl = ttl
+        self.max_shops = max_shops
+        self._shops = OrderedDict()  # user_id -> ShopPrices
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> ShopPrices:
+        with self._lock:
+            entry = self._shops.get(user_id)
+            if entry is not None:
+                self._shops.move_to_end(user_id)
+                if time.monotonic() - entry.checked_at < self.ttl:
+                    return entry
+
+        version = catalog_version.get_catalog_version(db, user_id)
+        if entry is not None and entry.version == version:
+            entry.checked_at = time.monotonic()
+            return entry
+
+        # Read after the version, so the rows are at least as new as it
+        changes = catalog_sync.catalog_changes(db, user_id, since=entry.watermark if entry else None)
+        products = dict(entry.products) if entry is not None else {}
+        for product_id in changes["deleted_product_ids"]:
+            products.pop(product_id, None)
+        products.update((row["id"], row) for row in changes["products"])
+
+        fresh = ShopPrices(version, changes["watermark"], products)
+        with self._lock:
+            self._shops[user_id] = fresh
+            self._shops.move_to_end(user_id)
+            while len(self._shops) > self.max_shops:
+                self._shops.popitem(last=False)
+        return fresh
+
+    def clear(self):
+        with self._lock:
+            self._shops.clear()
+
+
+price_cache = PriceCache()
+
+
+def quote(db: Session, user_id: int, items, paid_amount: Optional[Decimal] = None) -> dict:
+    """Price a cart as create_sale would, flagging what would make checkout fail"""
+    prices = price_cache.get(db, user_id)
+    requested = requested_quantities(items)
+
+    lines: List[dict] = []
+    for item in items:
+        product = prices.products.get(item.product_id)
+        issues = []
+        if product is None:
+            issues.append("not_found")
+            catalog_price = None
+            available = None
+        else:
+            catalog_price = product["selling_price"]
+            available = product["current_stock"]
+            if available is not None and available < requested[item.product_id]:
+                issues.append("insufficient_stock")
+
+        priced = price_item(item, catalog_price)
+        if catalog_price is not None and priced["unit_price"] != catalog_price:
+            issues.append("price_changed")
+
+        lines.append({
+            "product_id": item.product_id,
+            "name": product["name"] if product else None,
+            "quantity": item.quantity,
+            "catalog_price": catalog_price,
+            "available_stock": available,
+            "issues": issues,
+            **priced
+        })
+
+    totals = cart_totals(lines, paid_amount if paid_amount is not None else ZERO)
+    if paid_amount is None:
+        totals.update(change_amount=ZERO, payment_status=None)
+    return {
+        **totals,
+        "items": lines,
+        "paid_amount": paid_amount,
+        "can_checkout": not any("not_found" in l["issues"] or "insufficient_stock" in l["issues"] for l in lines),
+        "catalog_version": prices.version
+    }
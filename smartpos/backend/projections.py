@@ -0,0 +1,203 @@
+"""
+Core-level projections for the catalog, inventory and sales list endpoints.
+
+Each function selects only the columns of the matching response schema and
+returns plain dicts, so large lists never build ORM objects or pass through
+pydantic. Pair them with fast_json.FastJSONResponse.
+
+product_rows and sale_rows also take a narrower column list, built from a
+`fields=` query parameter by pick_columns(), for sparse fieldsets.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import desc, select
+from sqlalchemy.orm import Session
+
+import models
+
+PRODUCT_COLUMNS = [
+    models.Product.id,
+    models.Product.user_id,
+    models.Product.category_id,
+    models.Product.name,
+    models.Product.description,
+    models.Product.barcode,
+    models.Product.sku,
+    models.Product.price,
+    models.Product.cost_price,
+    models.Product.selling_price,
+    models.Product.discount_percentage,
+    models.Product.tax_percentage,
+    models.Product.unit,
+    models.Product.is_featured,
+    models.Product.image_url,
+    models.Product.is_active,
+    models.Product.created_at,
+    models.Product.updated_at,
+    models.Inventory.current_stock,
+    models.Inventory.minimum_stock,
+]
+
+INVENTORY_COLUMNS = [
+    models.Inventory.id,
+    models.Inventory.product_id,
+    models.Inventory.current_stock,
+    models.Inventory.minimum_stock,
+    models.Inventory.maximum_stock,
+    models.Inventory.reorder_quantity,
+    models.Inventory.expiry_date,
+    models.Inventory.batch_number,
+    models.Inventory.supplier_info,
+    models.Inventory.last_restocked_at,
+    models.Inventory.updated_at,
+]
+
+SALE_COLUMNS = [
+    models.Sale.id,
+    models.Sale.user_id,
+    models.Sale.customer_id,
+    models.Sale.invoice_number,
+    models.Sale.subtotal,
+    models.Sale.discount_amount,
+    models.Sale.tax_amount,
+    models.Sale.total_amount,
+    models.Sale.payment_method,
+    models.Sale.payment_status,
+    models.Sale.paid_amount,
+    models.Sale.change_amount,
+    models.Sale.notes,
+    models.Sale.sale_date,
+    models.Sale.created_at,
+    models.Sale.updated_at,
+]
+
+SALE_ITEM_COLUMNS = [
+    models.SaleItem.id,
+    models.SaleItem.sale_id,
+    models.SaleItem.product_id,
+    models.SaleItem.quantity,
+    models.SaleItem.unit_price,
+    models.SaleItem.discount_percentage,
+    models.SaleItem.discount_amount,
+    models.SaleItem.tax_percentage,
+    models.SaleItem.tax_amount,
+    models.SaleItem.total_price,
+    models.SaleItem.created_at,
+]
+
+
+PRODUCT_FIELDS = {column.key: column for column in PRODUCT_COLUMNS}
+SALE_FIELDS = {column.key: column for column in SALE_COLUMNS}
+
+
+def pick_columns(available: dict, fields: Optional[str]) -> Optional[list]:
+    """Columns for a comma-separated `fields=` value; None means all of them
+
+    id is always included. Raises ValueError naming any unknown field.
+    """
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}")
+    return [available["id"]] + [available[name] for name in names if name != "id"]
+
+
+def product_rows(
+    db: Session,
+    user_id: int,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
+    columns: Optional[list] = None
+) -> List[dict]:
+    """Active products with their stock levels, shaped like schemas.Product"""
+    columns = columns or PRODUCT_COLUMNS
+    query = select(*columns).select_from(models.Product).where(
+        models.Product.user_id == user_id,
+        models.Product.is_active == True
+    )
+    if updated_since or any(column.class_ is models.Inventory for column in columns):
+        query = query.outerjoin(models.Inventory)
+
+    if updated_since:
+        # A stock change alone also makes the product row stale
+        query = query.where(
+            (models.Product.updated_at >= updated_since) |
+            (models.Inventory.updated_at >= updated_since)
+        )
+
+    if category_id:
+        query = query.where(models.Product.category_id == category_id)
+
+    if search:
+        query = query.where(
+            models.Product.name.ilike(f"%{search}%") |
+            models.Product.barcode.ilike(f"%{search}%")
+        )
+
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def inventory_rows(db: Session, user_id: int, updated_since: Optional[datetime] = None) -> List[dict]:
+    """Inventory of active products, shaped like schemas.Inventory"""
+    query = select(*INVENTORY_COLUMNS).join_from(models.Inventory, models.Product).where(
+        models.Product.user_id == user_id,
+        models.Product.is_active == True
+    )
+    if updated_since:
+        query = query.where(models.Inventory.updated_at >= updated_since)
+    return [dict(row) for row in db.execute(query).mappings()]
+
+
+def sale_rows(
+    db: Session,
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    payment_status: Optional[str] = None,
+    columns: Optional[list] = None,
+    include_items: bool = True
+) -> List[dict]:
+    """Sales newest first with their line items, shaped like schemas.Sale
+
+    With `columns` only those sale columns are selected (no customer_name);
+    include_items=False leaves out the items and their query.
+    """
+    conditions = [models.Sale.user_id == user_id]
+
+    if start_date:
+        conditions.append(models.Sale.sale_date >= start_date)
+
+    if end_date:
+        conditions.append(models.Sale.sale_date <= end_date)
+
+    if payment_status:
+        conditions.append(models.Sale.payment_status == payment_status)
+
+    extra = {"items": [], "customer_name": None} if columns is None else {}
+    sales = [
+        {**row, **extra}
+        for row in db.execute(
+            select(*(columns or SALE_COLUMNS)).where(*conditions).order_by(desc(models.Sale.created_at))
+        ).mappings()
+    ]
+    if not sales or not include_items:
+        return sales
+
+    # One query for the items of every matching sale
+    items_by_sale = defaultdict(list)
+    matching_ids = select(models.Sale.id).where(*conditions)
+    for row in db.execute(
+        select(*SALE_ITEM_COLUMNS)
+        .where(models.SaleItem.sale_id.in_(matching_ids))
+        .order_by(models.SaleItem.id)
+    ).mappings():
+        items_by_sale[row["sale_id"]].append({**row, "product_name": None})
+
+    for sale in sales:
+        sale["items"] = items_by_sale[sale["id"]]
+    return sales
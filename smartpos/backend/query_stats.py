@@ -0,0 +1,122 @@
+"""
+Statement timings for every engine in the process, for finding slow queries.
+
+install() hooks before/after_cursor_execute on all engines. Timings are
+kept per statement text, which holds placeholders rather than values, so
+one query issued with different parameters is one entry (count, total,
+mean and max seconds). Placeholder lists, such as an expanded IN or a
+multi-row VALUES, are folded into "...", or every cart size would be its
+own statement.
+
+At most QUERY_STATS_MAX_STATEMENTS entries are kept. When twice that many
+accumulate, the ones with the least total time are dropped, so a rare,
+fast statement may drop out while one that adds up to real time stays.
+
+main.py serves slowest() at GET /diagnostics/queries, which is what
+`python db_diagnostics.py --server URL` reports.
+"""
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_STATS = os.getenv("QUERY_STATS", "true").lower() == "true"
+QUERY_STATS_MAX_STATEMENTS = int(os.getenv("QUERY_STATS_MAX_STATEMENTS", "200"))
+MAX_STATEMENT_LENGTH = 2000
+
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s)"
+_PLACEHOLDER_LIST = re.compile(rf"\bIN \({_PLACEHOLDER}\)|{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+")
+_ROW_LIST = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")  # Multi-row VALUES
+_WHITESPACE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_stats: Dict[str, list] = {}  # statement -> [count, total seconds, max seconds]
+_since = datetime.now(timezone.utc)
+_installed = False
+
+
+def normalize(statement: str) -> str:
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PLACEHOLDER_LIST.sub(lambda m: "IN (...)" if m.group(0).startswith("IN") else "...", statement)
+    return _ROW_LIST.sub("(...), ...", statement)[:MAX_STATEMENT_LENGTH]
+
+
+def _before(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_stats_started")
+    if not started:
+        return
+    record(statement, time.perf_counter() - started.pop())
+
+
+def _failed(context):
+    started = context.connection.info.get("query_stats_started") if context.connection is not None else None
+    if started:
+        started.pop()  # after_cursor_execute won't come
+
+
+def record(statement: str, seconds: float):
+    key = normalize(statement)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            _stats[key] = [1, seconds, seconds]
+            if len(_stats) > 2 * QUERY_STATS_MAX_STATEMENTS:
+                _prune()
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+
+def _prune():
+    keep = sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)[:QUERY_STATS_MAX_STATEMENTS]
+    _stats.clear()
+    _stats.update(keep)
+
+
+def install():
+    """Time statements on every engine, existing and future (once per process)"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before)
+    event.listen(Engine, "after_cursor_execute", _after)
+    event.listen(Engine, "handle_error", _failed)
+    _installed = True
+
+
+def slowest(limit: int = 20, order_by: str = "total") -> List[dict]:
+    """Statements with the most total (or mean, or max) time, slowest first"""
+    with _lock:
+        rows = [
+            {
+                "statement": statement,
+                "count": count,
+                "total_seconds": round(total, 6),
+                "mean_seconds": round(total / count, 6),
+                "max_seconds": round(longest, 6)
+            }
+            for statement, (count, total, longest) in _stats.items()
+        ]
+    rows.sort(key=lambda row: row[f"{order_by}_seconds"], reverse=True)
+    return rows[:limit]
+
+
+def summary(limit: int = 20, order_by: str = "total") -> dict:
+    return {"since": _since.isoformat(), "statements": slowest(limit, order_by)}
+
+
+def reset():
+    global _since
+    with _lock:
+        _stats.clear()
+        _since = datetime.now(timezone.utc)
@@ -0,0 +1,194 @@
+"""
+Read replica routing.
+
+With READ_REPLICA_URLS set (comma separated), read-only endpoints depend on
+get_read_db and are served by a replica, round robin. Writes and everything
+else stay on the primary engine from database.py.
+
+A replica is skipped while its measured lag exceeds REPLICA_MAX_LAG_SECONDS
+or while it can't be reached. A monitor thread re-measures lag every
+REPLICA_LAG_CHECK_SECONDS, and requests only read the last measurement, so
+a slow or unreachable replica never blocks the event loop. When no replica
+qualifies, including before the first measurement, reads fall back to the
+primary.
+
+After a successful write, the client gets a short-lived cookie. Until it
+expires (READ_YOUR_WRITES_SECONDS), that client's reads go to the primary,
+so it never sees a list that is missing what it just saved.
+"""
+import itertools
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from fastapi import Request
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from database import engine_options
+import tenancy
+
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+READ_YOUR_WRITES_COOKIE = "smartpos_wrote_until"
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+READ_ONLY_POSTS = {"/sales/quote"}  # POSTs that write nothing, so don't pin the client
+
+# Zero once the replica has replayed everything it received, otherwise the age of the last replayed commit
+POSTGRES_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+ReadSession = sessionmaker(autocommit=False, autoflush=False)
+
+
+def measure_lag(engine) -> float:
+    """Replication lag in seconds (SQLite copies are treated as current)"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return float(conn.execute(POSTGRES_LAG_SQL).scalar() or 0)
+        conn.execute(text("SELECT 1"))
+        return 0.0
+
+
+def create_replica_engine(url: str):
+    return create_engine(url, **engine_options(url))
+
+
+class ReplicaSet:
+    """Picks a replica whose last measured lag is within bounds"""
+
+    def __init__(
+        self,
+        urls: List[str],
+        max_lag: float = REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = REPLICA_LAG_CHECK_SECONDS,
+        lag_probe: Callable = measure_lag
+    ):
+        self.engines = [create_replica_engine(url) for url in urls]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_probe = lag_probe
+        self._lag = [float("inf")] * len(self.engines)  # Last measured, per engine
+        self.measured_at: Optional[float] = None  # time.monotonic() of the last refresh()
+        self._next = itertools.cycle(range(len(self.engines)))
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+    def lag(self, index: int) -> float:
+        return self._lag[index]
+
+    def refresh(self):
+        """Measure every replica's lag now (blocking)"""
+        for index, engine in enumerate(self.engines):
+            try:
+                self._lag[index] = self.lag_probe(engine)
+            except Exception:
+                self._lag[index] = float("inf")  # Unreachable; retried next check
+        self.measured_at = time.monotonic()
+
+    def _watch(self):
+        if self.measured_at is None:
+            self.refresh()
+        while not self._stopping.wait(self.check_interval):
+            self.refresh()
+
+    def start(self):
+        """Measure lag in a daemon thread from now on"""
+        if self._monitor is None:
+            self._stopping.clear()
+            self._monitor = threading.Thread(target=self._watch, name="smartpos-replica-monitor", daemon=True)
+            self._monitor.start()
+
+    def stop(self, timeout: float = 5):
+        if self._monitor is not None:
+            self._stopping.set()
+            self._monitor.join(timeout)
+            self._monitor = None
+
+    def pick(self):
+        """A replica engine fit to serve reads, or None to use the primary"""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._next)
+            if self.lag(index) <= self.max_lag:
+                return self.engines[index]
+        return None
+
+    def status(self) -> List[dict]:
+        lags = [self.lag(index) for index in range(len(self.engines))]
+        return [
+            {"replica": index, "lag_seconds": lag, "healthy": lag <= self.max_lag}
+            for index, lag in enumerate(lags)
+        ]
+
+    def dispose(self):
+        self.stop()
+        for engine in self.engines:
+            engine.dispose()
+
+
+replica_set: Optional[ReplicaSet] = ReplicaSet(READ_REPLICA_URLS) if READ_REPLICA_URLS else None
+
+
+def start_monitor():
+    if replica_set is not None:
+        replica_set.start()
+
+
+def stop_monitor():
+    if replica_set is not None:
+        replica_set.stop()
+
+
+def wrote_recently(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """Pin a client's reads to the primary for a while after it writes"""
+    response = await call_next(request)
+    if (
+        replica_set is not None
+        and request.method in WRITE_METHODS
+        and request.url.path not in READ_ONLY_POSTS
+        and response.status_code < 400
+    ):
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            str(int(time.time() + READ_YOUR_WRITES_SECONDS) + 1),
+            max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+            httponly=True,
+            samesite="lax"
+        )
+    return response
+
+
+async def get_read_db(request: Request):
+    """Database dependency for read-only endpoints"""
+    engine = None
+    # Per-shop SQLite files have no replicas
+    if replica_set is not None and tenancy.router is None and not wrote_recently(request):
+        engine = replica_set.pick()
+
+    if engine is not None:
+        db = ReadSession(bind=engine)
+    else:
+        user_id = await tenancy.request_user_id(request) if tenancy.router is not None else None
+        db = tenancy.open_request_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
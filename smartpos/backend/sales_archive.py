@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Archival of old sales to compressed files.
+
+Sales older than the horizon are written, with their line items, as NDJSON
+to SALES_ARCHIVE_DIR/shop_<user_id>/<YYYY-MM>.ndjson.gz. Each record has the
+same shape as the GET /sales/{id} response. The sales and sale_items rows
+are then deleted. Each run appends a new gzip member, and readers see all
+members as one stream.
+
+Left behind in the database are:
+- the daily_sales_rollups for those days, recomputed just before deletion
+  and never recomputed afterwards;
+- an archived_sales row per sale (sale id, invoice number, date, file),
+  which lets get_sale and the sales export find archived sales again.
+  SQLite can give a deleted sale's id to a later sale, so the rows have
+  their own key and a sale is only deleted once its own row is inserted.
+
+The file is synced to disk before the database transaction that deletes
+the rows commits. If the run dies in between, the next run archives the
+same sales again. Readers keep the first record per sale id and invoice
+number, so the duplicate is harmless.
+
+Run `python sales_archive.py archive --older-than-days 365`, or set
+SALES_ARCHIVE_AFTER_DAYS to archive automatically in the task worker's
+daily housekeeping.
+"""
+import argparse
+import gzip
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, Optional
+
+import orjson
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fast_json import dumps
+import models
+import projections
+import sales_rollup
+import task_queue
+
+SALES_ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", "./archive")
+SALES_ARCHIVE_AFTER_DAYS = int(os.getenv("SALES_ARCHIVE_AFTER_DAYS", "0"))  # 0 = only from the CLI
+
+Sale = models.Sale
+Archived = models.ArchivedSale
+
+
+def _month_start(day: date) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def _next_month(start: datetime) -> datetime:
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def archive_file_for(user_id: int, month: datetime) -> str:
+    return os.path.join(f"shop_{user_id}", f"{month:%Y-%m}.ndjson.gz")
+
+
+def _append(path: str, records) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+            for record in records:
+                archive.write(dumps(record) + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def read_archive(relative_path: str, directory: str = SALES_ARCHIVE_DIR) -> Iterator[dict]:
+    """Every sale in one archive file, once each"""
+    path = os.path.join(directory, relative_path)
+    if not os.path.exists(path):
+        return
+    seen = set()
+    with gzip.open(path, "rb") as archive:
+        for line in archive:
+            record = orjson.loads(line)
+            key = (record["id"], record["invoice_number"])
+            if key not in seen:
+                seen.add(key)
+                yield record
+
+
+def archive_month(db: Session, user_id: int, month: datetime, cutoff: datetime, directory: str = SALES_ARCHIVE_DIR) -> int:
+    """Archive one shop's sales from `month` that are older than `cutoff`; commits"""
+    end = min(_next_month(month), cutoff)
+    sales = projections.sale_rows(db, user_id, start_date=month, end_date=end - timedelta(microseconds=1))
+    if not sales:
+        return 0
+
+    relative_path = archive_file_for(user_id, month)
+    _append(os.path.join(directory, relative_path), reversed(sales))  # Oldest first
+
+    # Final rollups first: once the rows are gone they can't be recomputed
+    for day in sorted({sale["sale_date"].date() for sale in sales}):
+        sales_rollup.refresh_daily_rollup(db, user_id, day)
+
+    entries = [
+        {
+            "sale_id": sale["id"],
+            "user_id": user_id,
+            "invoice_number": sale["invoice_number"],
+            "sale_date": sale["sale_date"],
+            "archive_file": relative_path
+        }
+        for sale in sales
+    ]
+    sale_ids = db.execute(insert(Archived).returning(Archived.sale_id), entries).scalars().all()
+    if sorted(sale_ids) != sorted(sale["id"] for sale in sales):
+        db.rollback()
+        raise RuntimeError(f"Archive index rows don't match the sales archived to {relative_path}")
+    db.execute(delete(models.SaleItem).where(models.SaleItem.sale_id.in_(sale_ids)))
+    db.execute(delete(Sale).where(Sale.id.in_(sale_ids)))
+    db.commit()
+    return len(sales)
+
+
+def archive_sales(db: Session, older_than_days: int, user_id: Optional[int] = None, directory: str = SALES_ARCHIVE_DIR) -> int:
+    """Archive every sale from before midnight `older_than_days` ago"""
+    cutoff = datetime.combine(date.today() - timedelta(days=older_than_days), time.min)
+    query = select(Sale.user_id, func.min(Sale.sale_date)).where(Sale.sale_date < cutoff).group_by(Sale.user_id)
+    if user_id is not None:
+        query = query.where(Sale.user_id == user_id)
+
+    archived = 0
+    for shop_id, oldest in db.execute(query).all():
+        month = _month_start(oldest)
+        while month < cutoff:
+            archived += archive_month(db, shop_id, month, cutoff, directory)
+            month = _next_month(month)
+    return archived
+
+
+def find_archived_sale(db: Session, user_id: int, sale_id: int, directory: str = SALES_ARCHIVE_DIR) -> Optional[dict]:
+    """An archived sale by id, read back from its file (the latest if the id was reused)"""
+    entry = db.execute(
+        select(Archived.archive_file, Archived.invoice_number)
+        .where(Archived.user_id == user_id, Archived.sale_id == sale_id)
+        .order_by(Archived.id.desc())
+        .limit(1)
+    ).first()
+    if entry is None:
+        return None
+    return next(
+        (
+            record for record in read_archive(entry.archive_file, directory)
+            if record["id"] == sale_id and record["invoice_number"] == entry.invoice_number
+        ),
+        None
+    )
+
+
+def export_sales(
+    db: Session,
+    user_id: int,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    directory: str = SALES_ARCHIVE_DIR
+) -> Iterator[bytes]:
+    """NDJSON lines of a shop's sales, oldest first, archived months included
+
+    The database is queried up front; only the archive files are read while
+    the response streams, after the request's session is gone.
+    """
+    files = select(Archived.archive_file).where(Archived.user_id == user_id).group_by(Archived.archive_file)
+    if start_date:
+        files = files.having(func.max(Archived.sale_date) >= start_date)
+    if end_date:
+        files = files.having(func.min(Archived.sale_date) <= end_date)
+    archive_files = sorted(db.execute(files).scalars())
+    live_sales = projections.sale_rows(db, user_id, start_date=start_date, end_date=end_date)
+
+    def lines():
+        for relative_path in archive_files:
+            for record in read_archive(relative_path, directory):
+                sold_at = datetime.fromisoformat(record["sale_date"])
+                if (start_date and sold_at < start_date) or (end_date and sold_at > end_date):
+                    continue
+                yield orjson.dumps(record) + b"\n"
+        for sale in reversed(live_sales):
+            yield dumps(sale) + b"\n"
+
+    return lines()
+
+
+@task_queue.daily
+def _archive_daily(db: Session):
+    if SALES_ARCHIVE_AFTER_DAYS > 0:
+        archive_sales(db, SALES_ARCHIVE_AFTER_DAYS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartPOS sales archive tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    archive_parser = subcommands.add_parser("archive", help="Move old sales to compressed archive files")
+    archive_parser.add_argument("--older-than-days", type=int, default=SALES_ARCHIVE_AFTER_DAYS or 365)
+    archive_parser.add_argument("--user-id", type=int, help="Only archive this shop")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    count = 0
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            count += archive_sales(db, args.older_than_days, user_id=user_id)
+    print(f"✅ Archived {count} sales to {SALES_ARCHIVE_DIR}")
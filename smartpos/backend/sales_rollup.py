@@ -0,0 +1,206 @@
+"""
+Daily sales totals per shop, kept in daily_sales_rollups, and revenue and
+cost per product per day, kept in daily_product_margins.
+
+Checkout enqueues a "daily_sales_rollup" task. The worker then recomputes
+the totals for that sale's day from the sales table. Recomputing rather than
+incrementing makes the task safe to run twice, and it also picks up edits
+to earlier sales of the same day.
+
+Cost is the unit_cost snapshotted onto each sale item at checkout, so a
+later change to a product's cost_price doesn't rewrite past margins. Items
+sold before the snapshot existed fall back to the current cost_price.
+Margin reports read only the rollup tables, never the sales.
+
+Days sold before these tables existed can be filled in with
+`python sales_rollup.py backfill`.
+"""
+import argparse
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import models
+import task_queue
+
+ROLLUP_TASK = "daily_sales_rollup"
+
+
+def _cents(amount) -> Decimal:
+    return Decimal(amount or 0).quantize(Decimal("0.01"))
+
+
+def refresh_daily_rollup(db: Session, user_id: int, day: date) -> models.DailySalesRollup:
+    """Recompute one shop's totals for one day (caller commits)"""
+    start = datetime.combine(day, time.min)
+    in_day = (
+        models.Sale.user_id == user_id,
+        models.Sale.sale_date >= start,
+        models.Sale.sale_date < start + timedelta(days=1)
+    )
+    totals = db.execute(
+        select(
+            func.count(models.Sale.id),
+            func.coalesce(func.sum(models.Sale.subtotal), 0),
+            func.coalesce(func.sum(models.Sale.discount_amount), 0),
+            func.coalesce(func.sum(models.Sale.tax_amount), 0),
+            func.coalesce(func.sum(models.Sale.total_amount), 0)
+        ).where(*in_day)
+    ).one()
+    Item = models.SaleItem
+    by_product = db.execute(
+        select(
+            Item.product_id,
+            models.Product.category_id,
+            func.sum(Item.quantity),
+            func.sum(Item.total_price - func.coalesce(Item.tax_amount, 0)),
+            func.sum(Item.quantity * func.coalesce(Item.unit_cost, models.Product.cost_price, 0))
+        )
+        .join(models.Sale, models.Sale.id == Item.sale_id)
+        .join(models.Product, models.Product.id == Item.product_id)
+        .where(*in_day)
+        .group_by(Item.product_id, models.Product.category_id)
+    ).all()
+    margins = [
+        {
+            "user_id": user_id, "sale_date": day, "product_id": product_id, "category_id": category_id,
+            "quantity": quantity, "revenue": _cents(revenue), "cost": _cents(cost)
+        }
+        for product_id, category_id, quantity, revenue, cost in by_product
+    ]
+    db.execute(delete(models.DailyProductMargin).where(
+        models.DailyProductMargin.user_id == user_id,
+        models.DailyProductMargin.sale_date == day
+    ))
+    if margins:
+        db.execute(insert(models.DailyProductMargin), margins)
+
+    rollup = db.execute(
+        select(models.DailySalesRollup).where(
+            models.DailySalesRollup.user_id == user_id,
+            models.DailySalesRollup.sale_date == day
+        )
+    ).scalar_one_or_none()
+    if rollup is None:
+        rollup = models.DailySalesRollup(user_id=user_id, sale_date=day)
+        db.add(rollup)
+
+    rollup.sale_count, rollup.subtotal, rollup.discount_amount, rollup.tax_amount, rollup.total_amount = totals
+    rollup.items_sold = sum(row["quantity"] for row in margins)
+    rollup.cost_amount = sum((row["cost"] for row in margins), Decimal("0.00"))
+    return rollup
+
+
+@task_queue.handler(ROLLUP_TASK)
+def _rollup_sale_day(db: Session, user_id: int, payload: dict):
+    sale_date = db.execute(
+        select(models.Sale.sale_date).where(models.Sale.id == payload["sale_id"])
+    ).scalar_one_or_none()
+    if sale_date is not None:  # Sale deleted since; nothing to roll up
+        refresh_daily_rollup(db, user_id, sale_date.date())
+
+
+def enqueue_sale_rollup(db: Session, sale: models.Sale):
+    task_queue.enqueue(db, ROLLUP_TASK, {"sale_id": sale.id}, user_id=sale.user_id)
+
+
+def backfill(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute the rollups for every day that still has sales (caller commits)
+
+    Days whose sales were archived are left alone, as their rows are gone.
+    """
+    day = func.date(models.Sale.sale_date)
+    query = select(models.Sale.user_id, day).group_by(models.Sale.user_id, day)
+    if user_id is not None:
+        query = query.where(models.Sale.user_id == user_id)
+
+    days = db.execute(query).all()
+    for shop_id, sale_day in days:
+        refresh_daily_rollup(db, shop_id, date.fromisoformat(sale_day) if isinstance(sale_day, str) else sale_day)
+    return len(days)
+
+
+def daily_sales(db: Session, user_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List[models.DailySalesRollup]:
+    query = select(models.DailySalesRollup).where(models.DailySalesRollup.user_id == user_id)
+    if start:
+        query = query.where(models.DailySalesRollup.sale_date >= start)
+    if end:
+        query = query.where(models.DailySalesRollup.sale_date <= end)
+    return db.execute(query.order_by(models.DailySalesRollup.sale_date)).scalars().all()
+
+
+MARGIN_GROUPS = ("day", "product", "category")
+
+
+def margin_report(
+    db: Session,
+    user_id: int,
+    group_by: str = "day",
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> List[dict]:
+    """Revenue, cost and gross margin by day, product or category, from daily_product_margins"""
+    Margin = models.DailyProductMargin
+    if group_by == "day":
+        keys = [Margin.sale_date]
+        query = select(Margin.sale_date)
+    elif group_by == "product":
+        keys = [Margin.product_id, models.Product.name]
+        query = select(Margin.product_id, models.Product.name).join(models.Product, models.Product.id == Margin.product_id)
+    elif group_by == "category":
+        keys = [Margin.category_id, models.Category.name]
+        query = select(Margin.category_id, models.Category.name).outerjoin(
+            models.Category, models.Category.id == Margin.category_id
+        )
+    else:
+        raise ValueError(f"group_by must be one of: {', '.join(MARGIN_GROUPS)}")
+
+    revenue, cost = func.sum(Margin.revenue), func.sum(Margin.cost)
+    query = query.add_columns(
+        func.sum(Margin.quantity).label("quantity"), revenue.label("revenue"), cost.label("cost")
+    ).where(Margin.user_id == user_id)
+    if start:
+        query = query.where(Margin.sale_date >= start)
+    if end:
+        query = query.where(Margin.sale_date <= end)
+    query = query.group_by(*keys).order_by(keys[0] if group_by == "day" else (revenue - cost).desc())
+
+    report = []
+    for row in db.execute(query).mappings():
+        row = dict(row)
+        row["revenue"], row["cost"] = _cents(row["revenue"]), _cents(row["cost"])
+        row["margin"] = row["revenue"] - row["cost"]
+        row["margin_percentage"] = (
+            (row["margin"] * 100 / row["revenue"]).quantize(Decimal("0.01")) if row["revenue"] else None
+        )
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartPOS sales rollup tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subcommands.add_parser("backfill", help="Recompute daily totals and margins from existing sales")
+    backfill_parser.add_argument("--user-id", type=int, help="Only this shop")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    count = 0
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            count += backfill(db, user_id=user_id)
+            db.commit()
+    print(f"✅ Recomputed daily totals and margins for {count} shop days")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Sales velocity per product, and reorder suggestions built on it.
+
+product_velocities.units_per_day is an exponentially weighted moving
+average of whole days' units sold, with a half-life of
+VELOCITY_HALF_LIFE_DAYS. With a = 1 - 0.5 ** (1 / half-life), each day d
+decays the old value by (1 - a) and adds a * units(d). Catching up on
+several days at once is therefore
+
+    v = v_old * (1 - a) ** days + sum of a * (1 - a) ** (yesterday - d) * units(d)
+
+refresh() brings a whole shop up to yesterday this way. It runs one GROUP BY
+over the days not folded in yet, so a nightly run usually reads one day
+of sales, not the whole history. The rest is NumPy, imported by the
+functions that use it so the API doesn't load it at startup. A product
+seen for the first time starts VELOCITY_HISTORY_DAYS back. The task
+worker refreshes every shop once a day:
+
+    python sales_velocity.py [--user-id N]    # or refresh by hand
+
+reorder_suggestions() reads stock, velocity and the hand-entered limits
+for every active product in one query, then works out for all of them at
+once:
+
+    days of cover      = current stock / units per day
+    reorder point      = units per day * lead time + minimum_stock
+    suggested quantity = units per day * (lead time + cover days)
+                         + minimum_stock - current stock
+
+The suggested quantity is rounded up, raised to reorder_quantity (treated as
+the minimum order) and capped at maximum_stock.
+"""
+import argparse
+import math
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+import models
+import task_queue
+
+VELOCITY_HALF_LIFE_DAYS = float(os.getenv("VELOCITY_HALF_LIFE_DAYS", "14"))
+VELOCITY_HISTORY_DAYS = int(os.getenv("VELOCITY_HISTORY_DAYS", "90"))  # Backfill for products seen the first time
+REORDER_LEAD_TIME_DAYS = float(os.getenv("REORDER_LEAD_TIME_DAYS", "7"))  # Order to delivery
+REORDER_COVER_DAYS = float(os.getenv("REORDER_COVER_DAYS", "14"))  # Stock a delivery should last
+
+Product = models.Product
+Inventory = models.Inventory
+Velocity = models.ProductVelocity
+
+
+def smoothing(half_life_days: float = VELOCITY_HALF_LIFE_DAYS) -> float:
+    return 1 - 0.5 ** (1 / half_life_days)
+
+
+def refresh(db: Session, user_id: int, today: Optional[date] = None) -> int:
+    """Fold every whole day up to yesterday into the shop's velocities (caller commits)"""
+    import numpy as np
+
+    yesterday = (today or task_queue.utcnow().date()) - timedelta(days=1)
+    products = db.execute(
+        select(Product.id, Velocity.units_per_day, Velocity.through_date)
+        .outerjoin(Velocity, Velocity.product_id == Product.id)
+        .where(Product.user_id == user_id)
+        .order_by(Product.id)
+    ).all()
+    if not products:
+        return 0
+
+    ids, velocity, through = (list(column) for column in zip(*products))
+    known = np.array([day is not None for day in through])
+    first_day = yesterday - timedelta(days=VELOCITY_HISTORY_DAYS)
+    ids = np.array(ids)
+    velocity = np.nan_to_num(np.array(velocity, dtype=float))
+    through = np.array([day or first_day for day in through], dtype="datetime64[D]")
+    end = np.datetime64(yesterday, "D")
+    gap = np.maximum((end - through).astype(int), 0)
+    if not gap.any():
+        return 0
+
+    since = through.min().astype(date) + timedelta(days=1)
+    day = func.date(models.Sale.sale_date)
+    sold = db.execute(
+        select(models.SaleItem.product_id, day, func.sum(models.SaleItem.quantity))
+        .join(models.Sale, models.Sale.id == models.SaleItem.sale_id)
+        .where(
+            models.Sale.user_id == user_id,
+            models.Sale.sale_date >= datetime.combine(since, time.min),
+            models.Sale.sale_date < datetime.combine(yesterday + timedelta(days=1), time.min)
+        )
+        .group_by(models.SaleItem.product_id, day)
+    ).all()
+
+    a = smoothing()
+    added = np.zeros(len(ids))
+    if sold:
+        sold_ids, sold_days, units = zip(*sold)
+        index = np.searchsorted(ids, sold_ids)
+        days = np.array(sold_days, dtype="datetime64[D]")
+        fresh = days > through[index]  # Products that joined later already have the earlier days
+        weight = a * (1 - a) ** (end - days).astype(int) * np.array(units, dtype=float)
+        added = np.bincount(index[fresh], weights=weight[fresh], minlength=len(ids))
+    velocity = velocity * (1 - a) ** gap + added
+
+    changed = gap > 0
+    rows = [
+        {"product_id": product_id, "units_per_day": units_per_day, "through_date": yesterday}
+        for product_id, units_per_day in zip(ids[changed].tolist(), velocity[changed].tolist())
+    ]
+    existing = set(ids[known & changed].tolist())
+    updates = [row for row in rows if row["product_id"] in existing]
+    inserts = [{**row, "user_id": user_id} for row in rows if row["product_id"] not in existing]
+    if updates:
+        db.execute(update(Velocity), updates)  # Bulk UPDATE by primary key
+    if inserts:
+        db.execute(insert(Velocity), inserts)
+    return len(rows)
+
+
+def refresh_all(db: Session, user_id: Optional[int] = None) -> Dict[int, int]:
+    """Refresh one shop, or every shop in this database, committing each"""
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = db.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+    refreshed = {}
+    for shop_id in user_ids:
+        refreshed[shop_id] = refresh(db, shop_id)
+        db.commit()
+    return refreshed
+
+
+@task_queue.daily
+def _refresh_daily(db: Session):
+    refresh_all(db)
+
+
+def reorder_suggestions(
+    db: Session,
+    user_id: int,
+    lead_time_days: float = REORDER_LEAD_TIME_DAYS,
+    cover_days: float = REORDER_COVER_DAYS,
+    include_all: bool = False
+) -> List[dict]:
+    """Active products at or below their reorder point (or all of them), least cover first"""
+    import numpy as np
+
+    rows = db.execute(
+        select(
+            Product.id, Product.name, Product.sku,
+            Inventory.current_stock, Inventory.minimum_stock, Inventory.maximum_stock,
+            Inventory.reorder_quantity, Velocity.units_per_day
+        )
+        .join(Inventory, Inventory.product_id == Product.id)
+        .outerjoin(Velocity, Velocity.product_id == Product.id)
+        .where(Product.user_id == user_id, Product.is_active == True)
+    ).all()
+    if not rows:
+        return []
+
+    ids, names, skus, stock, minimum, maximum, min_order, velocity = zip(*rows)
+    stock = np.nan_to_num(np.array(stock, dtype=float))
+    safety = np.nan_to_num(np.array(minimum, dtype=float))
+    maximum = np.array(maximum, dtype=float)  # NaN = no cap
+    min_order = np.nan_to_num(np.array(min_order, dtype=float))
+    velocity = np.nan_to_num(np.array(velocity, dtype=float))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cover = np.where(velocity > 0, stock / velocity, np.inf)
+    reorder_point = velocity * lead_time_days + safety
+    suggested = np.ceil(np.maximum(velocity * (lead_time_days + cover_days) + safety - stock, 0))
+    suggested = np.where(suggested > 0, np.maximum(suggested, min_order), 0)
+    suggested = np.where(np.isnan(maximum), suggested, np.minimum(suggested, np.maximum(maximum - stock, 0)))
+    due = stock <= reorder_point
+
+    picked = np.flatnonzero(np.ones(len(ids), dtype=bool) if include_all else due)
+    picked = picked[np.lexsort((-suggested[picked], cover[picked]))]  # Least cover, then biggest order
+
+    return [
+        {
+            "product_id": ids[i],
+            "name": names[i],
+            "sku": skus[i],
+            "current_stock": on_hand,
+            "units_per_day": units_per_day,
+            "days_of_cover": None if math.isinf(days) else days,
+            "reorder_point": point,
+            "suggested_quantity": quantity,
+            "due": is_due
+        }
+        for i, on_hand, units_per_day, days, point, quantity, is_due in zip(
+            picked.tolist(),
+            stock[picked].astype(int).tolist(),
+            np.round(velocity[picked], 3).tolist(),
+            np.round(cover[picked], 1).tolist(),
+            np.round(reorder_point[picked], 1).tolist(),
+            suggested[picked].astype(int).tolist(),
+            due[picked].tolist()
+        )
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold recent sales into product velocities")
+    parser.add_argument("--user-id", type=int, help="Only this shop")
+    args = parser.parse_args()
+
+    import tenancy
+
+    if tenancy.router is not None and args.user_id is None:
+        shops = tenancy.router.user_ids_on_disk()
+    else:
+        shops = [args.user_id]
+
+    refreshed = {}
+    for user_id in shops:
+        with tenancy.open_session(user_id) as db:
+            refreshed.update(refresh_all(db, user_id))
+    print(f"✅ Refreshed {sum(refreshed.values())} product velocities for {len(refreshed)} shops")
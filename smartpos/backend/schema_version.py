@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Schema versioning with the Alembic migrations in migrations/.
+
+At startup each app reads alembic_version once and compares it with
+HEAD_REVISION. That is one cheap query, so nothing is reflected and Alembic
+is not imported on a normal worker start.
+
+If the database is behind and SCHEMA_AUTO_MIGRATE is true (the default for
+SQLite), the pending migrations are applied. Otherwise startup fails with a
+message saying to run the migrations first, which is how deployments with
+several workers should work.
+
+Databases created by create_all() before migrations existed have no
+alembic_version table, so they run every migration from the baseline. The
+baseline creates its tables and indexes only if they don't exist yet, which
+adds what is missing. Empty databases, such as new per-shop files, are
+always migrated.
+
+    python schema_version.py upgrade    # or: alembic upgrade head
+    python schema_version.py check
+"""
+import argparse
+import os
+import sys
+from typing import Optional
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from database import DATABASE_TYPE, engine
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+HEAD_REVISION = "0006"  # Bump with every new migration; test_schema_version checks it
+SCHEMA_AUTO_MIGRATE = os.getenv(
+    "SCHEMA_AUTO_MIGRATE", "true" if DATABASE_TYPE == "sqlite" else "false"
+).lower() == "true"
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def current_revision(connection: Connection) -> Optional[str]:
+    """The migrated revision, or None if the database was never migrated"""
+    try:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception:
+        connection.rollback()  # No alembic_version table yet
+        return None
+
+
+def alembic_config(connection: Optional[Connection] = None):
+    from alembic.config import Config
+
+    config = Config(os.path.join(BACKEND_DIR, "alembic.ini"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def upgrade(bind: Engine = engine, revision: str = "head") -> None:
+    """Apply pending migrations; databases made by create_all() start from the baseline"""
+    from alembic import command
+
+    with bind.begin() as connection:
+        command.upgrade(alembic_config(connection), revision)
+
+
+def ensure_schema(bind: Engine = engine, auto_migrate: bool = SCHEMA_AUTO_MIGRATE) -> str:
+    """Startup check; migrates or raises SchemaOutOfDate when behind"""
+    with bind.connect() as connection:
+        current = current_revision(connection)
+        is_empty = current is None and not inspect(connection).get_table_names()
+    if current == HEAD_REVISION:
+        return current
+
+    if not (auto_migrate or is_empty):
+        raise SchemaOutOfDate(
+            f"Database schema is at {current or 'an unversioned revision'} but this code "
+            f"needs {HEAD_REVISION}; run `python schema_version.py upgrade` first"
+        )
+    upgrade(bind)
+    print(f"✅ Database schema migrated to {HEAD_REVISION}")
+    return HEAD_REVISION
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartPOS schema migrations")
+    parser.add_argument("command", choices=["upgrade", "check"])
+    args = parser.parse_args()
+
+    import tenancy
+
+    engines = [engine]
+    if tenancy.router is not None:
+        # Plain engines: the router's own would refuse out-of-date files
+        engines += [
+            create_engine(f"sqlite:///{tenancy.router.path_for(user_id)}")
+            for user_id in tenancy.router.user_ids_on_disk()
+        ]
+
+    for bind in engines:
+        if args.command == "upgrade":
+            upgrade(bind)
+            print(f"✅ {bind.url.database or bind.url}: at {HEAD_REVISION}")
+        else:
+            with bind.connect() as connection:
+                current = current_revision(connection)
+            mark = "✅" if current == HEAD_REVISION else "⚠️"
+            print(f"{mark} {bind.url.database or bind.url}: at {current or 'no version'}, code needs {HEAD_REVISION}")
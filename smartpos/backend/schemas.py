@@ -1,6 +1,6 @@
 from pydantic import BaseModel, validator, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 
@@ -103,6 +103,7 @@ class ProductBase(BaseModel):
     image_url: Optional[str] = None
 
 class ProductCreate(ProductBase):
+    user_id: int
     category_id: Optional[int] = None
     # Initial inventory
     initial_stock: int = Field(default=0, ge=0)
@@ -167,6 +168,39 @@ class Inventory(InventoryBase):
     class Config:
         from_attributes = True
 
+class InventoryLotCreate(BaseModel):
+    quantity: int = Field(..., gt=0)
+    expiry_date: Optional[date] = None
+    batch_number: Optional[str] = None
+
+class InventoryLot(BaseModel):
+    id: int
+    inventory_id: int
+    batch_number: Optional[str]
+    quantity: int  # Still in stock
+    received_quantity: int
+    expiry_date: Optional[date]
+    received_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ExpiringLot(BaseModel):
+    lot_id: int
+    product_id: int
+    name: str
+    batch_number: Optional[str]
+    quantity: int
+    expiry_date: date
+    days_left: int  # Negative once expired
+
+class CatalogChanges(BaseModel):
+    watermark: datetime  # Send back as `since` on the next sync
+    full: bool
+    products: List[Product]
+    inventory: List[Inventory]
+    deleted_product_ids: List[int]
+
 # ===== INVENTORY ADJUSTMENT SCHEMAS =====
 class InventoryAdjustmentCreate(BaseModel):
     inventory_id: int
@@ -188,6 +222,14 @@ class InventoryAdjustment(BaseModel):
     class Config:
         from_attributes = True
 
+class StockAsOf(BaseModel):
+    product_id: int
+    inventory_id: int
+    as_of: datetime
+    stock: int
+    snapshot_at: Optional[datetime] = None  # Snapshot the answer was replayed from
+    replayed_adjustments: int
+
 # ===== CUSTOMER SCHEMAS =====
 class CustomerBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -292,6 +334,45 @@ class Sale(SaleBase):
     class Config:
         from_attributes = True
 
+class QuoteItem(BaseModel):
+    product_id: int
+    quantity: int = Field(..., gt=0)
+    unit_price: Optional[Decimal] = Field(None, gt=0, decimal_places=2)  # Catalog price if omitted
+    discount_percentage: Decimal = Field(default=Decimal("0.0"), ge=0, le=100)
+    discount_amount: Decimal = Field(default=Decimal("0.0"), ge=0, decimal_places=2)
+    tax_percentage: Decimal = Field(default=Decimal("0.0"), ge=0, le=100)  # 0% if omitted, as at checkout
+
+class SaleQuoteRequest(BaseModel):
+    user_id: int
+    items: List[QuoteItem] = Field(..., min_items=1)
+    paid_amount: Optional[Decimal] = Field(None, ge=0, decimal_places=2)
+
+class QuoteLine(BaseModel):
+    product_id: int
+    name: Optional[str] = None
+    quantity: int
+    unit_price: Decimal
+    catalog_price: Optional[Decimal] = None
+    subtotal: Decimal
+    discount_amount: Decimal
+    tax_percentage: Decimal
+    tax_amount: Decimal
+    total_price: Decimal
+    available_stock: Optional[int] = None
+    issues: List[str] = []  # not_found, insufficient_stock, price_changed
+
+class SaleQuote(BaseModel):
+    items: List[QuoteLine]
+    subtotal: Decimal
+    discount_amount: Decimal
+    tax_amount: Decimal
+    total_amount: Decimal
+    paid_amount: Optional[Decimal] = None
+    change_amount: Decimal
+    payment_status: Optional[PaymentStatus] = None
+    can_checkout: bool
+    catalog_version: int
+
 # ===== ANALYTICS/DASHBOARD SCHEMAS =====
 class DashboardStats(BaseModel):
     total_sales_today: Decimal
@@ -316,6 +397,56 @@ class APIResponse(BaseModel):
     message: str
     data: Optional[dict] = None
 
+class DailySales(BaseModel):
+    sale_date: date
+    sale_count: int
+    items_sold: int
+    subtotal: Decimal
+    discount_amount: Decimal
+    tax_amount: Decimal
+    total_amount: Decimal
+    cost_amount: Decimal = Decimal("0.00")  # At cost as of each sale
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class MarginRow(BaseModel):
+    sale_date: Optional[date] = None  # group_by=day
+    product_id: Optional[int] = None  # group_by=product
+    category_id: Optional[int] = None  # group_by=category
+    name: Optional[str] = None
+    quantity: int
+    revenue: Decimal  # Before tax
+    cost: Decimal
+    margin: Decimal
+    margin_percentage: Optional[Decimal] = None  # None without revenue
+
+class InventoryValuation(BaseModel):
+    stock_units: int
+    stock_value: Decimal  # Current stock at cost_price
+    updated_at: Optional[datetime] = None
+
+class ProductSuggestion(BaseModel):
+    product_id: int
+    name: str
+    selling_price: Decimal
+    because_of: int  # Cart product it is most often bought with
+    support: int
+    confidence: float
+    lift: float
+
+class ReorderSuggestion(BaseModel):
+    product_id: int
+    name: str
+    sku: Optional[str] = None
+    current_stock: int
+    units_per_day: float  # Exponentially weighted, see sales_velocity.py
+    days_of_cover: Optional[float] = None  # None when the product isn't selling
+    reorder_point: float
+    suggested_quantity: int
+    due: bool  # At or below the reorder point
+
 class PaginatedResponse(BaseModel):
     items: List[dict]
     total: int
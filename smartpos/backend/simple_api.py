@@ -1,15 +1,18 @@
 from datetime import timedelta, datetime
 from typing import List, Optional
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select
 from decimal import Decimal
 
-from database import create_tables, get_db, get_database_info
-import models, schemas, auth
+from database import get_db, get_database_info
+from fast_json import FastJSONResponse
+from tenancy import fixed_shop_db
+import models, schemas, auth, projections, inventory_ledger, events, catalog_version, catalog_snapshot, schema_version, login_guard, inventory_valuation, inventory_lots
 
-# Create database tables
-create_tables()
+# Every simple API request acts on shop 1
+get_shop_db = fixed_shop_db(1)
 
 app = FastAPI(
     title="SmartPOS Simple API",
@@ -26,36 +29,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def check_schema():
+    schema_version.ensure_schema()
+
 # ===== SIMPLE AUTHENTICATION =====
+def _user_count(db: Session) -> int:
+    return db.execute(select(func.count()).select_from(models.User)).scalar_one()
+
 @app.post("/api/login")
-async def simple_login(credentials: dict, db: Session = Depends(get_db)):
+async def simple_login(credentials: dict, request: Request, db: Session = Depends(get_db)):
     """Simple login endpoint"""
     email = credentials.get("email")
     password = credentials.get("password")
     
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password required")
+    login_guard.admit(request, email)
     
     # Find or create user
     user = db.query(models.User).filter(models.User.email == email).first()
     if not user:
         # Auto-create user for development
         user = models.User(
-            supabase_user_id=f"user-{len(db.query(models.User).all()) + 1}",
+            supabase_user_id=f"user-{_user_count(db) + 1}",
             username=email,
             email=email,
             owner_name=email.split('@')[0].title(),
             phone="1234567890",
             shop_name=f"{email.split('@')[0].title()}'s Shop",
-            password_hash=auth.get_password_hash(password),
+            password_hash=await login_guard.hash_password(password),
             is_active=True
         )
         db.add(user)
         db.commit()
         db.refresh(user)
-    
-    # Verify password
-    if not auth.verify_password(password, user.password_hash):
+    # Verify password (a user just created from it matches by construction)
+    elif not await login_guard.verify_password(password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create token
@@ -74,7 +84,7 @@ async def simple_login(credentials: dict, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/register")
-async def simple_register(user_data: dict, db: Session = Depends(get_db)):
+async def simple_register(user_data: dict, request: Request, db: Session = Depends(get_db)):
     """Simple registration endpoint"""
     email = user_data.get("email")
     password = user_data.get("password")
@@ -82,6 +92,7 @@ async def simple_register(user_data: dict, db: Session = Depends(get_db)):
     
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password required")
+    login_guard.admit(request, email)
     
     # Check if user exists
     existing = db.query(models.User).filter(models.User.email == email).first()
@@ -90,13 +101,13 @@ async def simple_register(user_data: dict, db: Session = Depends(get_db)):
     
     # Create user
     user = models.User(
-        supabase_user_id=f"user-{len(db.query(models.User).all()) + 1}",
+        supabase_user_id=f"user-{_user_count(db) + 1}",
         username=email,
         email=email,
         owner_name=name,
         phone="1234567890",
         shop_name=f"{name}'s Shop",
-        password_hash=auth.get_password_hash(password),
+        password_hash=await login_guard.hash_password(password),
         is_active=True
     )
     db.add(user)
@@ -115,7 +126,7 @@ async def simple_register(user_data: dict, db: Session = Depends(get_db)):
 
 # ===== PRODUCT MANAGEMENT =====
 @app.post("/api/products")
-async def create_product_simple(product_data: dict, db: Session = Depends(get_db)):
+async def create_product_simple(product_data: dict, db: Session = Depends(get_shop_db)):
     """Create product with simple data structure"""
     # Use default user ID 1 for now (in production, get from token)
     user_id = 1
@@ -165,7 +176,16 @@ async def create_product_simple(product_data: dict, db: Session = Depends(get_db
         maximum_stock=int(product_data.get("maximum_stock", 1000))
     )
     db.add(inventory)
+    db.flush()
+    inventory_ledger.record_adjustment(
+        db, user_id, inventory.id, inventory.current_stock, "purchase", reason="Opening stock"
+    )
+    inventory_valuation.adjust(
+        db, user_id, inventory.current_stock, inventory_valuation.stock_value(inventory.current_stock, product.cost_price)
+    )
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
+    events.publish_product_change(user_id, product.id, "created")
     
     return {
         "id": product.id,
@@ -183,42 +203,45 @@ async def create_product_simple(product_data: dict, db: Session = Depends(get_db
     }
 
 @app.get("/api/products")
-async def get_products_simple(db: Session = Depends(get_db)):
+async def get_products_simple(request: Request, db: Session = Depends(get_shop_db)):
     """Get all products for default user"""
     user_id = 1
     
-    products = db.query(models.Product).filter(
-        models.Product.user_id == user_id,
-        models.Product.is_active == True
-    ).all()
+    etag, not_modified = catalog_version.check_not_modified(request, db, user_id)
+    if not_modified:
+        return not_modified
+    
+    products = projections.product_rows(db, user_id)
     
     result = []
     for product in products:
-        inventory = db.query(models.Inventory).filter(
-            models.Inventory.product_id == product.id
-        ).first()
-        
         result.append({
-            "id": product.id,
-            "name": product.name,
-            "barcode": product.barcode,
-            "price": float(product.price),
-            "selling_price": float(product.selling_price),
-            "cost_price": float(product.cost_price),
-            "discount_percentage": float(product.discount_percentage),
-            "tax_percentage": float(product.tax_percentage),
-            "unit": product.unit,
-            "current_stock": inventory.current_stock if inventory else 0,
-            "minimum_stock": inventory.minimum_stock if inventory else 0,
-            "is_featured": product.is_featured,
-            "created_at": product.created_at.isoformat(),
-            "updated_at": product.updated_at.isoformat()
+            "id": product["id"],
+            "name": product["name"],
+            "barcode": product["barcode"],
+            "price": float(product["price"]),
+            "selling_price": float(product["selling_price"]),
+            "cost_price": float(product["cost_price"]),
+            "discount_percentage": float(product["discount_percentage"]),
+            "tax_percentage": float(product["tax_percentage"]),
+            "unit": product["unit"],
+            "current_stock": product["current_stock"] or 0,
+            "minimum_stock": product["minimum_stock"] or 0,
+            "is_featured": product["is_featured"],
+            "created_at": product["created_at"].isoformat(),
+            "updated_at": product["updated_at"].isoformat()
         })
     
-    return result
+    return FastJSONResponse(result, headers=catalog_version.cache_headers(etag))
+
+@app.get("/api/products/snapshot")
+async def get_catalog_snapshot_simple(request: Request):
+    """Compressed columnar catalog for slow links (see catalog_snapshot.py)"""
+    user_id = 1
+    return catalog_snapshot.response_for(request, user_id)
 
 @app.put("/api/products/{product_id}")
-async def update_product_simple(product_id: int, product_data: dict, db: Session = Depends(get_db)):
+async def update_product_simple(product_id: int, product_data: dict, db: Session = Depends(get_shop_db)):
     """Update product"""
     user_id = 1
     
@@ -240,7 +263,14 @@ async def update_product_simple(product_id: int, product_data: dict, db: Session
     if "selling_price" in product_data:
         product.selling_price = Decimal(str(product_data["selling_price"]))
     if "cost_price" in product_data:
+        previous_cost = product.cost_price
         product.cost_price = Decimal(str(product_data["cost_price"]))
+        if product.cost_price != previous_cost and product.inventory:
+            stock = product.inventory.current_stock or 0
+            inventory_valuation.adjust(
+                db, user_id, 0,
+                inventory_valuation.stock_value(stock, product.cost_price) - inventory_valuation.stock_value(stock, previous_cost)
+            )
     if "discount_percentage" in product_data:
         product.discount_percentage = Decimal(str(product_data["discount_percentage"]))
     if "tax_percentage" in product_data:
@@ -250,8 +280,15 @@ async def update_product_simple(product_id: int, product_data: dict, db: Session
     if "is_featured" in product_data:
         product.is_featured = product_data["is_featured"]
     
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
     db.refresh(product)
+    product_changes = {
+        field: value for field, value in product_data.items()
+        if field not in ("current_stock", "minimum_stock")
+    }
+    if product_changes:
+        events.publish_product_change(user_id, product.id, "updated", product_changes)
     
     # Update inventory if provided
     inventory = db.query(models.Inventory).filter(
@@ -259,11 +296,27 @@ async def update_product_simple(product_id: int, product_data: dict, db: Session
     ).first()
     
     if inventory and ("current_stock" in product_data or "minimum_stock" in product_data):
+        previous_stock = inventory.current_stock
         if "current_stock" in product_data:
-            inventory.current_stock = int(product_data["current_stock"])
+            new_stock = int(product_data["current_stock"])
+            inventory_ledger.record_adjustment(
+                db, user_id, inventory.id, new_stock - (inventory.current_stock or 0),
+                "adjustment", reason="Stock count update"
+            )
+            inventory_valuation.adjust(
+                db, user_id, new_stock - (inventory.current_stock or 0),
+                inventory_valuation.stock_value(new_stock - (inventory.current_stock or 0), product.cost_price)
+            )
+            inventory.current_stock = new_stock
+            if new_stock < (previous_stock or 0):
+                inventory_lots.trim_to_stock(db, inventory.id, new_stock)
         if "minimum_stock" in product_data:
             inventory.minimum_stock = int(product_data["minimum_stock"])
+        catalog_version.bump_catalog_version(db, user_id)
         db.commit()
+        events.publish_stock_change(
+            user_id, product.id, previous_stock, inventory.current_stock, inventory.minimum_stock
+        )
     
     return {
         "id": product.id,
@@ -281,7 +334,7 @@ async def update_product_simple(product_id: int, product_data: dict, db: Session
     }
 
 @app.delete("/api/products/{product_id}")
-async def delete_product_simple(product_id: int, db: Session = Depends(get_db)):
+async def delete_product_simple(product_id: int, db: Session = Depends(get_shop_db)):
     """Delete product (soft delete)"""
     user_id = 1
     
@@ -294,18 +347,33 @@ async def delete_product_simple(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Product not found")
     
     product.is_active = False
+    catalog_version.bump_catalog_version(db, user_id)
     db.commit()
+    events.publish_product_change(user_id, product_id, "deleted")
     
     return {"message": "Product deleted successfully"}
 
 @app.get("/api/inventory")
-async def get_inventory_simple(db: Session = Depends(get_db)):
+async def get_inventory_simple(request: Request, db: Session = Depends(get_shop_db)):
     """Get inventory with product info"""
     user_id = 1
     
-    inventory_items = db.query(models.Inventory).join(models.Product).filter(
-        models.Product.user_id == user_id,
-        models.Product.is_active == True
+    etag, not_modified = catalog_version.check_not_modified(request, db, user_id)
+    if not_modified:
+        return not_modified
+    
+    inventory_items = db.execute(
+        select(
+            models.Inventory.id,
+            models.Inventory.product_id,
+            models.Product.name,
+            models.Inventory.current_stock,
+            models.Inventory.minimum_stock,
+            models.Inventory.maximum_stock
+        ).join_from(models.Inventory, models.Product).where(
+            models.Product.user_id == user_id,
+            models.Product.is_active == True
+        )
     ).all()
     
     result = []
@@ -313,14 +381,20 @@ async def get_inventory_simple(db: Session = Depends(get_db)):
         result.append({
             "id": item.id,
             "product_id": item.product_id,
-            "product_name": item.product.name,
+            "product_name": item.name,
             "current_stock": item.current_stock,
             "minimum_stock": item.minimum_stock,
             "maximum_stock": item.maximum_stock,
             "is_low_stock": item.current_stock <= item.minimum_stock
         })
     
-    return result
+    return FastJSONResponse(result, headers=catalog_version.cache_headers(etag))
+
+@app.get("/api/events")
+async def stream_events_simple(request: Request):
+    """Server-sent events: stock, low-stock and product changes"""
+    user_id = 1
+    return events.stream_response(request, user_id)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Split the shared SmartPOS database into one SQLite file per shop.
+
+Run this once before switching a deployment to DATABASE_ROUTING=per_shop.
+Each shop's rows are copied with their ids unchanged into
+TENANT_DB_DIR/shop_<user_id>.db. Tables without a user_id column follow
+their foreign keys to one that has it (sale_items through sales, for
+example). The shared database is only read and stays the users directory.
+
+    python split_shop_databases.py [--user-id N] [--force]
+"""
+import argparse
+import os
+import sys
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, func, insert, select
+
+from database import Base, engine as shared_engine
+import models
+import schema_version
+import tenancy
+
+BATCH_SIZE = 1000
+
+
+def shop_filter(table, user_id: int):
+    """WHERE clause selecting one shop's rows of a table, or None if it has no owner"""
+    if table is models.User.__table__:
+        return table.c.id == user_id
+    if "user_id" in table.c:
+        return table.c.user_id == user_id
+    for fk in table.foreign_keys:
+        parent_filter = shop_filter(fk.column.table, user_id)
+        if parent_filter is not None:
+            return fk.parent.in_(select(fk.column).where(parent_filter))
+    return None
+
+
+def split_shop(user_id: int, directory: str, force: bool = False) -> dict:
+    """Copy one shop into its own database file; returns rows copied per table"""
+    path = os.path.join(directory, f"shop_{user_id}.db")
+    if os.path.exists(path):
+        if not force:
+            raise FileExistsError(f"{path} already exists (use --force to replace it)")
+        os.remove(path)
+
+    target = create_engine(f"sqlite:///{path}")
+    schema_version.upgrade(target)
+    copied = {}
+    try:
+        with shared_engine.connect() as source, target.begin() as dest:
+            for table in Base.metadata.sorted_tables:
+                condition = shop_filter(table, user_id)
+                if condition is None:
+                    continue
+                result = source.execution_options(yield_per=BATCH_SIZE).execute(
+                    select(table).where(condition)
+                )
+                copied[table.name] = 0
+                for rows in result.mappings().partitions():
+                    dest.execute(insert(table), [dict(row) for row in rows])
+                    copied[table.name] += len(rows)
+
+            for table_name, expected in copied.items():
+                table = Base.metadata.tables[table_name]
+                actual = dest.execute(select(func.count()).select_from(table)).scalar_one()
+                if actual != expected:
+                    raise RuntimeError(f"{table_name}: copied {expected} rows but found {actual}")
+    finally:
+        target.dispose()
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the shared database into per-shop files")
+    parser.add_argument("--user-id", type=int, help="Only split this shop")
+    parser.add_argument("--directory", default=tenancy.TENANT_DB_DIR, help="Where shop files are written")
+    parser.add_argument("--force", action="store_true", help="Replace existing shop files")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    if args.user_id is not None:
+        user_ids = [args.user_id]
+    else:
+        with shared_engine.connect() as conn:
+            user_ids = conn.execute(select(models.User.id).order_by(models.User.id)).scalars().all()
+
+    print(f"🚀 Splitting {len(user_ids)} shop(s) into {args.directory}")
+    for user_id in user_ids:
+        copied = split_shop(user_id, args.directory, force=args.force)
+        summary = ", ".join(f"{name}={count}" for name, count in copied.items() if count)
+        print(f"✅ shop {user_id}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Durable queue for work that can run after a request has committed.
+
+enqueue() adds a background_tasks row in the caller's transaction. The task
+exists only if the sale (or whatever enqueued it) commits, and it survives a
+restart because it lives in the database. A TaskWorker thread claims pending
+tasks, runs the registered handler in a fresh session and marks the task
+done in that same transaction.
+
+Handlers must be idempotent. A worker that dies mid-task leaves it
+"running", and the task is claimed again once TASK_LEASE_SECONDS pass.
+Failures are retried with exponential backoff, up to TASK_MAX_ATTEMPTS.
+
+With per-shop routing the worker doesn't poll every shop's file, which
+would keep every engine open. A commit that enqueued a task marks its shop
+due, and after each run the shop stays due only until its next pending
+task. The daily housekeeping, which opens every shop anyway (and runs
+first at startup), picks up tasks left from before a restart or queued by
+another process.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, event, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+import models
+import tenancy
+
+TASK_WORKER_ENABLED = os.getenv("TASK_WORKER_ENABLED", "true").lower() == "true"
+TASK_POLL_SECONDS = float(os.getenv("TASK_POLL_SECONDS", "2"))
+TASK_BATCH_SIZE = int(os.getenv("TASK_BATCH_SIZE", "50"))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", "8"))
+TASK_LEASE_SECONDS = float(os.getenv("TASK_LEASE_SECONDS", "300"))
+TASK_RETENTION_DAYS = int(os.getenv("TASK_RETENTION_DAYS", "7"))  # Done tasks are purged after this
+
+_handlers: Dict[str, Callable] = {}
+_daily_jobs: List[Callable] = []
+_wake = threading.Event()
+_due: Dict[int, datetime] = {}  # Shop -> when its next task is due (per-shop routing only)
+_due_lock = threading.Lock()
+
+
+def handler(kind: str):
+    """Register `func(db, user_id, payload)` as the handler for a task kind"""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+
+def daily(func):
+    """Register `func(db)` to run once a day against every database (housekeeping)"""
+    _daily_jobs.append(func)
+    return func
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(db: Session, kind: str, payload: Optional[dict] = None, user_id: Optional[int] = None) -> models.BackgroundTask:
+    """Queue a task in the caller's transaction; it runs after that commits"""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for task kind '{kind}'")
+    task = models.BackgroundTask(
+        user_id=user_id,
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        status="pending",
+        attempts=0,
+        run_after=utcnow()
+    )
+    db.add(task)
+    _schedule(db, user_id, task.run_after)
+    return task
+
+
+def enqueue_coalesced(db: Session, kind: str, user_id: int, delay_seconds: float = 0) -> None:
+    """Queue a payload-less task unless one of this kind is already pending for the shop
+
+    For rebuild-style work: every trigger within `delay_seconds` of the first
+    shares one run. A single INSERT ... SELECT WHERE NOT EXISTS, in the
+    caller's transaction.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for task kind '{kind}'")
+    Task = models.BackgroundTask
+    already_pending = exists().where(Task.kind == kind, Task.user_id == user_id, Task.status == "pending")
+    run_after = utcnow() + timedelta(seconds=delay_seconds)
+    row = select(
+        literal(user_id), literal(kind), literal("{}"), literal("pending"), literal(0), literal(run_after)
+    ).where(~already_pending)
+    db.execute(insert(Task).from_select(
+        ["user_id", "kind", "payload", "status", "attempts", "run_after"], row
+    ))
+    _schedule(db, user_id, run_after)
+
+
+def notify():
+    """Wake the worker now instead of at its next poll (call after commit)"""
+    _wake.set()
+
+
+def _schedule(db: Session, user_id: Optional[int], when: datetime):
+    """Mark the shop due once the caller's transaction commits"""
+    if tenancy.router is None or user_id is None:
+        return
+    due = db.info.setdefault("task_queue_due", {})
+    due[user_id] = min(when, due.get(user_id, when))
+
+
+def _mark_due(user_id: int, when: datetime):
+    with _due_lock:
+        if user_id not in _due or when < _due[user_id]:
+            _due[user_id] = when
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    for user_id, when in session.info.pop("task_queue_due", {}).items():
+        _mark_due(user_id, when)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    session.info.pop("task_queue_due", None)
+
+
+def _take_due_shops() -> List[int]:
+    now = utcnow()
+    with _due_lock:
+        user_ids = sorted(user_id for user_id, when in _due.items() if when <= now)
+        for user_id in user_ids:
+            del _due[user_id]
+    return user_ids
+
+
+def _next_due(db: Session) -> Optional[datetime]:
+    """When the database's next task can be claimed, if it has any"""
+    Task = models.BackgroundTask
+    pending, running = db.execute(select(
+        select(func.min(Task.run_after)).where(Task.status == "pending").scalar_subquery(),
+        select(func.min(Task.locked_at)).where(Task.status == "running").scalar_subquery()
+    )).one()
+    if running is not None:
+        running += timedelta(seconds=TASK_LEASE_SECONDS)
+    return min((when for when in (pending, running) if when is not None), default=None)
+
+
+def _keep_due(db: Session, user_id: int):
+    when = _next_due(db)
+    if when is not None:
+        _mark_due(user_id, when)
+
+
+def _claim(db: Session, limit: int):
+    now = utcnow()
+    Task = models.BackgroundTask
+    claimable = or_(
+        (Task.status == "pending") & (Task.run_after <= now),
+        (Task.status == "running") & (Task.locked_at < now - timedelta(seconds=TASK_LEASE_SECONDS))
+    )
+    ids = select(Task.id).where(claimable).order_by(Task.id).limit(limit)
+    # Re-checking `claimable` makes a row claimed by a concurrent worker drop out
+    claimed = db.execute(
+        update(Task)
+        .where(Task.id.in_(ids), claimable)
+        .values(status="running", locked_at=now, attempts=Task.attempts + 1)
+        .returning(Task.id, Task.kind, Task.user_id, Task.payload, Task.attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(claimed, key=lambda row: row.id)
+
+
+def _finish(db: Session, task_id: int, **values):
+    db.execute(
+        update(models.BackgroundTask)
+        .where(models.BackgroundTask.id == task_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def run_task(session_factory: Callable[[], Session], task) -> bool:
+    """Run one claimed task; returns whether it succeeded"""
+    with session_factory() as db:
+        try:
+            _handlers[task.kind](db, task.user_id, json.loads(task.payload))
+            _finish(db, task.id, status="done", completed_at=utcnow(), last_error=None)
+            db.commit()
+            return True
+        except Exception as exc:
+            db.rollback()
+            if task.attempts >= TASK_MAX_ATTEMPTS or task.kind not in _handlers:
+                values = {"status": "failed"}
+            else:
+                values = {"status": "pending", "run_after": utcnow() + timedelta(seconds=min(2 ** task.attempts, 300))}
+            _finish(db, task.id, locked_at=None, last_error=f"{type(exc).__name__}: {exc}"[:1000], **values)
+            db.commit()
+            print(f"⚠️ Background task {task.id} ({task.kind}) failed: {exc}")
+            return False
+
+
+def run_pending(session_factory: Callable[[], Session], limit: int = TASK_BATCH_SIZE) -> int:
+    """Claim and run up to `limit` due tasks from one database"""
+    with session_factory() as db:
+        claimed = _claim(db, limit)
+    for task in claimed:
+        run_task(session_factory, task)
+    return len(claimed)
+
+
+@daily
+def purge_completed(db: Session, older_than_days: int = TASK_RETENTION_DAYS) -> int:
+    result = db.execute(
+        delete(models.BackgroundTask).where(
+            models.BackgroundTask.status == "done",
+            models.BackgroundTask.completed_at < utcnow() - timedelta(days=older_than_days)
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _shop_session_factory(user_id: Optional[int]) -> Callable[[], Session]:
+    return lambda: tenancy.open_session(user_id)
+
+
+def drain(limit: int = TASK_BATCH_SIZE) -> int:
+    """Run due tasks once (from the shops marked due under per-shop routing); returns how many were claimed"""
+    if tenancy.router is None:
+        return run_pending(_shop_session_factory(None), limit)
+
+    claimed = 0
+    for user_id in _take_due_shops():
+        factory = _shop_session_factory(user_id)
+        try:
+            claimed += run_pending(factory, limit)
+        finally:
+            with factory() as db:
+                _keep_due(db, user_id)
+    return claimed
+
+
+class TaskWorker(threading.Thread):
+    """Daemon thread draining the queue until stop() is called"""
+
+    def __init__(self, poll_seconds: float = TASK_POLL_SECONDS):
+        super().__init__(name="smartpos-task-worker", daemon=True)
+        self.poll_seconds = poll_seconds
+        self._stopping = threading.Event()
+        self._last_daily = None
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                self._run_daily_jobs()
+                claimed = drain()
+            except Exception as exc:
+                print(f"⚠️ Task worker error: {exc}")
+                claimed = 0
+            if not claimed:
+                _wake.wait(self.poll_seconds)
+                _wake.clear()
+
+    def _run_daily_jobs(self):
+        today = utcnow().date()
+        if self._last_daily != today:
+            user_ids = tenancy.router.user_ids_on_disk() if tenancy.router is not None else [None]
+            for user_id in user_ids:
+                with tenancy.open_session(user_id) as db:
+                    for job in _daily_jobs:
+                        job(db)
+                    if user_id is not None:
+                        _keep_due(db, user_id)
+            self._last_daily = today
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        _wake.set()
+        self.join(timeout)
+
+
+_worker: Optional[TaskWorker] = None
+
+
+def start_worker():
+    global _worker
+    if TASK_WORKER_ENABLED and _worker is None:
+        _worker = TaskWorker()
+        _worker.start()
+
+
+def stop_worker():
+    global _worker
+    if _worker is not None:
+        _worker.stop()
+        _worker = None
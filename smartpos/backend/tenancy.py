@@ -0,0 +1,225 @@
+"""
+Per-shop database routing.
+
+With DATABASE_ROUTING=per_shop (SQLite only), each shop's catalog, stock,
+customers and sales live in their own SQLite file under TENANT_DB_DIR, so
+writes in different shops never wait on the same database lock. The shared
+database from database.py remains the directory of users and serves the
+auth endpoints.
+
+Engines are opened lazily. Opening a file brings its schema up to date
+(schema_version.ensure_schema); the first open also copies its users row in from the shared database. A bounded LRU keeps
+recently used engines open and disposes engines idle for longer than
+TENANT_ENGINE_IDLE_SECONDS. Opening happens under a lock of its own per
+shop, so a shop being migrated doesn't hold up requests for the others.
+A user id that isn't in the users directory gets no file; requests for it
+are answered with 404.
+
+Without routing every helper here falls back to the shared SessionLocal, so
+handlers can depend on get_shop_db unconditionally.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import Session
+
+from database import DATABASE_TYPE, SessionLocal, engine_options
+import models
+import schema_version
+
+DATABASE_ROUTING = os.getenv("DATABASE_ROUTING", "shared")  # shared, per_shop
+TENANT_DB_DIR = os.getenv("TENANT_DB_DIR", "./shops")
+TENANT_ENGINE_CACHE_SIZE = int(os.getenv("TENANT_ENGINE_CACHE_SIZE", "64"))
+TENANT_ENGINE_IDLE_SECONDS = float(os.getenv("TENANT_ENGINE_IDLE_SECONDS", "300"))
+
+_SHOP_FILE = re.compile(r"shop_(\d+)\.db")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # Readers don't block the shop's writer
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+class UnknownShop(LookupError):
+    """No user with this id in the shared users directory"""
+
+
+class TenantRouter:
+    """Maps shops to their SQLite files and keeps an LRU of open engines"""
+
+    def __init__(
+        self,
+        directory: str = TENANT_DB_DIR,
+        capacity: int = TENANT_ENGINE_CACHE_SIZE,
+        idle_seconds: float = TENANT_ENGINE_IDLE_SECONDS,
+        directory_session_factory=SessionLocal
+    ):
+        self.directory = directory
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self.directory_session_factory = directory_session_factory
+        self._engines = OrderedDict()  # user_id -> [engine, last used (monotonic)]
+        self._opening = {}  # user_id -> lock held while that shop's engine is opened
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, user_id: int) -> str:
+        return os.path.join(self.directory, f"shop_{int(user_id)}.db")
+
+    def user_ids_on_disk(self):
+        """Shops that already have a database file"""
+        user_ids = []
+        for name in os.listdir(self.directory):
+            match = _SHOP_FILE.fullmatch(name)
+            if match:
+                user_ids.append(int(match.group(1)))
+        return sorted(user_ids)
+
+    def open_user_ids(self):
+        with self._lock:
+            return list(self._engines)
+
+    def open_engines(self):
+        with self._lock:
+            return [(user_id, engine) for user_id, (engine, _) in self._engines.items()]
+
+    def engine_for(self, user_id: int):
+        engine = self._cached(user_id)
+        if engine is not None:
+            return engine
+
+        with self._lock:
+            opening = self._opening.setdefault(user_id, threading.Lock())
+        with opening:
+            engine = self._cached(user_id)  # Opened by whoever held the lock before us
+            if engine is None:
+                engine = self._open(user_id)
+                self._add(user_id, engine)
+            return engine
+
+    def _cached(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._engines.get(user_id)
+            if entry is None:
+                return None
+            entry[1] = now
+            self._engines.move_to_end(user_id)
+            return entry[0]
+
+    def _add(self, user_id: int, engine):
+        with self._lock:
+            self._engines[user_id] = [engine, time.monotonic()]
+            while len(self._engines) > self.capacity:
+                _, (oldest, _) = self._engines.popitem(last=False)
+                oldest.dispose()
+
+    def session_for(self, user_id: int) -> Session:
+        return Session(bind=self.engine_for(user_id), autocommit=False, autoflush=False)
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(time.monotonic())
+
+    def dispose_all(self):
+        with self._lock:
+            while self._engines:
+                _, (engine, _) = self._engines.popitem()
+                engine.dispose()
+
+    def _evict_idle(self, now: float):
+        """Caller holds the lock"""
+        for user_id in [uid for uid, (_, used) in self._engines.items() if now - used > self.idle_seconds]:
+            engine, _ = self._engines.pop(user_id)
+            # Checked-out connections stay usable; they close when returned
+            engine.dispose()
+
+    def _open(self, user_id: int):
+        path = self.path_for(user_id)
+        owner = None if os.path.exists(path) else self._owner_row(user_id)
+        url = f"sqlite:///{path}"
+        engine = create_engine(url, **engine_options(url))
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+        schema_version.ensure_schema(engine)
+        if owner is not None:
+            # The tenant file carries its owner's users row so foreign keys resolve
+            with engine.begin() as conn:
+                conn.execute(insert(models.User.__table__), [owner])
+        return engine
+
+    def _owner_row(self, user_id: int) -> dict:
+        users = models.User.__table__
+        with self.directory_session_factory() as directory:
+            row = directory.execute(select(users).where(users.c.id == user_id)).mappings().first()
+        if row is None:
+            raise UnknownShop(user_id)
+        return dict(row)
+
+
+router: Optional[TenantRouter] = None
+if DATABASE_ROUTING == "per_shop":
+    if DATABASE_TYPE != "sqlite":
+        raise RuntimeError("DATABASE_ROUTING=per_shop requires DATABASE_TYPE=sqlite")
+    router = TenantRouter()
+
+
+def open_session(user_id: Optional[int]) -> Session:
+    """Session on the shop's database (the shared one without routing)"""
+    if router is None or user_id is None:
+        return SessionLocal()
+    return router.session_for(user_id)
+
+
+def open_request_session(user_id: Optional[int]) -> Session:
+    """open_session for a request: an unknown shop is a 404"""
+    try:
+        return open_session(user_id)
+    except UnknownShop:
+        raise HTTPException(status_code=404, detail="User not found")
+
+
+async def request_user_id(request: Request) -> Optional[int]:
+    """The shop a request is about: `user_id` in the path, query or JSON body"""
+    value = request.path_params.get("user_id") or request.query_params.get("user_id")
+    if value is None and request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = json.loads(await request.body() or b"null")
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            value = body.get("user_id")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None  # Let the handler's own validation report it
+
+
+async def get_shop_db(request: Request):
+    """Database dependency for shop data endpoints"""
+    user_id = await request_user_id(request) if router is not None else None
+    db = open_request_session(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def fixed_shop_db(user_id: int):
+    """Dependency for endpoints that always act on one shop (the simple API)"""
+    def dependency():
+        db = open_request_session(user_id)
+        try:
+            yield db
+        finally:
+            db.close()
+    return dependency
@@ -0,0 +1,65 @@
+"""
+Tests for online SQLite backups.
+"""
+import os
+import sqlite3
+import threading
+
+import pytest
+
+import backup
+from conftest import seed_shop
+
+
+@pytest.fixture
+def source_path(db):
+    seed_shop(db)
+    return backup.database_path(db)
+
+
+def _count(path, table):
+    with sqlite3.connect(path) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_backup_copies_and_verifies(source_path, tmp_path):
+    result = backup.backup_database(source_path, directory=str(tmp_path), pages_per_step=2, pause=0)
+
+    assert result["integrity"] == "ok"
+    assert result["steps"] > 1
+    assert result["pages"] > 0
+    assert os.listdir(tmp_path) == [os.path.basename(result["path"])]  # No .partial left behind
+    assert _count(result["path"], "sales") == _count(source_path, "sales")
+
+
+def test_old_backups_are_rotated(source_path, tmp_path):
+    paths = [backup.backup_database(source_path, directory=str(tmp_path), keep=2, pause=0)["path"] for _ in range(3)]
+
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(path) for path in paths[1:]]
+
+
+def test_backup_finishes_while_writes_continue(source_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_MAX_STALLS", 5)
+    stop = threading.Event()
+
+    def writer():
+        with sqlite3.connect(source_path, timeout=30) as conn:
+            while not stop.is_set():
+                conn.execute("UPDATE inventory SET current_stock = current_stock + 1")
+                conn.commit()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        result = backup.backup_database(source_path, directory=str(tmp_path), pages_per_step=1, pause=0.001)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert result["integrity"] == "ok"
+    assert _count(result["path"], "inventory") == _count(source_path, "inventory")
+
+
+def test_missing_database_is_an_error(tmp_path):
+    with pytest.raises(backup.BackupError):
+        backup.backup_database(str(tmp_path / "nope.db"), directory=str(tmp_path))
@@ -0,0 +1,109 @@
+"""
+Tests for frequently-bought-together associations.
+"""
+import os
+import subprocess
+import sys
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+import basket_analysis
+import models
+import task_queue
+from conftest import seed_shop, sell
+
+
+def _basket(client, shop, *products, days_ago=1):
+    """One sale holding one of each of the given product indexes"""
+    sell(client, shop, *[(product, 1) for product in products], sold_at=task_queue.utcnow() - timedelta(days=days_ago))
+
+
+@pytest.fixture
+def shop(client, db):
+    shop = seed_shop(db, products=4, sales=0, stock=100)
+    for _ in range(4):
+        _basket(client, shop, 0, 1)
+    _basket(client, shop, 0, 2)
+    _basket(client, shop, 1)
+    _basket(client, shop, 3)
+    _basket(client, shop, 0, 3, days_ago=400)  # Outside the window
+    return shop
+
+
+def test_lift_and_confidence_from_the_cooccurrence_matrix():
+    sales = np.array([1, 1, 2, 2, 3, 3, 3, 4, 4])
+    products = np.array([10, 20, 10, 20, 10, 20, 30, 30, 30])  # Sale 4 has product 30 twice
+
+    found = basket_analysis.associations(sales, products, top_k=1, min_support=1)
+
+    assert found["product_id"].tolist() == [10, 20, 30]
+    assert found["associated_product_id"].tolist() == [20, 10, 10]
+    assert found["support"].tolist() == [3, 3, 1]
+    assert found["confidence"].tolist() == [1.0, 1.0, 0.5]
+    assert found["lift"][0] == pytest.approx(4 / 3)
+
+
+def test_rebuild_replaces_the_stored_associations(db, shop):
+    ids = shop["product_ids"]
+    basket_analysis.rebuild(db, shop["user_id"], min_support=1)
+    db.commit()
+    assert basket_analysis.rebuild(db, shop["user_id"], min_support=1) == 4
+    db.commit()
+
+    rows = db.execute(
+        select(
+            models.ProductAssociation.product_id,
+            models.ProductAssociation.associated_product_id,
+            models.ProductAssociation.rank,
+            models.ProductAssociation.support
+        ).order_by(models.ProductAssociation.product_id, models.ProductAssociation.rank)
+    ).all()
+    # 0+3 was only bought together 400 days ago
+    assert [tuple(row) for row in rows] == [
+        (ids[0], ids[2], 1, 1),  # Rarer, so the higher lift
+        (ids[0], ids[1], 2, 4),
+        (ids[1], ids[0], 1, 4),
+        (ids[2], ids[0], 1, 1)
+    ]
+
+
+def test_min_support_drops_chance_pairs(db, shop):
+    assert basket_analysis.rebuild(db, shop["user_id"], min_support=2) == 2
+
+
+def test_cart_suggestions_in_one_query(client, db, shop, count_queries):
+    ids = shop["product_ids"]
+    basket_analysis.rebuild(db, shop["user_id"], min_support=1)
+    db.commit()
+
+    with count_queries() as counter:
+        response = client.get("/products/suggestions", params={"user_id": shop["user_id"], "product_ids": [ids[0], ids[3]]})
+
+    assert counter.count == 1, counter.report()
+    suggestions = response.json()
+    assert [s["product_id"] for s in suggestions] == [ids[2], ids[1]]  # Never the cart's own products
+    assert suggestions[1]["because_of"] == ids[0]
+    assert suggestions[1]["support"] == 4
+
+
+def test_inactive_products_are_not_suggested(client, db, shop):
+    ids = shop["product_ids"]
+    basket_analysis.rebuild(db, shop["user_id"], min_support=1)
+    db.get(models.Product, ids[2]).is_active = False
+    db.commit()
+
+    response = client.get("/products/suggestions", params={"user_id": shop["user_id"], "product_ids": [ids[0]], "limit": 5})
+
+    assert [s["product_id"] for s in response.json()] == [ids[1]]
+
+
+def test_importing_leaves_numpy_and_scipy_unloaded():
+    """The API imports this module; the batch libraries load only when a rebuild runs"""
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, basket_analysis; print(sorted({'numpy', 'scipy'} & set(sys.modules)))"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert loaded == ["[]"]
@@ -0,0 +1,79 @@
+"""
+Tests for the compressed catalog snapshot.
+"""
+import gzip
+import shutil
+
+import pytest
+from sqlalchemy import func, select
+
+import catalog_snapshot
+import models
+import task_queue
+from conftest import seed_shop
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir():
+    """Shop ids repeat between tests, so start every test without snapshots"""
+    shutil.rmtree(catalog_snapshot.SNAPSHOT_DIR, ignore_errors=True)
+    catalog_snapshot._cache.clear()
+    yield catalog_snapshot.SNAPSHOT_DIR
+
+
+def _snapshot(client, shop, **headers):
+    return client.get("/products/snapshot", params={"user_id": shop["user_id"]}, headers=headers)
+
+
+def test_snapshot_is_columnar_and_precompressed(client, db):
+    shop = seed_shop(db, products=3, sales=0)
+
+    response = _snapshot(client, shop)
+    raw = catalog_snapshot.load(shop["user_id"])[1]
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) == len(raw)
+    columns = response.json()["columns"]
+    assert columns["id"] == shop["product_ids"]
+    assert columns["selling_price"] == [1200, 1300, 1400]  # Hundredths
+    assert columns["current_stock"] == [2, 1000, 2]
+    assert "description" not in columns
+
+
+def test_catalog_changes_rebuild_the_snapshot_in_the_background(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    etag = _snapshot(client, shop).headers["etag"]
+    assert _snapshot(client, shop, **{"If-None-Match": etag}).status_code == 304
+
+    client.put(f"/products/{shop['product_ids'][0]}", params={"user_id": shop["user_id"]}, json={"selling_price": "20.00"})
+    client.put(f"/inventory/{shop['product_ids'][0]}", params={"user_id": shop["user_id"]}, json={"current_stock": 7})
+    pending = db.execute(
+        select(func.count()).select_from(models.BackgroundTask).where(models.BackgroundTask.kind == catalog_snapshot.SNAPSHOT_TASK)
+    ).scalar_one()
+    assert pending == 1  # Both edits share one rebuild
+    task_queue.drain()
+
+    response = _snapshot(client, shop, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["columns"]["selling_price"][0] == 2000
+    assert response.json()["columns"]["current_stock"][0] == 7
+
+
+def test_serving_a_built_snapshot_needs_no_queries(client, db, count_queries):
+    shop = seed_shop(db, products=2, sales=0)
+    _snapshot(client, shop)
+
+    with count_queries() as counter:
+        assert _snapshot(client, shop).status_code == 200
+
+    assert counter.count == 0, counter.report()
+
+
+def test_clients_without_gzip_get_plain_json(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+
+    response = _snapshot(client, shop, **{"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert response.json()["count"] == 2
+    assert gzip.decompress(catalog_snapshot.load(shop["user_id"])[1]) == response.content
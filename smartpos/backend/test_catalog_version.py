@@ -0,0 +1,77 @@
+"""
+Tests for catalog versions and conditional GETs on the catalog lists.
+"""
+import pytest
+
+from conftest import seed_shop
+
+
+@pytest.fixture
+def shop(db):
+    return seed_shop(db)
+
+
+def _get(client, path, shop, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(path, params={"user_id": shop["user_id"]}, headers=headers)
+
+
+@pytest.mark.parametrize("path", ["/products", "/inventory", "/inventory/low-stock", "/categories"])
+def test_matching_etag_gets_304_without_reading_products(client, shop, count_queries, path):
+    etag = _get(client, path, shop).headers["etag"]
+
+    with count_queries() as counter:
+        response = _get(client, path, shop, etag)
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert response.content == b""
+    assert not any("products" in sql for sql in counter.statements)
+
+
+def test_simple_api_lists_are_conditional(simple_client, shop):
+    for path in ("/api/products", "/api/inventory"):
+        etag = simple_client.get(path).headers["etag"]
+        assert simple_client.get(path, headers={"If-None-Match": f"W/{etag}, \"other\""}).status_code == 304
+
+
+@pytest.mark.parametrize("method,path,body", [
+    ("PUT", "/products/{product_id}", {"selling_price": "20.00"}),
+    ("DELETE", "/products/{product_id}", None),
+    ("PUT", "/inventory/{product_id}", {"current_stock": 77}),
+    ("PUT", "/categories/{category_id}", {"name": "Renamed"}),
+])
+def test_mutations_change_the_etag(client, shop, method, path, body):
+    etag = _get(client, "/products", shop).headers["etag"]
+
+    url = path.format(product_id=shop["product_ids"][1], category_id=shop["category_id"])
+    client.request(method, url, params={"user_id": shop["user_id"]}, json=body)
+    response = _get(client, "/products", shop, etag)
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_sales_change_the_inventory_etag(client, shop):
+    etag = _get(client, "/inventory", shop).headers["etag"]
+
+    client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "20.00",
+        "items": [{"product_id": shop["product_ids"][1], "quantity": 1, "unit_price": "13.00"}]
+    })
+
+    assert _get(client, "/inventory", shop, etag).status_code == 200
+
+
+def test_shops_have_independent_versions(client, shop, db):
+    import models
+    other = models.User(email="other@shop.com", owner_name="Other", shop_name="Other Shop")
+    db.add(other)
+    db.commit()
+    other_etag = client.get("/products", params={"user_id": other.id}).headers["etag"]
+
+    client.put(f"/products/{shop['product_ids'][0]}", params={"user_id": shop["user_id"]},
+               json={"name": "Changed"})
+
+    response = client.get("/products", params={"user_id": other.id}, headers={"If-None-Match": other_etag})
+    assert response.status_code == 304
@@ -0,0 +1,88 @@
+"""
+Tests for customer purchase aggregates and purchase history.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select, update
+
+import customer_stats
+import models
+import sales_archive
+from conftest import seed_shop
+
+
+def _sell(client, shop, paid, method="cash", customer_id=None):
+    return client.post("/sales", json={
+        "user_id": shop["user_id"],
+        "customer_id": customer_id or shop["customer_id"],
+        "payment_method": method,
+        "paid_amount": paid,
+        "items": [{"product_id": shop["product_ids"][1], "quantity": 2, "unit_price": "25.00"}]
+    })
+
+
+def _customer(client, shop):
+    return client.get(f"/customers/{shop['customer_id']}", params={"user_id": shop["user_id"]}).json()
+
+
+def test_sales_update_customer_aggregates(client, db):
+    shop = seed_shop(db, sales=0)
+
+    assert _sell(client, shop, paid="50.00").status_code == 200
+    assert _sell(client, shop, paid="10.00", method="credit").status_code == 200
+    customer = _customer(client, shop)
+
+    assert Decimal(customer["total_purchases"]) == Decimal("100.00")
+    assert Decimal(customer["current_balance"]) == Decimal("40.00")  # Unpaid part of the credit sale
+    assert customer["last_purchase_at"] is not None
+
+
+def test_unknown_customer_rolls_the_sale_back(client, db):
+    shop = seed_shop(db, sales=0)
+
+    response = _sell(client, shop, paid="50.00", customer_id=999)
+
+    assert response.status_code == 404
+    assert db.execute(select(models.Sale)).first() is None
+
+
+def test_purchase_history_pages_newest_first(client, db):
+    shop = seed_shop(db, sales=0)
+    sale_ids = [_sell(client, shop, paid="50.00").json()["id"] for _ in range(3)]
+
+    page = client.get(
+        f"/customers/{shop['customer_id']}/purchases",
+        params={"user_id": shop["user_id"], "per_page": 2}
+    ).json()
+
+    assert (page["total"], page["pages"]) == (3, 2)
+    assert [sale["id"] for sale in page["items"]] == sale_ids[::-1][:2]
+
+    other_shop = client.get(f"/customers/{shop['customer_id']}/purchases", params={"user_id": 2})
+    assert other_shop.status_code == 404
+
+
+def test_purchase_history_covers_only_live_sales(client, db, tmp_path):
+    shop = seed_shop(db, sales=0)
+    old_id, new_id = [_sell(client, shop, paid="50.00").json()["id"] for _ in range(2)]
+    db.execute(update(models.Sale).where(models.Sale.id == old_id).values(sale_date=datetime.now() - timedelta(days=400)))
+    db.commit()
+
+    assert sales_archive.archive_sales(db, older_than_days=365, directory=str(tmp_path)) == 1
+
+    page = client.get(f"/customers/{shop['customer_id']}/purchases", params={"user_id": shop["user_id"]}).json()
+    assert (page["total"], [sale["id"] for sale in page["items"]]) == (1, [new_id])
+    assert Decimal(_customer(client, shop)["total_purchases"]) == Decimal("100.00")  # Still counts the archived sale
+
+
+def test_backfill_rebuilds_totals_from_sales(db):
+    shop = seed_shop(db, sales=3)  # Seeded directly, so aggregates were never recorded
+
+    customer_stats.backfill(db)
+    db.commit()
+
+    customer = db.get(models.Customer, shop["customer_id"])
+    expected = sum(db.execute(select(models.Sale.total_amount)).scalars())
+    assert customer.total_purchases == expected
+    assert customer.last_purchase_at is not None
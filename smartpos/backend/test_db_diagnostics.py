@@ -0,0 +1,55 @@
+"""
+Tests for the database diagnostics report.
+"""
+import json
+
+from sqlalchemy import select
+
+import db_diagnostics
+import models
+from conftest import seed_shop
+from database import engine
+
+
+def _by_name(rows):
+    return {row["name"]: row for row in rows}
+
+
+def test_report_counts_rows_and_sizes_indexes(db):
+    seed_shop(db, products=3, sales=2)
+
+    report = db_diagnostics.diagnose(engine)
+
+    tables = _by_name(report["tables"])
+    assert (tables["products"]["rows"], tables["sales"]["rows"]) == (3, 2)
+    assert tables["products"]["bytes"] > 0
+    barcode = _by_name(tables["products"]["indexes"])["ix_products_barcode"]
+    assert barcode["unique"] and barcode["bytes"] > 0
+    assert barcode["used_by"] == ["product_by_barcode"]
+    assert {"page_count", "freelist_pages", "wal_bytes"} <= set(report["storage"])
+    json.dumps(report)  # --json needs nothing special
+
+
+def test_hot_queries_use_their_indexes(db):
+    plans = _by_name(db_diagnostics.hot_query_report(db.connection(), user_id=1))
+
+    assert not any("error" in plan for plan in plans.values())
+    assert plans["sales_by_date"]["indexes"] == ["ix_sales_user_sale_date"]
+    assert plans["expiring_lots"]["indexes"] == ["ix_inventory_lots_open_expiry"]
+    assert plans["sales_by_date"]["full_scans"] == []
+
+
+def test_full_scans_are_reported(db):
+    plan = db_diagnostics.explain(db.connection(), select(models.Sale.id).where(models.Sale.notes == "x"))
+
+    assert plan["full_scans"] == ["sales"]
+
+    plan = db_diagnostics.summarize_plan(
+        ["SCAN products USING INDEX ix_a", "SCAN customers USING COVERING INDEX ix_b", "SCAN sales"], "sqlite"
+    )
+    assert plan["full_scans"] == ["sales"]
+    assert plan["indexes"] == ["ix_a", "ix_b"]
+
+
+def test_unreachable_server_leaves_slow_statements_out():
+    assert db_diagnostics.fetch_slow_statements("http://127.0.0.1:9", limit=5) is None
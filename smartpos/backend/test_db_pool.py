@@ -0,0 +1,88 @@
+"""
+Tests for connection pool configuration and statistics.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import NullPool, StaticPool
+
+import database
+import db_pool
+
+
+def test_sqlite_pool_class_follows_the_profile(monkeypatch):
+    assert database.engine_options("sqlite://")["poolclass"] is StaticPool
+    assert database.engine_options("sqlite:///shop.db")["poolclass"] is db_pool.MeteredQueuePool
+
+    monkeypatch.setattr(database, "SQLITE_POOL", "null")
+    assert database.engine_options("sqlite:///shop.db")["poolclass"] is NullPool
+
+
+def test_postgres_pool_recycles_and_pings():
+    options = database.engine_options("postgresql://user:pw@localhost/smartpos")
+
+    assert options["pool_recycle"] == database.DB_POOL_RECYCLE
+    assert options["pool_pre_ping"] is True
+    assert "connect_args" not in options
+
+
+def test_waits_and_timeouts_are_counted(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=db_pool.MeteredQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.1
+    )
+    held = engine.connect()
+
+    with pytest.raises(PoolTimeout):
+        engine.connect()
+
+    threading.Timer(0.05, held.close).start()
+    with engine.connect() as conn:  # Waits for the held connection
+        conn.execute(text("SELECT 1"))
+
+    stats = db_pool.pool_stats(engine)
+    assert stats["checkouts"] == 3
+    assert stats["timeouts"] == 1
+    assert stats["waits"] == 2
+    assert stats["wait_seconds_max"] >= 0.05
+    assert (stats["checked_out"], stats["idle"], stats["overflow"]) == (0, 1, 0)
+    engine.dispose()
+
+
+def test_opening_a_connection_is_not_a_wait():
+    def slow_connect():
+        time.sleep(0.05)
+        return sqlite3.connect(":memory:")
+
+    pool = db_pool.MeteredQueuePool(slow_connect, pool_size=1, max_overflow=1)
+    first, second = pool.connect(), pool.connect()  # Pool slot, then overflow
+    first.close()
+    second.close()
+
+    assert (pool.checkouts, pool.waits) == (2, 0)
+    pool.dispose()
+
+
+def test_health_reports_pool_statistics(client):
+    pools = client.get("/health").json()["database_pool"]
+
+    assert "primary" in pools
+    assert pools["primary"]["pool_class"] == type(database.engine.pool).__name__
+
+
+def test_metrics_are_prometheus_text(client, tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=db_pool.MeteredQueuePool)
+    engine.connect().close()
+    monkeypatch.setattr(db_pool, "all_pools", lambda: [("primary", engine)])
+
+    response = client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE smartpos_db_pool_checkouts_total counter" in response.text
+    assert 'smartpos_db_pool_checkouts_total{pool="primary"} 1' in response.text
+    assert 'smartpos_db_pool_idle{pool="primary"} 1' in response.text
+    engine.dispose()
@@ -0,0 +1,117 @@
+"""
+Tests for the change-event broker and the events handlers publish.
+"""
+import asyncio
+
+import pytest
+
+import events
+from conftest import seed_shop
+from events import EventBroker, format_sse
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def _drain(loop, subscription):
+    """Everything delivered to a subscription so far"""
+    async def collect():
+        await asyncio.sleep(0)  # Let pending deliveries run
+        received = []
+        while not subscription.queue.empty():
+            received.append(await subscription.get())
+        return received
+    return loop.run_until_complete(collect())
+
+
+@pytest.fixture
+def shop_events(loop):
+    """Subscribe to the seeded shop (user 1) on the global broker"""
+    subscription = events.broker.subscribe(1, loop=loop)
+    yield lambda: _drain(loop, subscription)
+    subscription.close()
+
+
+def test_events_fan_out_per_shop(loop):
+    broker = EventBroker()
+    first, second = broker.subscribe(1, loop=loop), broker.subscribe(1, loop=loop)
+    other_shop = broker.subscribe(2, loop=loop)
+
+    broker.publish(1, {"type": "stock", "product_id": 7})
+
+    assert [e["product_id"] for e in _drain(loop, first)] == [7]
+    assert [e["product_id"] for e in _drain(loop, second)] == [7]
+    assert _drain(loop, other_shop) == []
+
+
+def test_slow_subscriber_gets_resync_instead_of_backlog(loop):
+    broker = EventBroker(queue_size=3)
+    subscription = broker.subscribe(1, loop=loop)
+
+    for product_id in range(5):
+        broker.publish(1, {"type": "stock", "product_id": product_id})
+    received = _drain(loop, subscription)
+
+    assert [event["type"] for event in received] == ["resync", "stock"]
+    assert received[-1]["product_id"] == 4
+    assert subscription.dropped == 4
+
+
+def test_closed_subscription_stops_receiving(loop):
+    broker = EventBroker()
+    subscription = broker.subscribe(1, loop=loop)
+    subscription.close()
+
+    broker.publish(1, {"type": "stock", "product_id": 1})
+
+    assert broker.subscriber_count(1) == 0
+    assert _drain(loop, subscription) == []
+
+
+def test_format_sse():
+    assert format_sse({"id": 3, "type": "stock", "price": 1}) == (
+        'id: 3\nevent: stock\ndata: {"id":3,"type":"stock","price":1}\n\n'
+    )
+
+
+def test_sale_publishes_stock_and_low_stock_crossing(client, db, shop_events):
+    shop = seed_shop(db)
+    product_id = shop["product_ids"][1]  # 1000 in stock, minimum 5
+
+    client.put(f"/inventory/{product_id}", params={"user_id": shop["user_id"]}, json={"current_stock": 6})
+    client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "100.00",
+        "items": [{"product_id": product_id, "quantity": 2, "unit_price": "13.00"}]
+    })
+    received = shop_events()
+
+    assert [(e["type"], e["current_stock"]) for e in received] == [
+        ("stock", 6), ("stock", 4), ("low_stock", 4)
+    ]
+    assert received[-1]["is_low"] is True
+
+
+def test_product_update_publishes_changed_fields(client, db, shop_events):
+    shop = seed_shop(db)
+    product_id = shop["product_ids"][0]
+
+    client.put(f"/products/{product_id}", params={"user_id": shop["user_id"]}, json={"selling_price": "99.50"})
+    client.delete(f"/products/{product_id}", params={"user_id": shop["user_id"]})
+    received = shop_events()
+
+    assert [(e["type"], e["action"]) for e in received] == [("product", "updated"), ("product", "deleted")]
+    assert format_sse(received[0]).count('"selling_price":"99.50"') == 1
+
+
+def test_simple_api_publishes_stock_changes(simple_client, db, shop_events):
+    shop = seed_shop(db)
+    product_id = shop["product_ids"][1]
+
+    simple_client.put(f"/api/products/{product_id}", json={"current_stock": 3})
+    received = shop_events()
+
+    assert [e["type"] for e in received] == ["stock", "low_stock"]
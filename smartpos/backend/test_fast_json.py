@@ -0,0 +1,83 @@
+"""
+The orjson list endpoints must produce exactly what the pydantic
+response models would have.
+"""
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import selectinload
+
+import models, schemas
+from conftest import seed_shop
+
+
+def _expected(schema, objects):
+    """What FastAPI's response_model path would have serialised"""
+    adapter = TypeAdapter(List[schema])
+    return adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+
+
+def test_list_products_matches_schema(client, db):
+    shop = seed_shop(db, products=5, sales=0)
+    products = db.query(models.Product).order_by(models.Product.id).all()
+    for product in products:
+        product.current_stock = product.inventory.current_stock
+        product.minimum_stock = product.inventory.minimum_stock
+
+    response = client.get("/products", params={"user_id": shop["user_id"]})
+
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == _expected(schemas.Product, products)
+
+
+def test_list_inventory_matches_schema(client, db):
+    shop = seed_shop(db, products=5, sales=0)
+    inventory = db.query(models.Inventory).order_by(models.Inventory.id).all()
+
+    response = client.get("/inventory", params={"user_id": shop["user_id"]})
+
+    assert response.json() == _expected(schemas.Inventory, inventory)
+
+
+def test_list_sales_matches_schema(client, db):
+    shop = seed_shop(db, products=4, sales=6)
+    sales = db.query(models.Sale).options(selectinload(models.Sale.items)).order_by(models.Sale.id).all()
+
+    response = client.get("/sales", params={"user_id": shop["user_id"]})
+
+    # Seeded sales share a created_at second, so compare independent of order
+    body = sorted(response.json(), key=lambda sale: sale["id"])
+    assert body == _expected(schemas.Sale, sales)
+    assert all(len(sale["items"]) == 2 for sale in body)
+
+
+def test_list_sales_with_no_matches(client, db):
+    shop = seed_shop(db, products=3, sales=2)
+
+    response = client.get("/sales", params={"user_id": shop["user_id"], "payment_status": "partial"})
+
+    assert response.json() == []
+
+
+def test_sparse_product_fields_are_selected_in_sql(client, db, count_queries):
+    shop = seed_shop(db, products=3, sales=0)
+
+    with count_queries() as counter:
+        response = client.get("/products", params={"user_id": shop["user_id"], "fields": "name,selling_price,current_stock"})
+
+    assert [set(product) for product in response.json()] == [{"id", "name", "selling_price", "current_stock"}] * 3
+    products_query = next(sql for sql in counter.statements if "FROM products" in sql)
+    assert "description" not in products_query and "image_url" not in products_query
+    assert client.get("/products", params={"user_id": shop["user_id"], "fields": "name,secret"}).status_code == 400
+
+
+def test_sparse_sales_leave_items_out_unless_included(client, db):
+    shop = seed_shop(db, products=3, sales=2)
+    params = {"user_id": shop["user_id"], "fields": "invoice_number,total_amount"}
+
+    sparse = client.get("/sales", params=params).json()
+    with_items = client.get("/sales", params={**params, "include": "items"}).json()
+
+    assert [set(sale) for sale in sparse] == [{"id", "invoice_number", "total_amount"}] * 2
+    assert all(len(sale["items"]) == 2 for sale in with_items)
+    assert client.get("/sales", params={**params, "include": "customer"}).status_code == 400
@@ -0,0 +1,139 @@
+"""
+Tests for Idempotency-Key handling on POST /sales and POST /products.
+"""
+import json
+import threading
+import time
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+import idempotency
+import models
+import task_queue
+from conftest import seed_shop
+
+
+def _sale_body(shop, quantity=1):
+    return {
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "100.00",
+        "items": [{"product_id": shop["product_ids"][1], "quantity": quantity, "unit_price": "13.00"}]
+    }
+
+
+def _count(db, model):
+    db.expire_all()
+    return db.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+def _stock(db, product_id):
+    db.expire_all()
+    return db.execute(
+        select(models.Inventory.current_stock).where(models.Inventory.product_id == product_id)
+    ).scalar_one()
+
+
+def _claim_row(db, shop, key, locked_at, body):
+    """Simulate another attempt holding the key"""
+    now = task_queue.utcnow()
+    db.add(models.IdempotencyKey(
+        user_id=shop["user_id"], key=key, endpoint="POST /sales",
+        fingerprint=idempotency._fingerprint("POST /sales", json.dumps(body).encode()),
+        status="in_progress", locked_at=locked_at, expires_at=now + timedelta(hours=1)
+    ))
+    db.commit()
+
+
+def test_retried_sale_is_recorded_once(client, db):
+    shop = seed_shop(db, sales=0)
+    headers = {"Idempotency-Key": "sale-abc"}
+
+    first = client.post("/sales", json=_sale_body(shop), headers=headers)
+    retry = client.post("/sales", json=_sale_body(shop), headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert _count(db, models.Sale) == 1
+    assert _stock(db, shop["product_ids"][1]) == 999
+
+
+def test_keys_are_per_request_body(client, db):
+    shop = seed_shop(db, sales=0)
+    headers = {"Idempotency-Key": "sale-abc"}
+    client.post("/sales", json=_sale_body(shop), headers=headers)
+
+    reused = client.post("/sales", json=_sale_body(shop, quantity=2), headers=headers)
+
+    assert reused.status_code == 422
+    assert client.post("/sales", json=_sale_body(shop), headers={"Idempotency-Key": "other"}).status_code == 200
+    assert _count(db, models.Sale) == 2
+
+
+def test_failed_request_releases_the_key(client, db):
+    shop = seed_shop(db, sales=0)
+    headers = {"Idempotency-Key": "sale-abc"}
+    body = {**_sale_body(shop), "items": [{"product_id": shop["product_ids"][0], "quantity": 5, "unit_price": "12.00"}]}
+
+    assert client.post("/sales", json=body, headers=headers).status_code == 400
+    assert _count(db, models.IdempotencyKey) == 0
+
+    client.put(f"/inventory/{shop['product_ids'][0]}", params={"user_id": shop["user_id"]}, json={"current_stock": 10})
+    assert client.post("/sales", json=body, headers=headers).status_code == 200
+
+
+def test_concurrent_duplicate_waits_for_the_first(client, db):
+    shop = seed_shop(db, sales=0)
+    body = _sale_body(shop)
+    _claim_row(db, shop, "sale-abc", task_queue.utcnow(), body)
+
+    result = {}
+    waiter = threading.Thread(target=lambda: result.update(
+        response=client.post("/sales", content=json.dumps(body), headers={
+            "Idempotency-Key": "sale-abc", "Content-Type": "application/json"
+        })
+    ))
+    waiter.start()
+    time.sleep(0.2)
+    row = db.execute(select(models.IdempotencyKey)).scalar_one()
+    row.status, row.response_status, row.response_body = "completed", 200, json.dumps({"id": 42})
+    db.commit()
+    waiter.join(5)
+
+    assert result["response"].json() == {"id": 42}
+    assert _count(db, models.Sale) == 0  # The duplicate never ran
+
+
+def test_abandoned_claim_is_taken_over(client, db):
+    shop = seed_shop(db, sales=0)
+    body = _sale_body(shop)
+    stale = task_queue.utcnow() - timedelta(seconds=idempotency.IDEMPOTENCY_LOCK_SECONDS + 1)
+    _claim_row(db, shop, "sale-abc", stale, body)
+
+    response = client.post("/sales", content=json.dumps(body), headers={
+        "Idempotency-Key": "sale-abc", "Content-Type": "application/json"
+    })
+
+    assert response.status_code == 200
+    assert _count(db, models.Sale) == 1
+
+
+def test_retried_product_create_is_recorded_once(client, db):
+    shop = seed_shop(db, products=0, sales=0)
+    body = {"user_id": shop["user_id"], "name": "Tea", "price": "10.00", "selling_price": "12.00", "initial_stock": 5}
+
+    first = client.post("/products", json=body, headers={"Idempotency-Key": "p-1"})
+    retry = client.post("/products", json=body, headers={"Idempotency-Key": "p-1"})
+
+    assert retry.json()["id"] == first.json()["id"]
+    assert _count(db, models.Product) == 1
+    assert _count(db, models.InventoryAdjustment) == 1
+
+
+def test_expired_keys_are_purged(client, db):
+    shop = seed_shop(db, sales=0)
+    client.post("/sales", json=_sale_body(shop), headers={"Idempotency-Key": "sale-abc"})
+    db.execute(models.IdempotencyKey.__table__.update().values(expires_at=task_queue.utcnow() - timedelta(seconds=1)))
+    db.commit()
+
+    assert idempotency.purge_expired(db) == 1
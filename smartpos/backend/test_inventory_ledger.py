@@ -0,0 +1,120 @@
+"""
+Tests for inventory snapshots, stock-as-of queries and adjustment history.
+"""
+from datetime import datetime, timedelta
+
+import models
+import task_queue
+from conftest import seed_shop
+from inventory_ledger import stock_as_of, take_snapshots
+
+T0 = datetime(2025, 3, 1, 9, 0)
+
+
+def _ledger(db, shop, changes):
+    """Give product 0 an adjustment history; `changes` are (hours after T0, quantity)"""
+    inventory = db.query(models.Inventory).filter(
+        models.Inventory.product_id == shop["product_ids"][0]
+    ).one()
+    adjustments = [
+        models.InventoryAdjustment(
+            user_id=shop["user_id"],
+            inventory_id=inventory.id,
+            adjustment_type="adjustment",
+            quantity_change=quantity,
+            created_at=T0 + timedelta(hours=hours)
+        )
+        for hours, quantity in changes
+    ]
+    db.add_all(adjustments)
+    inventory.current_stock = sum(quantity for _, quantity in changes)
+    db.commit()
+    return inventory, adjustments
+
+
+def test_stock_as_of_without_snapshots_backs_out_from_live_stock(db):
+    shop = seed_shop(db)
+    inventory, _ = _ledger(db, shop, [(0, 10), (1, -3), (2, 5), (3, -2)])
+
+    result = stock_as_of(db, inventory, T0 + timedelta(hours=1, minutes=30))
+
+    assert result["stock"] == 7
+    assert result["snapshot_at"] is None
+    assert result["replayed_adjustments"] == 2
+
+
+def test_stock_as_of_replays_only_the_tail_after_a_snapshot(db):
+    shop = seed_shop(db)
+    inventory, adjustments = _ledger(db, shop, [(0, 10), (1, -3), (2, 5), (3, -2)])
+    snapshot_at = T0 + timedelta(hours=1, minutes=30)
+    db.add(models.InventorySnapshot(
+        inventory_id=inventory.id,
+        snapshot_at=snapshot_at,
+        closing_stock=7,
+        last_adjustment_id=adjustments[1].id
+    ))
+    db.commit()
+
+    later = stock_as_of(db, inventory, T0 + timedelta(hours=2, minutes=30))
+    assert (later["stock"], later["replayed_adjustments"], later["snapshot_at"]) == (12, 1, snapshot_at)
+
+    earlier = stock_as_of(db, inventory, T0 + timedelta(minutes=30))
+    assert (earlier["stock"], earlier["replayed_adjustments"]) == (10, 1)
+
+    before_everything = stock_as_of(db, inventory, T0 - timedelta(days=1))
+    assert before_everything["stock"] == 0
+
+
+def test_take_snapshots_captures_live_stock_and_last_adjustment(db):
+    shop = seed_shop(db, products=3)
+    inventory, adjustments = _ledger(db, shop, [(0, 10), (1, -3)])
+
+    assert take_snapshots(db, user_id=shop["user_id"]) == 3
+    db.commit()
+
+    snapshot = db.query(models.InventorySnapshot).filter(
+        models.InventorySnapshot.inventory_id == inventory.id
+    ).one()
+    assert snapshot.closing_stock == 7
+    assert snapshot.last_adjustment_id == adjustments[-1].id
+    assert snapshot.snapshot_at is not None
+
+
+def test_worker_snapshots_once_a_day(db):
+    seed_shop(db, products=2, sales=0)
+
+    task_queue.TaskWorker()._run_daily_jobs()
+    task_queue.TaskWorker()._run_daily_jobs()  # Restarted the same day
+
+    assert db.query(models.InventorySnapshot).count() == 2
+
+
+def test_stock_updates_are_recorded_and_paginated(client, db):
+    shop = seed_shop(db)
+    product_id = shop["product_ids"][1]
+    params = {"user_id": shop["user_id"]}
+
+    for stock in (40, 35, 50):
+        client.put(f"/inventory/{product_id}", params=params, json={"current_stock": stock})
+
+    page = client.get(
+        f"/inventory/{product_id}/adjustments", params={**params, "per_page": 2}
+    ).json()
+    assert (page["total"], page["pages"]) == (3, 2)
+    assert [item["quantity_change"] for item in page["items"]] == [15, -5]
+
+    now = client.get(
+        f"/inventory/{product_id}/stock-as-of",
+        params={**params, "at": (datetime.utcnow() + timedelta(minutes=1)).isoformat()}
+    ).json()
+    assert now["stock"] == 50
+
+
+def test_ledger_endpoints_are_scoped_to_the_shop(client, db):
+    shop = seed_shop(db)
+
+    response = client.get(
+        f"/inventory/{shop['product_ids'][0]}/adjustments", params={"user_id": shop["user_id"] + 1}
+    )
+
+    assert response.status_code == 404
@@ -0,0 +1,106 @@
+"""
+Tests for stock lots, FEFO depletion and expiry lookups.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import event, select
+
+import models
+from database import engine
+from conftest import seed_shop, sell
+
+TODAY = date.today()
+
+
+def _receive(client, shop, product, quantity, expiry_in_days=None, batch=None):
+    expiry = None if expiry_in_days is None else (TODAY + timedelta(days=expiry_in_days)).isoformat()
+    response = client.post(
+        f"/inventory/{shop['product_ids'][product]}/lots",
+        params={"user_id": shop["user_id"]},
+        json={"quantity": quantity, "expiry_date": expiry, "batch_number": batch}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _lot_quantities(db):
+    return dict(db.execute(select(models.InventoryLot.batch_number, models.InventoryLot.quantity)).all())
+
+
+def test_receiving_a_lot_adds_stock(client, db):
+    shop = seed_shop(db, products=1, sales=0)  # Starts with 2 in stock
+
+    lot = _receive(client, shop, 0, 10, expiry_in_days=30, batch="B1")
+
+    assert lot["quantity"] == lot["received_quantity"] == 10
+    assert db.get(models.Inventory, 1).current_stock == 12
+    lots = client.get(f"/inventory/{shop['product_ids'][0]}/lots", params={"user_id": shop["user_id"]}).json()
+    assert [l["batch_number"] for l in lots] == ["B1"]
+
+
+def test_sales_take_the_earliest_expiry_first(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    _receive(client, shop, 0, 5, expiry_in_days=60, batch="LATE")
+    _receive(client, shop, 0, 3, expiry_in_days=10, batch="SOON")
+    _receive(client, shop, 0, 4, batch="NO-EXPIRY")
+    _receive(client, shop, 1, 4, expiry_in_days=5, batch="OTHER")
+
+    sell(client, shop, (0, 4), (1, 1), (0, 2))  # Two lines of product 0: six units
+
+    assert _lot_quantities(db) == {"SOON": 0, "LATE": 2, "NO-EXPIRY": 4, "OTHER": 3}
+    lots = client.get(f"/inventory/{shop['product_ids'][0]}/lots", params={"user_id": shop["user_id"]}).json()
+    assert [l["batch_number"] for l in lots] == ["LATE", "NO-EXPIRY"]
+
+
+def test_selling_untracked_stock_past_the_lots(client, db):
+    shop = seed_shop(db, products=1, sales=0)  # 2 units from before lots
+    _receive(client, shop, 0, 3, expiry_in_days=10, batch="A")
+
+    sell(client, shop, (0, 5))
+
+    assert _lot_quantities(db) == {"A": 0}
+    assert db.get(models.Inventory, 1).current_stock == 0
+
+
+def test_stock_count_below_the_lots_trims_them(client, db):
+    shop = seed_shop(db, products=1, sales=0)
+    _receive(client, shop, 0, 3, expiry_in_days=10, batch="A")
+    _receive(client, shop, 0, 3, expiry_in_days=20, batch="B")
+
+    client.put(f"/inventory/{shop['product_ids'][0]}", params={"user_id": shop["user_id"]}, json={"current_stock": 4})
+
+    assert _lot_quantities(db) == {"A": 1, "B": 3}
+
+
+def test_simple_api_stock_count_trims_the_lots(client, simple_client, db):
+    shop = seed_shop(db, products=1, sales=0)
+    _receive(client, shop, 0, 3, expiry_in_days=10, batch="A")
+    _receive(client, shop, 0, 3, expiry_in_days=20, batch="B")
+
+    response = simple_client.put(f"/api/products/{shop['product_ids'][0]}", json={"current_stock": 2})
+
+    assert response.status_code == 200, response.text
+    assert _lot_quantities(db) == {"A": 0, "B": 2}
+
+
+def test_expiring_lots_use_the_partial_index(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    _receive(client, shop, 0, 2, expiry_in_days=-1, batch="EXPIRED")
+    _receive(client, shop, 1, 2, expiry_in_days=7, batch="WEEK")
+    _receive(client, shop, 0, 2, expiry_in_days=90, batch="LATER")
+    _receive(client, shop, 1, 1, expiry_in_days=3, batch="SOLD")
+    sell(client, shop, (1, 1))  # Empties SOLD
+
+    executed = []
+    record = lambda conn, cursor, statement, parameters, context, many: executed.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get("/inventory/expiring", params={"user_id": shop["user_id"], "within_days": 30})
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert [(l["batch_number"], l["days_left"]) for l in response.json()] == [("EXPIRED", -1), ("WEEK", 7)]
+    assert len(executed) == 1
+    statement, parameters = executed[0]
+    plan = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    assert "ix_inventory_lots_open_expiry" in str(plan)
@@ -0,0 +1,146 @@
+"""
+Tests for sale-time cost snapshots, margin reports and the live stock valuation.
+"""
+from decimal import Decimal
+
+from sqlalchemy import select
+
+import inventory_valuation
+import models
+import sales_rollup
+import task_queue
+from conftest import seed_shop, sell
+
+
+def _valuation(client, shop):
+    response = client.get("/reports/inventory-valuation", params={"user_id": shop["user_id"]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _assert_matches_inventory(client, db, shop):
+    db.expire_all()
+    units, value = inventory_valuation.compute(db, shop["user_id"])
+    valuation = _valuation(client, shop)
+    assert (valuation["stock_units"], Decimal(valuation["stock_value"])) == (units, value)
+
+
+def test_sale_items_keep_the_cost_at_the_time(client, db):
+    shop = seed_shop(db, products=2, sales=0)  # Costs 8.00 and 9.00
+    sell(client, shop, (0, 1))
+    client.put(f"/products/{shop['product_ids'][0]}", params={"user_id": shop["user_id"]}, json={"cost_price": "5.00"})
+    sell(client, shop, (0, 1))
+
+    costs = db.execute(select(models.SaleItem.unit_cost).order_by(models.SaleItem.id)).scalars().all()
+    assert costs == [Decimal("8.00"), Decimal("5.00")]
+
+
+def test_margin_report_by_day_product_and_category(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    sell(client, shop, (0, 2), (1, 1))
+    sell(client, shop, (1, 3))
+    task_queue.drain()
+
+    [day] = client.get("/reports/margin", params={"user_id": shop["user_id"]}).json()
+    items = db.execute(select(models.SaleItem)).scalars().all()
+    revenue = sum(item.total_price - (item.tax_amount or 0) for item in items)
+    assert day["quantity"] == 6
+    assert Decimal(day["revenue"]) == revenue
+    assert Decimal(day["cost"]) == Decimal("52.00")  # 2 * 8 + 4 * 9
+    assert Decimal(day["margin"]) == revenue - Decimal("52.00")
+
+    by_product = client.get("/reports/margin", params={"user_id": shop["user_id"], "group_by": "product"}).json()
+    assert [(row["name"], row["quantity"], Decimal(row["cost"])) for row in by_product] == [
+        ("Product 1", 4, Decimal("36.00")), ("Product 0", 2, Decimal("16.00"))  # Biggest margin first
+    ]
+
+    [category] = client.get("/reports/margin", params={"user_id": shop["user_id"], "group_by": "category"}).json()
+    assert (category["name"], Decimal(category["margin"])) == ("General", Decimal(day["margin"]))
+
+    [rollup] = client.get("/reports/daily-sales", params={"user_id": shop["user_id"]}).json()
+    assert Decimal(rollup["cost_amount"]) == Decimal("52.00")
+
+
+def test_backfill_rolls_up_existing_sales(client, db):
+    shop = seed_shop(db, products=2, sales=3)  # Inserted directly, so no rollup tasks
+    assert client.get("/reports/margin", params={"user_id": shop["user_id"]}).json() == []
+
+    assert sales_rollup.backfill(db, shop["user_id"]) == 1
+    db.commit()
+
+    [day] = client.get("/reports/margin", params={"user_id": shop["user_id"]}).json()
+    [rollup] = client.get("/reports/daily-sales", params={"user_id": shop["user_id"]}).json()
+    assert rollup["sale_count"] == 3
+    assert (day["quantity"], day["cost"]) == (rollup["items_sold"], rollup["cost_amount"])
+
+
+def test_margin_report_rejects_unknown_grouping(client, db):
+    shop = seed_shop(db, products=1, sales=0)
+
+    response = client.get("/reports/margin", params={"user_id": shop["user_id"], "group_by": "customer"})
+
+    assert response.status_code == 422
+
+
+def test_reports_never_read_sales(client, db, count_queries):
+    shop = seed_shop(db, products=2, sales=0)
+    sell(client, shop, (0, 1), (1, 1))
+    task_queue.drain()
+
+    with count_queries() as counter:
+        for group_by in ("day", "product", "category"):
+            client.get("/reports/margin", params={"user_id": shop["user_id"], "group_by": group_by})
+        client.get("/reports/inventory-valuation", params={"user_id": shop["user_id"]})
+
+    assert counter.count == 4, counter.report()
+    assert not any("sale_items" in sql or "FROM sales" in sql for sql in counter.statements), counter.report()
+
+
+def test_valuation_follows_every_stock_and_cost_change(client, db):
+    shop = seed_shop(db, products=2, sales=0)  # 2 at 8.00 and 1000 at 9.00
+    user = {"user_id": shop["user_id"]}
+    valuation = _valuation(client, shop)
+    assert (valuation["stock_units"], Decimal(valuation["stock_value"])) == (1002, Decimal("9016.00"))
+
+    sell(client, shop, (0, 1), (1, 10))
+    _assert_matches_inventory(client, db, shop)
+
+    client.put(f"/inventory/{shop['product_ids'][1]}", params=user, json={"current_stock": 500})
+    _assert_matches_inventory(client, db, shop)
+
+    client.put(f"/products/{shop['product_ids'][1]}", params=user, json={"cost_price": "10.50"})
+    _assert_matches_inventory(client, db, shop)
+
+    client.post(f"/inventory/{shop['product_ids'][0]}/lots", params=user, json={"quantity": 6})
+    _assert_matches_inventory(client, db, shop)
+
+    response = client.post("/products", json={
+        **user, "name": "New", "price": "3.00", "selling_price": "4.00", "cost_price": "2.50", "initial_stock": 4
+    })
+    assert response.status_code == 200, response.text
+    _assert_matches_inventory(client, db, shop)
+    assert _valuation(client, shop)["stock_units"] == (2 - 1 + 6) + 500 + 4
+
+
+def test_first_change_creates_the_valuation(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    db.delete(db.get(models.InventoryValuation, shop["user_id"]))  # As after the upgrade
+    db.commit()
+
+    sell(client, shop, (1, 10))
+
+    db.expire_all()
+    stored = db.get(models.InventoryValuation, shop["user_id"])
+    assert (stored.stock_units, stored.stock_value) == inventory_valuation.compute(db, shop["user_id"])
+    assert stored.stock_units == 2 + 990
+
+
+def test_reconcile_corrects_drift(db):
+    shop = seed_shop(db, products=2, sales=0)
+    db.get(models.Inventory, 1).current_stock = 12  # Behind the valuation's back
+    db.commit()
+
+    assert inventory_valuation.reconcile(db, shop["user_id"]) == Decimal("80.00")
+    db.commit()
+
+    assert inventory_valuation.valuation(db, shop["user_id"])["stock_units"] == 1012
@@ -0,0 +1,84 @@
+"""
+Tests for per-shop, per-financial-year invoice numbering.
+"""
+from datetime import datetime
+
+import pytest
+
+import models
+from conftest import seed_shop
+from invoice_sequence import (
+    BlockAllocator, check_format, financial_year, format_invoice_number, next_invoice_number
+)
+
+
+def _sale_payload(shop):
+    return {
+        "user_id": shop["user_id"],
+        "payment_method": "cash",
+        "paid_amount": "50.00",
+        "items": [{"product_id": shop["product_ids"][1], "quantity": 1, "unit_price": "13.00"}],
+    }
+
+
+def test_financial_year_boundaries():
+    assert financial_year(datetime(2025, 3, 31, 23, 59)) == "2024-25"
+    assert financial_year(datetime(2025, 4, 1)) == "2025-26"
+    assert financial_year(datetime(2025, 6, 1), start_month=1) == "2025"
+
+
+def test_format_is_configurable():
+    assert format_invoice_number(7, "2025-26", 3) == "INV/3/2025-26/000007"
+    assert format_invoice_number(7, "2025-26", 3, fmt="{fy}-{seq:04d}") == "2025-26-0007"
+
+
+def test_shared_database_formats_need_the_shop():
+    check_format("INV/{shop}/{fy}/{seq:05d}")
+    check_format("INV/{fy}/{seq:05d}", routing="per_shop")  # One database per shop
+    with pytest.raises(ValueError, match="{shop}"):
+        check_format("INV/{fy}/{seq:05d}", routing="shared")
+    with pytest.raises(ValueError, match="{seq}"):
+        check_format("INV/{shop}/{fy}", routing="per_shop")
+
+
+def test_sales_get_consecutive_numbers(client, db):
+    shop = seed_shop(db)
+    fy = financial_year()
+
+    numbers = [client.post("/sales", json=_sale_payload(shop)).json()["invoice_number"] for _ in range(3)]
+
+    assert numbers == [format_invoice_number(seq, fy, shop["user_id"]) for seq in (1, 2, 3)]
+
+
+def test_sequences_are_per_shop_and_per_year(db):
+    shop = seed_shop(db)
+    other = models.User(email="other@shop.com", owner_name="Other", shop_name="Other Shop")
+    db.add(other)
+    db.commit()
+
+    march = datetime(2025, 3, 15)
+    april = datetime(2025, 4, 15)
+    assert next_invoice_number(db, shop["user_id"], march).endswith("2024-25/000001")
+    assert next_invoice_number(db, shop["user_id"], march).endswith("2024-25/000002")
+    assert next_invoice_number(db, shop["user_id"], april).endswith("2025-26/000001")
+    assert next_invoice_number(db, other.id, march).endswith("2024-25/000001")
+
+
+def test_rolled_back_sale_returns_its_number(db):
+    shop = seed_shop(db)
+
+    assert next_invoice_number(db, shop["user_id"]).endswith("/000001")
+    db.rollback()
+    assert next_invoice_number(db, shop["user_id"]).endswith("/000001")
+    db.commit()
+    assert next_invoice_number(db, shop["user_id"]).endswith("/000002")
+
+
+def test_block_allocators_never_hand_out_the_same_number(db):
+    shop = seed_shop(db)
+    workers = [BlockAllocator(block_size=5), BlockAllocator(block_size=5)]
+
+    taken = [workers[i % 2].take(shop["user_id"], "2025-26") for i in range(20)]
+
+    assert len(set(taken)) == len(taken)
+    assert sorted(taken) == list(range(1, 21))
@@ -0,0 +1,79 @@
+"""
+Tests for login admission control.
+"""
+import threading
+
+import login_guard
+from conftest import SEED_PASSWORD, seed_shop
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_a_burst_then_the_steady_rate():
+    clock = FakeClock()
+    limiter = login_guard.RateLimiter(burst=2, per_minute=60, clock=clock)
+
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 1.0  # One token a second
+    assert limiter.acquire("b") == 0  # Keys are independent
+
+    clock.now += 1
+    assert limiter.acquire("a") == 0
+
+
+def test_bucket_table_is_bounded():
+    limiter = login_guard.RateLimiter(burst=1, per_minute=1, max_keys=2, clock=FakeClock())
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+
+    assert list(limiter._buckets) == ["b", "c"]
+
+
+def test_repeated_attempts_on_one_account_get_429(client, db, monkeypatch):
+    monkeypatch.setattr(login_guard, "account_limiter", login_guard.RateLimiter(burst=2, per_minute=1))
+    body = {"email": "someone@shop.com", "password": "wrong"}
+
+    statuses = [client.post("/auth/json-login", json=body).status_code for _ in range(3)]
+    other = client.post("/auth/json-login", json={**body, "email": "other@shop.com"})
+
+    assert statuses == [401, 401, 429]
+    assert other.status_code == 401
+
+
+def test_flood_from_one_address_gets_429(simple_client, monkeypatch):
+    monkeypatch.setattr(login_guard, "ip_limiter", login_guard.RateLimiter(burst=1, per_minute=1))
+
+    simple_client.post("/api/register", json={"email": "a@shop.com", "password": "pw"})
+    response = simple_client.post("/api/register", json={"email": "b@shop.com", "password": "pw"})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) > 1
+
+
+def test_busy_hash_slots_reject_at_once(client, db, monkeypatch):
+    shop = seed_shop(db, products=0, sales=0)
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(login_guard, "_hash_slots", slots)
+    body = {"email": shop["email"], "password": SEED_PASSWORD}
+
+    slots.acquire()  # Every slot busy with someone else's hash
+    busy = client.post("/auth/json-login", json=body)
+    slots.release()
+
+    assert busy.status_code == 429
+    assert client.post("/auth/json-login", json=body).status_code == 200
+
+
+def test_register_counts_users_in_sql(simple_client, count_queries):
+    with count_queries() as counter:
+        simple_client.post("/api/register", json={"email": "new@shop.com", "password": "pw"})
+
+    assert any("count(*)" in sql.lower() for sql in counter.statements), counter.report()
+    assert not any(sql.lstrip().startswith("SELECT users.id") and "WHERE" not in sql for sql in counter.statements)
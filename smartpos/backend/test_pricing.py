@@ -0,0 +1,146 @@
+"""
+Tests for shared cart pricing, the quote endpoint and the per-shop price cache.
+"""
+from decimal import Decimal
+
+import pricing
+from conftest import seed_shop
+
+AMOUNTS = ("subtotal", "discount_amount", "tax_amount", "total_amount", "change_amount")
+
+
+def _cart(shop):
+    return [
+        {"product_id": shop["product_ids"][1], "quantity": 3, "unit_price": "13.37",
+         "discount_percentage": "7.5", "tax_percentage": "18"},
+        {"product_id": shop["product_ids"][3], "quantity": 1, "unit_price": "15.00",
+         "discount_amount": "0.99", "tax_percentage": "5"},
+    ]
+
+
+def test_price_line_rounds_each_amount_half_up():
+    line = pricing.price_line(Decimal("13.37"), 3, discount_percentage=Decimal("7.5"), tax_percentage=Decimal("18"))
+
+    assert line == {
+        "subtotal": Decimal("40.11"),
+        "discount_amount": Decimal("3.01"),  # 3.00825
+        "tax_amount": Decimal("6.68"),  # 6.678
+        "total_price": Decimal("43.78"),
+    }
+
+
+def test_quote_matches_the_sale_it_becomes(client, db):
+    shop = seed_shop(db, products=4, sales=0)
+    cart = _cart(shop)
+
+    quote = client.post("/sales/quote", json={"user_id": shop["user_id"], "paid_amount": "100.00", "items": cart}).json()
+    sale = client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "100.00", "items": cart
+    }).json()
+
+    assert quote["can_checkout"] is True
+    for field in AMOUNTS:
+        assert Decimal(quote[field]) == Decimal(sale[field]), field
+    assert quote["payment_status"] == sale["payment_status"]
+    assert [Decimal(line["total_price"]) for line in quote["items"]] == [
+        Decimal(item["total_price"]) for item in sale["items"]
+    ]
+
+
+def test_cart_without_tax_quotes_and_sells_the_same(client, db):
+    shop = seed_shop(db, products=2, sales=0)  # Catalog tax 5%
+    cart = [
+        {"product_id": shop["product_ids"][1], "quantity": 2, "unit_price": "13.00"},
+        {"product_id": shop["product_ids"][0], "quantity": 1, "unit_price": "12.00"}
+    ]
+
+    quote = client.post("/sales/quote", json={"user_id": shop["user_id"], "paid_amount": "50.00", "items": cart}).json()
+    response = client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "50.00", "items": cart
+    })
+
+    assert response.status_code == 200, response.text
+    sale = response.json()
+    for field in AMOUNTS:
+        assert Decimal(quote[field]) == Decimal(sale[field]), field
+    assert Decimal(sale["tax_amount"]) == 0  # Checkout charges no tax unless the line sends it
+    assert [(Decimal(item["unit_price"]), Decimal(item["tax_percentage"])) for item in sale["items"]] == [
+        (Decimal(line["unit_price"]), Decimal(line["tax_percentage"])) for line in quote["items"]
+    ]
+
+
+def test_quote_defaults_to_catalog_price_and_no_tax(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+
+    quote = client.post("/sales/quote", json={
+        "user_id": shop["user_id"], "items": [{"product_id": shop["product_ids"][1], "quantity": 2}]
+    }).json()
+
+    [line] = quote["items"]
+    assert (line["name"], Decimal(line["unit_price"]), Decimal(line["tax_percentage"])) == (
+        "Product 1", Decimal("13.00"), Decimal("0")
+    )
+    assert Decimal(quote["total_amount"]) == Decimal("26.00")
+    assert line["issues"] == []
+    assert quote["payment_status"] is None
+
+
+def test_quote_flags_what_checkout_would_reject(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    low = shop["product_ids"][0]  # 2 in stock
+
+    quote = client.post("/sales/quote", json={"user_id": shop["user_id"], "items": [
+        {"product_id": low, "quantity": 2},
+        {"product_id": low, "quantity": 1},
+        {"product_id": shop["product_ids"][1], "quantity": 1, "unit_price": "99.00"},
+        {"product_id": 999, "quantity": 1, "unit_price": "1.00"},
+    ]}).json()
+
+    assert [line["issues"] for line in quote["items"]] == [
+        ["insufficient_stock"], ["insufficient_stock"], ["price_changed"], ["not_found"]
+    ]
+    assert quote["can_checkout"] is False
+
+
+def test_checkout_sums_repeated_lines_against_stock(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    low = shop["product_ids"][0]  # 2 in stock
+
+    response = client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "100.00",
+        "items": [{"product_id": low, "quantity": 2, "unit_price": "12.00"},
+                  {"product_id": low, "quantity": 1, "unit_price": "12.00"}]
+    })
+
+    assert response.status_code == 400
+
+
+def test_cached_quotes_skip_the_database(client, db, count_queries, monkeypatch):
+    shop = seed_shop(db, products=2, sales=0)
+    body = {"user_id": shop["user_id"], "items": [{"product_id": shop["product_ids"][1], "quantity": 1}]}
+    client.post("/sales/quote", json=body)
+
+    with count_queries() as unchanged:
+        client.post("/sales/quote", json=body)
+    assert unchanged.count == 1, unchanged.report()  # Catalog version only
+
+    monkeypatch.setattr(pricing.price_cache, "ttl", 60)
+    with count_queries() as within_ttl:
+        client.post("/sales/quote", json=body)
+    assert within_ttl.count == 0, within_ttl.report()
+
+
+def test_cache_picks_up_stock_and_deletes(client, db):
+    shop = seed_shop(db, products=2, sales=0)
+    kept, deleted = shop["product_ids"][1], shop["product_ids"][0]
+    body = {"user_id": shop["user_id"], "items": [
+        {"product_id": kept, "quantity": 1}, {"product_id": deleted, "quantity": 1}
+    ]}
+    client.post("/sales/quote", json=body)
+
+    client.put(f"/inventory/{kept}", params={"user_id": shop["user_id"]}, json={"current_stock": 7})
+    client.delete(f"/products/{deleted}", params={"user_id": shop["user_id"]})
+    quote = client.post("/sales/quote", json=body).json()
+
+    assert quote["items"][0]["available_stock"] == 7
+    assert quote["items"][1]["issues"] == ["not_found"]
@@ -0,0 +1,208 @@
+"""
+Query-count regression guard.
+
+Every endpoint of main.py and simple_api.py is exercised at two data sizes
+and must stay under a fixed statement budget. A budget that only holds for
+the small shop means a per-row query (N+1) has crept into the handler.
+"""
+import shutil
+from datetime import datetime, timedelta
+
+import pytest
+
+import catalog_snapshot
+from conftest import SEED_PASSWORD, seed_shop
+
+SIZES = [3, 30]
+
+
+def _tomorrow() -> str:
+    return (datetime.now() + timedelta(days=1)).isoformat()
+
+
+# (name, method, path, request kwargs, max statements)
+# Paths and bodies are templates filled from the seeded shop.
+MAIN_CASES = [
+    ("root", "GET", "/", {}, 0),
+    ("health", "GET", "/health", {}, 0),
+    ("form_login", "POST", "/auth/login",
+     {"data": {"username": "{email}", "password": SEED_PASSWORD}}, 1),
+    ("json_login", "POST", "/auth/json-login",
+     {"json": {"email": "{email}", "password": SEED_PASSWORD}}, 1),
+    ("create_user", "POST", "/users",
+     {"json": {"supabase_user_id": "new-user", "email": "new@shop.com",
+               "owner_name": "New Owner", "shop_name": "New Shop"}}, 4),
+    ("get_profile", "GET", "/users/me?supabase_user_id={supabase_user_id}", {}, 1),
+    ("update_profile", "PUT", "/users/me?supabase_user_id={supabase_user_id}",
+     {"json": {"shop_name": "Renamed Shop"}}, 3),
+    ("create_category", "POST", "/categories",
+     {"json": {"user_id": "{user_id}", "name": "Snacks"}}, 4),
+    ("list_categories", "GET", "/categories?user_id={user_id}", {}, 2),
+    ("update_category", "PUT", "/categories/{category_id}?user_id={user_id}",
+     {"json": {"description": "Everyday items"}}, 5),
+    ("create_product", "POST", "/products",
+     {"json": {"user_id": "{user_id}", "name": "New Product", "price": "5.00",
+               "selling_price": "6.00", "initial_stock": 10}}, 8),
+    ("list_products", "GET", "/products?user_id={user_id}", {}, 2),
+    ("sparse_products", "GET", "/products?user_id={user_id}&fields=name,barcode,selling_price,current_stock",
+     {}, 2),
+    ("search_products", "GET", "/products?user_id={user_id}&search=Product", {}, 2),
+    ("products_not_modified", "GET", "/products?user_id={user_id}",
+     {"headers": {"If-None-Match": '"catalog-{user_id}-1"'}}, 1),
+    ("catalog_changes", "GET", "/products/changes?user_id={user_id}&since=2020-01-01T00:00:00",
+     {}, 4),
+    ("catalog_snapshot", "GET", "/products/snapshot?user_id={user_id}", {}, 2),
+    ("product_suggestions", "GET",
+     "/products/suggestions?user_id={user_id}&product_ids={product_id}&product_ids={other_product_id}", {}, 1),
+    ("get_product", "GET", "/products/{product_id}?user_id={user_id}", {}, 1),
+    ("update_product", "PUT", "/products/{product_id}?user_id={user_id}",
+     {"json": {"selling_price": "15.00"}}, 5),
+    ("delete_product", "DELETE", "/products/{product_id}?user_id={user_id}", {}, 4),
+    ("list_inventory", "GET", "/inventory?user_id={user_id}", {}, 2),
+    ("low_stock", "GET", "/inventory/low-stock?user_id={user_id}", {}, 2),
+    ("expiring_lots", "GET", "/inventory/expiring?user_id={user_id}&within_days=30", {}, 1),
+    ("reorder_suggestions", "GET", "/inventory/reorder-suggestions?user_id={user_id}", {}, 1),
+    ("receive_lot", "POST", "/inventory/{product_id}/lots?user_id={user_id}",
+     {"json": {"quantity": 5, "expiry_date": "{tomorrow_date}", "batch_number": "B1"}}, 10),
+    ("list_lots", "GET", "/inventory/{product_id}/lots?user_id={user_id}", {}, 2),
+    ("update_inventory", "PUT", "/inventory/{product_id}?user_id={user_id}",
+     {"json": {"current_stock": 50}}, 9),
+    ("take_snapshots", "POST", "/inventory/snapshots?user_id={user_id}", {}, 1),
+    ("stock_as_of", "GET", "/inventory/{product_id}/stock-as-of?user_id={user_id}&at={tomorrow}",
+     {}, 4),
+    ("adjustment_history", "GET", "/inventory/{product_id}/adjustments?user_id={user_id}", {}, 3),
+    ("create_customer", "POST", "/customers",
+     {"json": {"user_id": "{user_id}", "name": "Asha"}}, 2),
+    ("list_customers", "GET", "/customers?user_id={user_id}", {}, 1),
+    ("get_customer", "GET", "/customers/{customer_id}?user_id={user_id}", {}, 1),
+    ("customer_purchases", "GET", "/customers/{customer_id}/purchases?user_id={user_id}", {}, 3),
+    ("create_sale", "POST", "/sales",
+     {"json": {"user_id": "{user_id}", "customer_id": "{customer_id}",
+               "payment_method": "cash", "paid_amount": "100.00",
+               "items": [{"product_id": "{product_id}", "quantity": 1, "unit_price": "12.00"},
+                         {"product_id": "{other_product_id}", "quantity": 1,
+                          "unit_price": "13.00"}]}}, 19),  # first sale of the year creates the invoice counter
+    ("quote_sale", "POST", "/sales/quote",
+     {"json": {"user_id": "{user_id}", "paid_amount": "100.00",
+               "items": [{"product_id": "{product_id}", "quantity": 1},
+                         {"product_id": "{other_product_id}", "quantity": 2}]}}, 4),
+    ("list_sales", "GET", "/sales?user_id={user_id}", {}, 2),
+    ("sparse_sales", "GET", "/sales?user_id={user_id}&fields=invoice_number,total_amount", {}, 1),
+    ("sparse_sales_items", "GET", "/sales?user_id={user_id}&fields=total_amount&include=items", {}, 2),
+    ("list_sales_filtered", "GET",
+     "/sales?user_id={user_id}&payment_status=completed&end_date={tomorrow}", {}, 2),
+    ("get_sale", "GET", "/sales/{sale_id}?user_id={user_id}", {}, 2),
+    ("export_sales", "GET", "/sales/export?user_id={user_id}", {}, 3),
+    ("dashboard", "GET", "/dashboard?user_id={user_id}", {}, 7),
+    ("daily_sales", "GET", "/reports/daily-sales?user_id={user_id}", {}, 1),
+    ("margin_report", "GET", "/reports/margin?user_id={user_id}&group_by=product", {}, 1),
+    ("inventory_valuation", "GET", "/reports/inventory-valuation?user_id={user_id}", {}, 1),
+    ("metrics", "GET", "/metrics", {}, 0),
+    ("query_diagnostics", "GET", "/diagnostics/queries", {}, 0),
+]
+
+SIMPLE_CASES = [
+    ("root", "GET", "/", {}, 0),
+    ("login", "POST", "/api/login",
+     {"json": {"email": "{email}", "password": SEED_PASSWORD}}, 1),
+    ("register", "POST", "/api/register",
+     {"json": {"email": "someone@shop.com", "password": "secret"}}, 4),
+    ("create_product", "POST", "/api/products",
+     {"json": {"name": "New Product", "price": 5, "initial_stock": 10}}, 10),
+    ("list_products", "GET", "/api/products", {}, 2),
+    ("products_not_modified", "GET", "/api/products",
+     {"headers": {"If-None-Match": '"catalog-{user_id}-1"'}}, 1),
+    ("catalog_snapshot", "GET", "/api/products/snapshot", {}, 2),
+    ("update_product", "PUT", "/api/products/{product_id}",
+     {"json": {"selling_price": 15, "current_stock": 40}}, 14),
+    ("delete_product", "DELETE", "/api/products/{product_id}", {}, 4),
+    ("list_inventory", "GET", "/api/inventory", {}, 2),
+]
+
+
+@pytest.fixture(autouse=True)
+def no_snapshots():
+    """Snapshot cases pay for building the snapshot, as after any catalog change"""
+    shutil.rmtree(catalog_snapshot.SNAPSHOT_DIR, ignore_errors=True)
+    catalog_snapshot._cache.clear()
+
+
+def _fill(template, values):
+    """Substitute {placeholders} in strings, recursing into dicts and lists"""
+    if isinstance(template, str):
+        filled = template.format(**values)
+        return int(filled) if template.startswith("{") and filled.isdigit() else filled
+    if isinstance(template, dict):
+        return {key: _fill(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_fill(value, values) for value in template]
+    return template
+
+
+def _run_case(test_client, db, count_queries, size, method, path, kwargs, budget):
+    shop = seed_shop(db, products=size, sales=size)
+    values = {
+        **shop,
+        "product_id": shop["product_ids"][1],
+        "other_product_id": shop["product_ids"][2],
+        "sale_id": shop["sale_ids"][-1],
+        "tomorrow": _tomorrow(),
+        "tomorrow_date": _tomorrow()[:10],
+    }
+
+    with count_queries() as counter:
+        response = test_client.request(method, _fill(path, values), **_fill(kwargs, values))
+
+    expected_status = 304 if "If-None-Match" in kwargs.get("headers", {}) else 200
+    assert response.status_code == expected_status, response.text
+    assert counter.count <= budget, (
+        f"{method} {path} issued {counter.count} statements "
+        f"(budget {budget}) with {size} rows:\n{counter.report()}"
+    )
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize(
+    "method,path,kwargs,budget",
+    [case[1:] for case in MAIN_CASES],
+    ids=[case[0] for case in MAIN_CASES],
+)
+def test_main_api_query_budget(client, db, count_queries, size, method, path, kwargs, budget):
+    _run_case(client, db, count_queries, size, method, path, kwargs, budget)
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize(
+    "method,path,kwargs,budget",
+    [case[1:] for case in SIMPLE_CASES],
+    ids=[case[0] for case in SIMPLE_CASES],
+)
+def test_simple_api_query_budget(simple_client, db, count_queries, size, method, path, kwargs, budget):
+    _run_case(simple_client, db, count_queries, size, method, path, kwargs, budget)
+
+
+def test_counter_sees_lazy_loads(db, count_queries):
+    """Sanity check that the guard would catch an N+1 loop"""
+    seed_shop(db, products=4, sales=0)
+    db.expire_all()
+    import models
+
+    with count_queries() as counter:
+        products = db.query(models.Product).all()
+        for product in products:
+            product.inventory
+
+    assert counter.count == 1 + len(products)
+
+
+def test_counter_sees_every_engine(count_queries):
+    """Shop and replica databases have engines of their own"""
+    from sqlalchemy import create_engine, text
+
+    other = create_engine("sqlite://")
+    with count_queries() as counter:
+        with other.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    other.dispose()
+
+    assert counter.statements == ["SELECT 1"]
@@ -0,0 +1,61 @@
+"""
+Tests for statement timing and the slow statement report.
+"""
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+import models
+import query_stats
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    query_stats.reset()
+    yield
+    query_stats.reset()
+
+
+def test_in_lists_and_whitespace_fold_into_one_statement():
+    assert query_stats.normalize("SELECT id\n  FROM sales WHERE id IN (?, ?, ?)") == "SELECT id FROM sales WHERE id IN (...)"
+    assert query_stats.normalize("WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == "WHERE id IN (...)"
+    assert query_stats.normalize("WHERE id IN (?)") == "WHERE id IN (...)"
+    assert query_stats.normalize("INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)") == "INSERT INTO t (a, b) VALUES (...), ..."
+
+
+def test_statements_on_the_engine_are_timed(db):
+    for ids in ([1], [1, 2], [1, 2, 3]):
+        db.execute(select(models.Product.id).where(models.Product.id.in_(ids))).all()
+
+    rows = [row for row in query_stats.slowest(limit=50) if "FROM products" in row["statement"]]
+    [row] = rows
+    assert row["count"] == 3
+    assert row["max_seconds"] >= row["mean_seconds"] > 0
+
+
+def test_failed_statement_does_not_skew_the_next(db):
+    with pytest.raises(OperationalError):
+        db.execute(text("SELECT * FROM no_such_table"))
+    db.rollback()
+
+    assert db.connection().info.get("query_stats_started") == []
+
+
+def test_only_the_slowest_statements_are_kept(monkeypatch):
+    monkeypatch.setattr(query_stats, "QUERY_STATS_MAX_STATEMENTS", 2)
+    for i, seconds in enumerate([0.5, 0.1, 0.3, 0.2, 0.4]):
+        query_stats.record(f"SELECT {i}", seconds)
+
+    assert [row["statement"] for row in query_stats.slowest()] == ["SELECT 0", "SELECT 4"]  # Pruned at 5 > 2 * 2
+
+
+def test_endpoint_orders_by_max_time(client):
+    query_stats.record("SELECT slow", 0.9)
+    for _ in range(10):
+        query_stats.record("SELECT often", 0.2)
+
+    by_total = client.get("/diagnostics/queries", params={"limit": 2}).json()["statements"]
+    by_max = client.get("/diagnostics/queries", params={"limit": 2, "order_by": "max"}).json()["statements"]
+
+    assert [row["statement"] for row in by_total] == ["SELECT often", "SELECT slow"]
+    assert by_max[0]["statement"] == "SELECT slow"
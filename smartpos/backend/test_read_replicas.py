@@ -0,0 +1,120 @@
+"""
+Tests for read replica routing, using a second SQLite file as the replica.
+"""
+import time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.orm import Session
+
+import models
+import read_replicas
+from conftest import seed_shop
+from database import Base
+from read_replicas import ReplicaSet
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    """A replica that holds only its own marker product for shop 1"""
+    lag = {"seconds": 0.0}
+    replicas = ReplicaSet(
+        [f"sqlite:///{tmp_path / 'replica.db'}"],
+        max_lag=5,
+        check_interval=60,  # Tests refresh() by hand
+        lag_probe=lambda engine: lag["seconds"]
+    )
+    engine = replicas.engines[0]
+    Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as replica_db:
+        product = models.Product(user_id=1, name="From replica", price=Decimal("1.00"), selling_price=Decimal("1.00"))
+        product.inventory = models.Inventory(current_stock=1)
+        replica_db.add(product)
+        replica_db.commit()
+
+    replicas.refresh()
+    monkeypatch.setattr(read_replicas, "replica_set", replicas)
+    yield lag
+    replicas.dispose()
+
+
+def _product_names(client):
+    return [p["name"] for p in client.get("/products", params={"user_id": 1}).json()]
+
+
+def test_reads_go_to_replica(replica, client, db):
+    seed_shop(db, products=2)
+
+    assert _product_names(client) == ["From replica"]
+    assert client.get("/health").json()["read_replicas"] == [
+        {"replica": 0, "lag_seconds": 0.0, "healthy": True}
+    ]
+
+
+def test_lagging_replica_falls_back_to_primary(replica, client, db):
+    seed_shop(db, products=2)
+    replica["seconds"] = 30
+    read_replicas.replica_set.refresh()
+
+    assert _product_names(client) == ["Product 0", "Product 1"]
+
+
+def test_unreachable_replica_falls_back_to_primary(replica, client, db, monkeypatch):
+    seed_shop(db, products=1)
+
+    def unreachable(engine):
+        raise ConnectionError("replica down")
+    monkeypatch.setattr(read_replicas.replica_set, "lag_probe", unreachable)
+    read_replicas.replica_set.refresh()
+
+    assert _product_names(client) == ["Product 0"]
+
+
+def test_requests_never_measure_lag(replica, client, db, monkeypatch):
+    seed_shop(db, products=1)
+
+    def blocking(engine):
+        raise AssertionError("lag measured on the request path")
+    monkeypatch.setattr(read_replicas.replica_set, "lag_probe", blocking)
+
+    assert _product_names(client) == ["From replica"]  # The last measurement still stands
+    assert client.get("/health").json()["read_replicas"][0]["healthy"]
+
+
+def test_monitor_thread_measures_lag(tmp_path):
+    lag = {"seconds": 30.0}
+    replicas = ReplicaSet([f"sqlite:///{tmp_path / 'replica.db'}"], max_lag=5, check_interval=0.01,
+                          lag_probe=lambda engine: lag["seconds"])
+    assert replicas.pick() is None  # Not measured yet
+
+    replicas.start()
+    try:
+        lag["seconds"] = 0.0
+        deadline = time.monotonic() + 5
+        while replicas.pick() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert replicas.pick() is replicas.engines[0]
+    finally:
+        replicas.dispose()
+
+
+def test_client_reads_its_own_writes(replica, client, db):
+    seed_shop(db, products=1)
+
+    response = client.post("/categories", json={"user_id": 1, "name": "Snacks"})
+    assert response.status_code == 200
+    assert read_replicas.READ_YOUR_WRITES_COOKIE in response.cookies
+
+    assert _product_names(client) == ["Product 0"]  # Pinned to the primary
+
+    client.cookies.clear()
+    assert _product_names(client) == ["From replica"]
+
+
+def test_failed_write_does_not_pin(replica, client, db):
+    seed_shop(db, products=1)
+
+    response = client.put("/products/999", params={"user_id": 1}, json={"name": "Nope"})
+
+    assert response.status_code == 404
+    assert read_replicas.READ_YOUR_WRITES_COOKIE not in response.cookies
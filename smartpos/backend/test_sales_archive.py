@@ -0,0 +1,125 @@
+"""
+Tests for archiving old sales to compressed files and reading them back.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select, update
+
+import models
+import sales_archive
+from conftest import seed_shop
+
+
+@pytest.fixture(autouse=True)
+def archive_dir():
+    """Sale ids repeat between tests, so start every test without archives"""
+    shutil.rmtree(sales_archive.SALES_ARCHIVE_DIR, ignore_errors=True)
+    yield sales_archive.SALES_ARCHIVE_DIR
+
+
+def _backdate(db, sale_id, days):
+    db.execute(
+        update(models.Sale).where(models.Sale.id == sale_id)
+        .values(sale_date=datetime.now().replace(hour=12) - timedelta(days=days))
+    )
+    db.commit()
+
+
+def _count(db, model):
+    return db.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+@pytest.fixture
+def old_shop(db):
+    """Seeded shop whose first two sales are from over a year ago, two months apart"""
+    shop = seed_shop(db, sales=3)
+    _backdate(db, shop["sale_ids"][0], 460)
+    _backdate(db, shop["sale_ids"][1], 400)
+    return shop
+
+
+def test_archiving_moves_old_sales_out_and_keeps_rollups(db, old_shop):
+    old_ids = old_shop["sale_ids"][:2]
+    old_totals = dict(db.execute(
+        select(models.Sale.id, models.Sale.total_amount).where(models.Sale.id.in_(old_ids))
+    ).all())
+
+    assert sales_archive.archive_sales(db, older_than_days=365) == 2
+
+    assert _count(db, models.Sale) == 1
+    assert _count(db, models.SaleItem) == 2
+    assert sorted(db.execute(select(models.ArchivedSale.sale_id)).scalars()) == old_ids
+    rollups = db.execute(select(models.DailySalesRollup).order_by(models.DailySalesRollup.sale_date)).scalars().all()
+    assert [(r.sale_count, r.total_amount) for r in rollups] == [(1, old_totals[old_ids[0]]), (1, old_totals[old_ids[1]])]
+    assert len(os.listdir(os.path.join(sales_archive.SALES_ARCHIVE_DIR, "shop_1"))) == 2  # One file per month
+
+    assert sales_archive.archive_sales(db, older_than_days=365) == 0
+
+
+def test_get_sale_reads_archived_sales(client, db, old_shop):
+    sale_id = old_shop["sale_ids"][0]
+    before = client.get(f"/sales/{sale_id}", params={"user_id": 1}).json()
+
+    sales_archive.archive_sales(db, older_than_days=365)
+    after = client.get(f"/sales/{sale_id}", params={"user_id": 1})
+
+    assert after.status_code == 200
+    assert after.json()["invoice_number"] == before["invoice_number"]
+    assert [Decimal(item["total_price"]) for item in after.json()["items"]] == [
+        Decimal(item["total_price"]) for item in before["items"]
+    ]
+    assert client.get(f"/sales/{sale_id}", params={"user_id": 2}).status_code == 404
+
+
+def test_reused_sale_ids_are_archived_separately(client, db):
+    """Once the highest sale is archived, SQLite gives its id to the next sale"""
+    shop = seed_shop(db, products=1, sales=1)
+    [sale_id] = shop["sale_ids"]
+    _backdate(db, sale_id, 400)
+    first = client.get(f"/sales/{sale_id}", params={"user_id": 1}).json()
+    sales_archive.archive_sales(db, older_than_days=365)
+
+    response = client.post("/sales", json={
+        "user_id": 1, "payment_method": "cash", "paid_amount": "100.00",
+        "items": [{"product_id": shop["product_ids"][0], "quantity": 1, "unit_price": "12.00"}]
+    })
+    second = response.json()
+    assert second["id"] == sale_id
+    _backdate(db, sale_id, 380)
+
+    assert sales_archive.archive_sales(db, older_than_days=365) == 1
+    assert _count(db, models.Sale) == 0
+    assert _count(db, models.ArchivedSale) == 2
+    assert client.get(f"/sales/{sale_id}", params={"user_id": 1}).json()["invoice_number"] == second["invoice_number"]
+    exported = [json.loads(line) for line in client.get("/sales/export", params={"user_id": 1}).text.splitlines()]
+    assert [sale["invoice_number"] for sale in exported] == [first["invoice_number"], second["invoice_number"]]
+
+
+def test_export_merges_archive_and_live_sales(client, db, old_shop):
+    sales_archive.archive_sales(db, older_than_days=365)
+
+    response = client.get("/sales/export", params={"user_id": 1})
+    exported = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [sale["id"] for sale in exported] == old_shop["sale_ids"]  # Oldest first, once each
+
+    recent = client.get("/sales/export", params={
+        "user_id": 1, "start_date": (datetime.now() - timedelta(days=410)).isoformat()
+    }).text.splitlines()
+    assert [json.loads(line)["id"] for line in recent] == old_shop["sale_ids"][1:]
+
+
+def test_rewritten_records_are_read_once(db, old_shop):
+    """A run that died after writing the file archives the same sales again"""
+    sale = sales_archive.projections.sale_rows(db, 1)[-1]
+    path = os.path.join(sales_archive.SALES_ARCHIVE_DIR, "shop_1", "dup.ndjson.gz")
+    sales_archive._append(path, [sale])
+    sales_archive._append(path, [sale])
+
+    assert [record["id"] for record in sales_archive.read_archive(os.path.join("shop_1", "dup.ndjson.gz"))] == [sale["id"]]
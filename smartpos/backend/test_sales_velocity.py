@@ -0,0 +1,109 @@
+"""
+Tests for sales velocity and reorder suggestions.
+"""
+import os
+import subprocess
+import sys
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+import models
+import sales_velocity
+from conftest import seed_shop, sell
+
+TODAY = date(2026, 3, 10)
+
+
+def _noon(day: date) -> datetime:
+    return datetime.combine(day, time(12))
+
+
+def _velocities(db):
+    return dict(db.execute(select(models.ProductVelocity.product_id, models.ProductVelocity.units_per_day)).all())
+
+
+def test_refresh_weights_recent_days_more(client, db):
+    shop = seed_shop(db, products=2, sales=0, stock=1000)
+    for days_ago, quantity in [(1, 10), (2, 10), (3, 4), (0, 99)]:  # Today's sales wait for tomorrow
+        sell(client, shop, (0, quantity), sold_at=_noon(TODAY - timedelta(days=days_ago)))
+
+    assert sales_velocity.refresh(db, shop["user_id"], today=TODAY) == 2
+    db.commit()
+
+    a = sales_velocity.smoothing()
+    expected = a * 10 + a * (1 - a) * 10 + a * (1 - a) ** 2 * 4
+    assert _velocities(db) == pytest.approx({shop["product_ids"][0]: expected, shop["product_ids"][1]: 0.0})
+    assert sales_velocity.refresh(db, shop["user_id"], today=TODAY) == 0  # Already through yesterday
+
+
+def test_nightly_refresh_matches_a_full_recompute(client, db):
+    shop = seed_shop(db, products=2, sales=0, stock=1000)
+    for days_ago in range(6):
+        sell(client, shop, (days_ago % 2, days_ago + 1), sold_at=_noon(TODAY - timedelta(days=days_ago)))
+
+    sales_velocity.refresh(db, shop["user_id"], today=TODAY - timedelta(days=2))
+    db.commit()
+    sales_velocity.refresh(db, shop["user_id"], today=TODAY + timedelta(days=1))
+    db.commit()
+    nightly = _velocities(db)
+
+    db.execute(delete(models.ProductVelocity))
+    sales_velocity.refresh(db, shop["user_id"], today=TODAY + timedelta(days=1))
+    db.commit()
+
+    assert _velocities(db) == pytest.approx(nightly)
+
+
+def _set_velocity(db, product_id, units_per_day):
+    db.add(models.ProductVelocity(product_id=product_id, user_id=1, units_per_day=units_per_day, through_date=TODAY))
+
+
+def test_reorder_suggestions_cover_and_quantities(db):
+    shop = seed_shop(db, products=4, sales=0)  # Stock 2, 1000, 2, 1000; minimum 5
+    ids = shop["product_ids"]
+    _set_velocity(db, ids[0], 1.0)
+    _set_velocity(db, ids[1], 200.0)
+    _set_velocity(db, ids[3], 0.5)
+    db.get(models.Inventory, 1).reorder_quantity = 50  # Minimum order for product 0
+    db.get(models.Inventory, 2).maximum_stock = 1500
+    db.commit()
+
+    due = sales_velocity.reorder_suggestions(db, shop["user_id"], lead_time_days=7, cover_days=14)
+    by_product = {row["product_id"]: row for row in due}
+
+    assert [row["product_id"] for row in due] == [ids[0], ids[1], ids[2]]  # Least cover first; not selling last
+    assert by_product[ids[0]]["days_of_cover"] == 2.0
+    assert by_product[ids[0]]["suggested_quantity"] == 50  # 1 * 21 + 5 - 2 = 24, raised to the minimum order
+    assert by_product[ids[1]]["reorder_point"] == 1405.0
+    assert by_product[ids[1]]["suggested_quantity"] == 500  # 200 * 21 + 5 - 1000, capped at maximum_stock
+    assert by_product[ids[2]] == {
+        "product_id": ids[2], "name": "Product 2", "sku": "SKU-00002", "current_stock": 2, "units_per_day": 0.0,
+        "days_of_cover": None, "reorder_point": 5.0, "suggested_quantity": 3, "due": True
+    }
+
+    everything = sales_velocity.reorder_suggestions(db, shop["user_id"], include_all=True)
+    assert {row["product_id"]: row["due"] for row in everything}[ids[3]] is False
+
+
+def test_reorder_endpoint_is_one_query(client, db, count_queries):
+    shop = seed_shop(db, products=3, sales=0)
+    sales_velocity.refresh(db, shop["user_id"])
+    db.commit()
+
+    with count_queries() as counter:
+        response = client.get("/inventory/reorder-suggestions", params={"user_id": shop["user_id"], "cover_days": 30})
+
+    assert counter.count == 1, counter.report()
+    assert response.status_code == 200
+    assert [row["product_id"] for row in response.json()] == [shop["product_ids"][0], shop["product_ids"][2]]
+
+
+def test_importing_main_leaves_numpy_unloaded():
+    """Every API worker imports main; NumPy loads only when velocities or suggestions are computed"""
+    loaded = subprocess.run(
+        [sys.executable, "-c", "import sys, main; print(sorted({'numpy', 'scipy'} & set(sys.modules)))"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    ).stdout.split()
+    assert loaded == ["[]"]
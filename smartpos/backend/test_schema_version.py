@@ -0,0 +1,224 @@
+"""
+Tests for migration-based schema management.
+"""
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+
+import schema_version
+from conftest import QueryCounter
+from database import Base
+
+
+# What create_all() made from models.py before the schema moved to migrations
+PRE_MIGRATION_SCHEMA = """
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    supabase_user_id VARCHAR,
+    username VARCHAR,
+    email VARCHAR,
+    password_hash VARCHAR,
+    owner_name VARCHAR NOT NULL,
+    phone VARCHAR,
+    shop_name VARCHAR NOT NULL,
+    address TEXT,
+    business_type VARCHAR,
+    currency VARCHAR,
+    tax_rate NUMERIC(5, 2),
+    is_active BOOLEAN,
+    created_at DATETIME,
+    updated_at DATETIME,
+    CONSTRAINT pk_users PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_supabase_user_id ON users (supabase_user_id);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE INDEX ix_users_id ON users (id);
+CREATE TABLE categories (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    description TEXT,
+    is_active BOOLEAN,
+    created_at DATETIME,
+    CONSTRAINT pk_categories PRIMARY KEY (id),
+    CONSTRAINT fk_categories_user_id_users FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_categories_id ON categories (id);
+CREATE INDEX ix_categories_name ON categories (name);
+CREATE TABLE customers (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    phone VARCHAR,
+    email VARCHAR,
+    address TEXT,
+    customer_type VARCHAR,
+    credit_limit NUMERIC(10, 2),
+    current_balance NUMERIC(10, 2),
+    total_purchases NUMERIC(12, 2),
+    last_purchase_at DATETIME,
+    is_active BOOLEAN,
+    created_at DATETIME,
+    updated_at DATETIME,
+    CONSTRAINT pk_customers PRIMARY KEY (id),
+    CONSTRAINT fk_customers_user_id_users FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_customers_name ON customers (name);
+CREATE INDEX ix_customers_phone ON customers (phone);
+CREATE INDEX ix_customers_id ON customers (id);
+CREATE TABLE products (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER,
+    name VARCHAR NOT NULL,
+    description TEXT,
+    barcode VARCHAR,
+    sku VARCHAR,
+    price NUMERIC(10, 2) NOT NULL,
+    cost_price NUMERIC(10, 2),
+    selling_price NUMERIC(10, 2) NOT NULL,
+    discount_percentage NUMERIC(5, 2),
+    tax_percentage NUMERIC(5, 2),
+    unit VARCHAR,
+    is_active BOOLEAN,
+    is_featured BOOLEAN,
+    image_url VARCHAR,
+    created_at DATETIME,
+    updated_at DATETIME,
+    CONSTRAINT pk_products PRIMARY KEY (id),
+    CONSTRAINT fk_products_user_id_users FOREIGN KEY(user_id) REFERENCES users (id),
+    CONSTRAINT fk_products_category_id_categories FOREIGN KEY(category_id) REFERENCES categories (id)
+);
+CREATE INDEX ix_products_sku ON products (sku);
+CREATE INDEX ix_products_id ON products (id);
+CREATE INDEX ix_products_name ON products (name);
+CREATE UNIQUE INDEX ix_products_barcode ON products (barcode);
+CREATE TABLE sales (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    customer_id INTEGER,
+    invoice_number VARCHAR,
+    subtotal NUMERIC(10, 2) NOT NULL,
+    discount_amount NUMERIC(10, 2),
+    tax_amount NUMERIC(10, 2),
+    total_amount NUMERIC(10, 2) NOT NULL,
+    payment_method VARCHAR NOT NULL,
+    payment_status VARCHAR,
+    paid_amount NUMERIC(10, 2),
+    change_amount NUMERIC(10, 2),
+    notes TEXT,
+    sale_date DATETIME,
+    created_at DATETIME,
+    updated_at DATETIME,
+    CONSTRAINT pk_sales PRIMARY KEY (id),
+    CONSTRAINT fk_sales_user_id_users FOREIGN KEY(user_id) REFERENCES users (id),
+    CONSTRAINT fk_sales_customer_id_customers FOREIGN KEY(customer_id) REFERENCES customers (id)
+);
+CREATE UNIQUE INDEX ix_sales_invoice_number ON sales (invoice_number);
+CREATE INDEX ix_sales_id ON sales (id);
+CREATE TABLE inventory (
+    id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    current_stock INTEGER,
+    minimum_stock INTEGER,
+    maximum_stock INTEGER,
+    reorder_quantity INTEGER,
+    last_restocked_at DATETIME,
+    expiry_date DATETIME,
+    batch_number VARCHAR,
+    supplier_info TEXT,
+    updated_at DATETIME,
+    CONSTRAINT pk_inventory PRIMARY KEY (id),
+    CONSTRAINT uq_inventory_product_id UNIQUE (product_id),
+    CONSTRAINT fk_inventory_product_id_products FOREIGN KEY(product_id) REFERENCES products (id)
+);
+CREATE INDEX ix_inventory_id ON inventory (id);
+CREATE TABLE sale_items (
+    id INTEGER NOT NULL,
+    sale_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price NUMERIC(10, 2) NOT NULL,
+    discount_percentage NUMERIC(5, 2),
+    discount_amount NUMERIC(10, 2),
+    tax_percentage NUMERIC(5, 2),
+    tax_amount NUMERIC(10, 2),
+    total_price NUMERIC(10, 2) NOT NULL,
+    created_at DATETIME,
+    CONSTRAINT pk_sale_items PRIMARY KEY (id),
+    CONSTRAINT fk_sale_items_sale_id_sales FOREIGN KEY(sale_id) REFERENCES sales (id),
+    CONSTRAINT fk_sale_items_product_id_products FOREIGN KEY(product_id) REFERENCES products (id)
+);
+CREATE INDEX ix_sale_items_id ON sale_items (id);
+CREATE TABLE inventory_adjustments (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    inventory_id INTEGER NOT NULL,
+    adjustment_type VARCHAR NOT NULL,
+    quantity_change INTEGER NOT NULL,
+    reason TEXT,
+    reference_id VARCHAR,
+    created_at DATETIME,
+    CONSTRAINT pk_inventory_adjustments PRIMARY KEY (id),
+    CONSTRAINT fk_inventory_adjustments_user_id_users FOREIGN KEY(user_id) REFERENCES users (id),
+    CONSTRAINT fk_inventory_adjustments_inventory_id_inventory FOREIGN KEY(inventory_id) REFERENCES inventory (id)
+);
+CREATE INDEX ix_inventory_adjustments_id ON inventory_adjustments (id);
+"""
+
+
+@pytest.fixture
+def scratch_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scratch.db'}")
+    yield engine
+    engine.dispose()
+
+
+def _revision(engine):
+    with engine.connect() as connection:
+        return schema_version.current_revision(connection)
+
+
+def test_head_revision_matches_migrations():
+    script = ScriptDirectory.from_config(schema_version.alembic_config())
+    assert script.get_current_head() == schema_version.HEAD_REVISION
+
+
+def test_migrations_build_the_models_schema(scratch_engine):
+    schema_version.upgrade(scratch_engine)
+
+    with scratch_engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+    assert _revision(scratch_engine) == schema_version.HEAD_REVISION
+
+
+def test_database_made_by_create_all_is_adopted(scratch_engine):
+    with scratch_engine.begin() as connection:
+        for statement in PRE_MIGRATION_SCHEMA.strip().rstrip(";").split(";\n"):
+            connection.exec_driver_sql(statement)
+
+    with pytest.raises(schema_version.SchemaOutOfDate):
+        schema_version.ensure_schema(scratch_engine, auto_migrate=False)
+
+    schema_version.ensure_schema(scratch_engine, auto_migrate=True)
+    assert _revision(scratch_engine) == schema_version.HEAD_REVISION
+    with scratch_engine.connect() as connection:
+        # Everything the migrations add, including indexes on tables that already existed
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+
+
+def test_empty_database_is_always_created(scratch_engine):
+    schema_version.ensure_schema(scratch_engine, auto_migrate=False)
+    assert _revision(scratch_engine) == schema_version.HEAD_REVISION
+
+
+def test_up_to_date_check_is_one_query(scratch_engine):
+    schema_version.upgrade(scratch_engine)
+
+    with QueryCounter(scratch_engine) as counter:
+        schema_version.ensure_schema(scratch_engine, auto_migrate=False)
+
+    assert counter.count == 1, counter.report()
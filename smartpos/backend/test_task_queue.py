@@ -0,0 +1,164 @@
+"""
+Tests for the durable background task queue and the daily sales rollup.
+"""
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+import models
+import task_queue
+import tenancy
+from conftest import add_owner, seed_shop
+
+_calls = []
+
+
+@task_queue.handler("test_record")
+def _record(db, user_id, payload):
+    if payload.get("fail"):
+        raise RuntimeError("boom")
+    _calls.append(payload["n"])
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    _calls.clear()
+
+
+def _tasks(db):
+    db.expire_all()
+    return db.execute(select(models.BackgroundTask).order_by(models.BackgroundTask.id)).scalars().all()
+
+
+def _sell(client, shop, quantity=2):
+    response = client.post("/sales", json={
+        "user_id": shop["user_id"], "payment_method": "cash", "paid_amount": "100.00",
+        "items": [{"product_id": shop["product_ids"][1], "quantity": quantity, "unit_price": "13.00"}]
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_sale_rollup_runs_after_commit(client, db):
+    shop = seed_shop(db, sales=0)
+    _sell(client, shop, quantity=2)
+    _sell(client, shop, quantity=3)
+
+    assert client.get("/reports/daily-sales", params={"user_id": shop["user_id"]}).json() == []
+    assert task_queue.drain() == 3  # Two rollups, one catalog snapshot rebuild for both sales
+
+    [day] = client.get("/reports/daily-sales", params={"user_id": shop["user_id"]}).json()
+    assert day["sale_count"] == 2
+    assert day["items_sold"] == 5
+    assert Decimal(day["total_amount"]) == Decimal("65.00")
+    assert {task.status for task in _tasks(db)} == {"done"}
+
+
+def test_rollup_is_idempotent(client, db):
+    shop = seed_shop(db, sales=0)
+    sale = _sell(client, shop)
+    task_queue.enqueue(db, "daily_sales_rollup", {"sale_id": sale["id"]}, user_id=shop["user_id"])
+    db.commit()
+
+    task_queue.drain()
+
+    [row] = db.execute(select(models.DailySalesRollup)).scalars().all()
+    assert row.sale_count == 1
+
+
+def test_task_only_exists_if_enqueuing_transaction_commits(db):
+    task_queue.enqueue(db, "test_record", {"n": 1})
+    db.rollback()
+
+    assert _tasks(db) == []
+    assert task_queue.drain() == 0
+
+
+def test_unknown_kind_is_rejected(db):
+    with pytest.raises(ValueError):
+        task_queue.enqueue(db, "no_such_task")
+
+
+def test_failures_back_off_then_give_up(db, monkeypatch):
+    monkeypatch.setattr(task_queue, "TASK_MAX_ATTEMPTS", 2)
+    task_queue.enqueue(db, "test_record", {"fail": True})
+    db.commit()
+
+    task_queue.drain()
+    [task] = _tasks(db)
+    assert (task.status, task.attempts) == ("pending", 1)
+    assert task.run_after > task_queue.utcnow()
+    assert "boom" in task.last_error
+
+    assert task_queue.drain() == 0  # Not due yet
+    task.run_after = task_queue.utcnow()
+    db.commit()
+    task_queue.drain()
+
+    [task] = _tasks(db)
+    assert (task.status, task.attempts) == ("failed", 2)
+
+
+def test_abandoned_running_task_is_reclaimed(db):
+    """A worker that died mid-task leaves it running; the lease expiry frees it"""
+    task = task_queue.enqueue(db, "test_record", {"n": 7})
+    task.status = "running"
+    task.locked_at = task_queue.utcnow() - timedelta(seconds=task_queue.TASK_LEASE_SECONDS + 1)
+    db.commit()
+
+    assert task_queue.drain() == 1
+    assert _calls == [7]
+
+
+def test_worker_thread_drains_on_notify(db):
+    worker = task_queue.TaskWorker(poll_seconds=30)
+    worker.start()
+    try:
+        task_queue.enqueue(db, "test_record", {"n": 1})
+        db.commit()
+        task_queue.notify()
+
+        deadline = time.monotonic() + 5
+        while not _calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        worker.stop()
+
+    assert _calls == [1]
+
+
+def test_routed_worker_only_opens_shops_with_due_tasks(tmp_path, monkeypatch, db):
+    add_owner(db, "a@shop.com")
+    add_owner(db, "b@shop.com")
+    router = tenancy.TenantRouter(str(tmp_path), capacity=4, idle_seconds=60)
+    monkeypatch.setattr(tenancy, "router", router)
+    monkeypatch.setattr(task_queue, "_due", {})
+    try:
+        for user_id in (1, 2):
+            router.engine_for(user_id)
+        with router.session_for(1) as shop_db:
+            task_queue.enqueue(shop_db, "test_record", {"n": 1}, user_id=1)
+            task_queue.enqueue(shop_db, "test_record", {"n": 2}, user_id=1)
+            shop_db.rollback()  # Never committed, so never due
+            task_queue.enqueue(shop_db, "test_record", {"n": 3}, user_id=1)
+            shop_db.commit()
+        router.dispose_all()
+
+        assert task_queue.drain() == 1
+        assert router.open_user_ids() == [1]
+        assert _calls == [3]
+
+        router.dispose_all()
+        assert task_queue.drain() == 0
+        assert router.open_user_ids() == []
+
+        with router.session_for(1) as shop_db:
+            task_queue.enqueue(shop_db, "test_record", {"fail": True}, user_id=1)
+            shop_db.commit()
+        assert task_queue.drain() == 1
+        assert task_queue._due[1] > task_queue.utcnow()  # Due again when the retry backoff ends
+    finally:
+        router.dispose_all()
@@ -0,0 +1,152 @@
+"""
+Tests for per-shop database routing and the split migration.
+"""
+import threading
+import time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import func, select
+
+import models
+import tenancy
+from conftest import add_owner, seed_shop
+from split_shop_databases import split_shop
+from tenancy import TenantRouter
+
+
+def _count(session, model):
+    return session.execute(select(func.count()).select_from(model)).scalar_one()
+
+
+@pytest.fixture
+def router(tmp_path, monkeypatch):
+    router = TenantRouter(str(tmp_path), capacity=2, idle_seconds=60)
+    monkeypatch.setattr(tenancy, "router", router)
+    yield router
+    router.dispose_all()
+
+
+def test_first_open_creates_schema_and_copies_owner(router, db):
+    user_id = add_owner(db, "a@shop.com")
+
+    with router.session_for(user_id) as shop_db:
+        owner = shop_db.get(models.User, user_id)
+        assert owner.username == "a@shop.com"
+        assert _count(shop_db, models.Product) == 0
+    assert router.user_ids_on_disk() == [user_id]
+
+
+@pytest.fixture
+def owners(db):
+    return [add_owner(db, f"{name}@shop.com") for name in "abc"]
+
+
+def test_engine_cache_is_bounded_lru(router, owners):
+    first = router.engine_for(1)
+    router.engine_for(2)
+    assert router.engine_for(1) is first  # Hit, and now most recent
+
+    router.engine_for(3)
+
+    assert router.open_user_ids() == [1, 3]
+    assert router.engine_for(1) is first
+
+
+def test_idle_engines_are_disposed(router, owners):
+    router.engine_for(1)
+    router.idle_seconds = 0
+    time.sleep(0.01)
+
+    router.evict_idle()
+
+    assert router.open_user_ids() == []
+    assert router.user_ids_on_disk() == [1]
+
+
+def test_unknown_user_gets_404_and_no_file(router, client, db):
+    add_owner(db, "a@shop.com")
+
+    response = client.get("/products", params={"user_id": 999})
+
+    assert response.status_code == 404
+    assert router.user_ids_on_disk() == []
+    with pytest.raises(tenancy.UnknownShop):
+        router.engine_for(999)
+
+
+def test_simple_api_without_its_shop_gets_404(router, simple_client, db):
+    response = simple_client.get("/api/products")  # Always user 1, who doesn't exist yet
+
+    assert response.status_code == 404
+    assert router.user_ids_on_disk() == []
+
+
+def test_opening_one_shop_does_not_block_others(router, owners, monkeypatch):
+    migrating, release = threading.Event(), threading.Event()
+    open_shop = router._open
+
+    def slow_open(user_id):
+        if user_id == 2:
+            migrating.set()
+            release.wait(5)
+        return open_shop(user_id)
+
+    monkeypatch.setattr(router, "_open", slow_open)
+    opener = threading.Thread(target=router.engine_for, args=(2,))
+    opener.start()
+    try:
+        assert migrating.wait(5)
+        router.engine_for(1)  # Would wait for shop 2 under one global lock
+        assert router.open_user_ids() == [1]
+    finally:
+        release.set()
+        opener.join(5)
+    assert router.open_user_ids() == [1, 2]
+
+
+def test_writes_land_in_the_shop_database(router, client, db):
+    user_id = add_owner(db, "a@shop.com")
+    other_id = add_owner(db, "b@shop.com")
+
+    response = client.post("/products", json={
+        "user_id": user_id, "name": "Tea", "price": "10.00", "selling_price": "12.00"
+    })
+    assert response.status_code == 200, response.text
+
+    assert _count(db, models.Product) == 0  # Nothing in the shared database
+    with router.session_for(user_id) as shop_db:
+        assert _count(shop_db, models.Product) == 1
+    with router.session_for(other_id) as shop_db:
+        assert _count(shop_db, models.Product) == 0
+
+    listed = client.get("/products", params={"user_id": user_id}).json()
+    assert [p["name"] for p in listed] == ["Tea"]
+    assert client.get("/products", params={"user_id": other_id}).json() == []
+
+
+def test_split_copies_each_shop_with_its_children(tmp_path, db):
+    shop = seed_shop(db, products=4, sales=3)
+    other_id = add_owner(db, "other@shop.com")
+    other = models.Product(user_id=other_id, name="Other", price=Decimal("1.00"), selling_price=Decimal("1.00"))
+    other.inventory = models.Inventory(current_stock=1)
+    db.add(other)
+    db.commit()
+
+    copied = split_shop(shop["user_id"], str(tmp_path))
+
+    assert copied["users"] == 1
+    assert copied["products"] == 4
+    assert copied["inventory"] == 4
+    assert copied["sales"] == 3
+    assert copied["sale_items"] == 6
+    assert copied["catalog_versions"] == 1
+
+    with TenantRouter(str(tmp_path)).session_for(shop["user_id"]) as shop_db:
+        assert shop_db.get(models.Product, other.id) is None
+        sale = shop_db.get(models.Sale, shop["sale_ids"][0])
+        assert sale.invoice_number == "SEED-00000"
+        assert len(sale.items) == 2
+
+    with pytest.raises(FileExistsError):
+        split_shop(shop["user_id"], str(tmp_path))